@@ -1,87 +1,139 @@
-import os
-import sqlite3
-import json
-import datetime
 import re
 from dotenv import load_dotenv
-from langchain_openai import AzureChatOpenAI
-from langchain_google_genai import ChatGoogleGenerativeAI
+from llm_client import LazyLLM
+from metrics import record_llm_call, record_parse
+from tracing import traced
+from session import session_store
+import singleflight
+import slot_parser
+from intent_classifier import classify_intent, is_confident
+import structured_output
+from datetime_normalizer import normalize_date, normalize_time, normalize_record
+from prompts import PromptTemplate, register, guess_intent, render as render_prompt
 
 # Load environment variables
 load_dotenv()
 
-# Add these state management variables at the top
-conversation_states = {}
-
-
-# Azure LLM Initialization
-# llm = AzureChatOpenAI(
-#     azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
-#     azure_deployment="gpt-4o",
-#     api_version= "2023-09-01-preview",
-#     api_key=os.getenv("AZURE_OPENAI_API_KEY"),
-#     temperature=0
-# )
-llm=ChatGoogleGenerativeAI(
-    api_key=os.getenv("GEMINI_API_KEY"),  # <-- Replace with your actual key
-    model="gemini-2.0-flash",
-    temperature=0,
-    max_tokens=None,
-    timeout=None,
-    max_retries=2,
-)
+# Client from llm_client.py (LLM_PROVIDER / EXTRACTION_LLM_PROVIDER), created on first use
+llm = LazyLLM("extraction")
 
 # Database functions (imported from database.py)
 from database import book_appointment, reschedule_appointment, cancel_appointment, get_appointments
 
-# Add these state management variables at the top
-conversation_states = {}
-
-def handle_web_request(user_input, session_id):
-    # Initialize or retrieve conversation state
-    if session_id not in conversation_states:
-        conversation_states[session_id] = {
-            'step': 'initial',
-            'extracted_data': None,
-            'missing_fields': []
-        }
-    
-    state = conversation_states[session_id]
-    
-    # Initial request handling
-    if state['step'] == 'initial':
-        extracted_data = extract_intent_and_details(user_input)
-        state['extracted_data'] = extracted_data
-        state['step'] = 'collecting_details'
-    
-    # Handle details collection
-    if state['step'] == 'collecting_details':
-        # Update current field with user input
+# Replies that give up on the appointment whose details are being collected
+_STOP_REPLY = re.compile(r"^\s*(cancel|stop|quit|exit|never\s*mind|forget it|start over)\W*$", re.IGNORECASE)
+
+def pending_reply(session_id, user_input):
+    """
+    How to take `user_input` while the session is collecting appointment
+    details: "answer" for the field asked for last, "stop" when the user gives
+    up, or None when nothing is pending or the message is a new request (a
+    medical question or another appointment request), to be routed as usual.
+    The session is cleared in the last two cases.
+    """
+    state = session_store.get(session_id) if session_id else None
+    if state is None:
+        return None
+    if _STOP_REPLY.match(user_input or ""):
+        session_store.delete(session_id)
+        return "stop"
+    label, confidence = classify_intent(user_input)
+    new_request = is_confident(confidence) and (label == "medical" or guess_intent(user_input))
+    field = state['missing_fields'][0] if state['missing_fields'] else None
+    if not new_request and field and slot_parser.parse_field(field, user_input) is not None:
+        return "answer"
+    # Nothing the parser reads: leaning medical at all means it isn't an answer;
+    # otherwise extract_field() gets a go and asks again when it finds no value
+    if new_request or (label == "medical" and confidence > 0.5):
+        session_store.delete(session_id)
+        return None
+    return "answer"
+
+def handle_web_request(user_input, session_id, extracted_data=None):
+    """
+    One turn of multi-turn slot filling, with the state kept in session_store.
+
+    The first turn starts from `extracted_data` (or extracts it from
+    `user_input`); later turns treat `user_input` as the answer to the field
+    asked for last. Returns {'status': 'collecting', 'next_field',
+    'missing_fields', 'extracted_data'} while details are missing, then
+    {'status': 'complete', 'extracted_data'} and forgets the session. Running
+    the action is left to the caller.
+    """
+    state = session_store.get(session_id)
+    if state is None:
+        if extracted_data is None:
+            extracted_data = extract_intent_and_details(user_input)
+        state = {'extracted_data': extracted_data, 'missing_fields': []}
+    invalid_field = None
+    if state['missing_fields']:
+        # The reply to the field asked for last turn; parsed locally when possible
         current_field = state['missing_fields'][0]
-        state['extracted_data'][current_field] = user_input
-        state['missing_fields'].pop(0)
-        
-        # Check if more fields needed
-        missing = check_missing_fields(state['extracted_data'])
-        if missing:
-            state['missing_fields'] = missing
-            return {'status': 'collecting', 'next_field': missing[0]}
+        value = slot_parser.parse_field(current_field, user_input)
+        if value is None:
+            value = extract_field(current_field, user_input)
+        if value is None:
+            invalid_field = current_field
         else:
-            # Process complete data
-            result = process_web_request(state['extracted_data'])
-            del conversation_states[session_id]  # Clear state
-            return {'status': 'complete', 'result': result}
-    
-    return {'error': 'Invalid conversation state'}
+            state['extracted_data'][current_field] = value
+
+    missing = check_missing_fields(state['extracted_data'])
+    if missing:
+        state['missing_fields'] = missing
+        session_store.set(session_id, state)
+        return {'status': 'collecting', 'next_field': missing[0], 'invalid_field': invalid_field,
+                'missing_fields': missing, 'extracted_data': state['extracted_data']}
+
+    session_store.delete(session_id)  # Clear state
+    return {'status': 'complete', 'extracted_data': state['extracted_data']}
+
+FIELD_DESCRIPTIONS = {
+    "name": "full name",
+    "age": "age in years",
+    "gender": "gender (Male, Female or Other)",
+    "contact_number": "phone number",
+    "email": "email address",
+    "department": "medical department",
+    "appointment_date": "appointment date (YYYY-MM-DD)",
+    "appointment_time": "appointment time (HH:MM, 24-hour)",
+    "old_date": "current appointment date (YYYY-MM-DD)",
+    "old_time": "current appointment time (HH:MM, 24-hour)",
+    "new_date": "new appointment date (YYYY-MM-DD)",
+    "new_time": "new appointment time (HH:MM, 24-hour)",
+}
+
+register(PromptTemplate("extract_field", "", """
+    A patient booking a doctor's appointment was asked for their {field}.
+    Today's date is {today}. Their reply was: "{user_input}"
+    Return only the value in the requested format, or NONE if the reply doesn't contain it.
+    """))
+
+@traced()
+def extract_field(field, user_input):
+    """
+    LLM fallback for a follow-up answer slot_parser couldn't read, e.g. "thirty
+    four" for the age. Returns the normalized value or None.
+    """
+    prompt = render_prompt("extract_field", field=FIELD_DESCRIPTIONS.get(field, field), user_input=user_input)
+    try:
+        record_llm_call("extract_field")
+        value = singleflight.invoke(llm, prompt).content.strip().strip('"')
+    except Exception as e:
+        print("LLM Field Extraction Error:", e)
+        return None
+    if not value or value.upper() == "NONE":
+        return None
+    return slot_parser.parse_field(field, value)
 
 def check_missing_fields(data):
-    required = []
-    if data.get('intent') == 'book':
-        required = ["name", "appointment_date", "appointment_time", 
-                   "age", "gender", "contact_number", "email", 
-                   "department"]
-    # Add other intents as needed...
-    
+    required = {
+        'book': ["name", "appointment_date", "appointment_time",
+                 "age", "gender", "contact_number", "email",
+                 "department"],
+        'reschedule': ["name", "old_date", "old_time", "new_date", "new_time"],
+        'cancel': ["name", "appointment_date", "appointment_time"],
+    }.get(data.get('intent'), [])
+
     return [field for field in required if not data.get(field)]
 
 def process_web_request(data):
@@ -99,222 +151,69 @@ def process_web_request(data):
 
 def convert_to_24hour_format(time_str):
     """Convert 12-hour time format to 24-hour format"""
-    if not time_str:
-        return None
-        
-    # Check if already in 24-hour format (no AM/PM)
-    if "AM" not in time_str.upper() and "PM" not in time_str.upper() and ":" in time_str:
-        return time_str
-    
-    # Handle formats like "5 PM", "5PM", "5:30 PM", etc.
-    time_str = time_str.strip().upper()
-    
-    # Extract hours, minutes, and AM/PM
-    match = re.match(r"(\d+)(?::(\d+))?\s*(AM|PM)?", time_str)
-    if match:
-        hours, minutes, period = match.groups()
-        hours = int(hours)
-        minutes = int(minutes) if minutes else 0
-        
-        # Convert to 24-hour format
-        if period == "PM" and hours < 12:
-            hours += 12
-        elif period == "AM" and hours == 12:
-            hours = 0
-            
-        return f"{hours:02d}:{minutes:02d}"
-    
-    return time_str
+    return normalize_time(time_str)
 
 def convert_relative_date(date_text):
     """Convert relative date terms to actual dates if they weren't converted by the LLM"""
-    today = datetime.date.today()
-    
-    if not date_text:
-        return None
-        
-    # Check if date is already in YYYY-MM-DD format
-    if isinstance(date_text, str) and len(date_text) == 10 and date_text[4] == '-' and date_text[7] == '-':
-        return date_text
-        
-    date_text = str(date_text).lower()
-    
-    if date_text == "today":
-        return today.strftime('%Y-%m-%d')
-    elif date_text == "tomorrow":
-        return (today + datetime.timedelta(days=1)).strftime('%Y-%m-%d')
-    elif date_text == "day after tomorrow":
-        return (today + datetime.timedelta(days=2)).strftime('%Y-%m-%d')
-    elif "next week" in date_text:
-        return (today + datetime.timedelta(days=7)).strftime('%Y-%m-%d')
-    
-    # Handle formats like "22March", "22-March", "March22", etc.
-    date_patterns = [
-        # Day first patterns (22March, 22-March, 22 March)
-        r"(\d{1,2})[\s-]?(january|february|march|april|may|june|july|august|september|october|november|december)",
-        r"(\d{1,2})[\s-]?(jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)",
-        # Month first patterns (March22, March-22, March 22)
-        r"(january|february|march|april|may|june|july|august|september|october|november|december)[\s-]?(\d{1,2})",
-        r"(jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[\s-]?(\d{1,2})"
-    ]
-    
-    for pattern in date_patterns:
-        match = re.search(pattern, date_text, re.IGNORECASE)
-        if match:
-            groups = match.groups()
-            day = groups[0] if groups[0].isdigit() else groups[1]
-            month_str = groups[1] if groups[0].isdigit() else groups[0]
-            
-            # Convert month name to number
-            months = {
-                'jan': 1, 'january': 1,
-                'feb': 2, 'february': 2,
-                'mar': 3, 'march': 3,
-                'apr': 4, 'april': 4,
-                'may': 5,
-                'jun': 6, 'june': 6,
-                'jul': 7, 'july': 7,
-                'aug': 8, 'august': 8,
-                'sep': 9, 'september': 9,
-                'oct': 10, 'october': 10,
-                'nov': 11, 'november': 11,
-                'dec': 12, 'december': 12
-            }
-            
-            month = months.get(month_str.lower())
-            if month:
-                try:
-                    return datetime.date(today.year, month, int(day)).strftime('%Y-%m-%d')
-                except ValueError:
-                    pass  # Invalid date (e.g., February 30)
-    
-    # Try to parse date in common formats
+    return normalize_date(date_text)
+
+def build_extraction_prompt(user_input, include_route=False):
+    # The prompt text lives in prompts.py; few-shot examples are picked by a
+    # keyword guess at the intent, and the single-pass router also gets the
+    # medical example when the message doesn't look like an appointment request
+    intent_hint = guess_intent(user_input)
+    if include_route:
+        return render_prompt("route_and_extract", intent_hint or "medical", user_input=user_input)
+    return render_prompt("extract", intent_hint, user_input=user_input)
+
+def parse_extraction_response(response):
+    # Tolerates code fences, surrounding prose, trailing commas and single quotes,
+    # so a slightly malformed answer doesn't send the user back for another try
     try:
-        # Month name formats like "March 15"
-        for fmt in ["%B %d", "%b %d", "%B %dth", "%b %dth"]:
-            try:
-                parsed_date = datetime.datetime.strptime(date_text, fmt)
-                # Set the year to current year
-                return datetime.date(today.year, parsed_date.month, parsed_date.day).strftime('%Y-%m-%d')
-            except ValueError:
-                pass
-        
-        # Try more formats like MM/DD or MM-DD
-        for fmt in ["%m/%d", "%m-%d"]:
-            try:
-                parsed_date = datetime.datetime.strptime(date_text, fmt)
-                # Set the year to current year
-                return datetime.date(today.year, parsed_date.month, parsed_date.day).strftime('%Y-%m-%d')
-            except ValueError:
-                pass
-    except Exception:
-        # If all parsing fails, return the original text
-        pass
-    
-    return date_text
+        data, repaired = structured_output.loads(response)
+        extracted_data = structured_output.validate(data)
+    except ValueError as e:
+        record_parse("failed")
+        print(f"❌ JSON Parsing Error ({e}): LLM Response: {response}")
+        return {"error": "Could not process input"}
+    record_parse("repaired" if repaired else "parsed")
+
+    # Apply date and time conversion as a fallback in case the LLM didn't convert properly
+    normalize_record(extracted_data)
+
+    return extracted_data
 
+@traced()
 def extract_intent_and_details(user_input):
-    today_date = datetime.date.today().strftime('%Y-%m-%d')
-    tomorrow_date = (datetime.date.today() + datetime.timedelta(days=1)).strftime('%Y-%m-%d')
-    
-    prompt = f"""
-    You are an AI assistant that extracts structured details from user requests about doctor appointments.  
-    **Return only a valid JSON object** with the following keys:  
-    - `"intent"`: "book", "reschedule", "cancel", or "view"
-    - `"name"`: Name of the patient (Necessary)  
-    - `"appointment_date"`: Date of the appointment (Necessary): Convert relative terms like "today", "tomorrow", or "next week" into actual dates in format "YYYY-MM-DD"
-    - `"appointment_time"`: Time of the appointment (if mentioned, else null)  
-    - `"doctor"`: Doctor's name or specialization (if mentioned, else null)  
-    - `"age"`: Patient's age (if mentioned, else null)  
-    - `"gender"`: Patient's gender (if mentioned, else null)
-    - `"contact_number"`: Contact number (if mentioned, else null)  
-    - `"email"`: Email address (if mentioned, else null)
-    - `"department"`: Department if no doctors mentioned already(if mentioned, else null)  Capitalise the first letter of the department Name
-    
-    For reschedule intent, also include:
-    - `"old_date"`: Original appointment date (if mentioned, else null)
-    - `"old_time"`: Original appointment time (if mentioned, else null)
-    - `"new_date"`: New appointment date (if mentioned, else null)
-    - `"new_time"`: New appointment time (if mentioned, else null)
-
-    IMPORTANT: For any relative dates like "today", "tomorrow", or "next Tuesday", convert them to the actual date in YYYY-MM-DD format. Today's date is {today_date}.
-
-    Example Inputs and Outputs:
-    1. **User:** "Book an appointment for Alice at 4:30 PM with Dr. Smith tomorrow."  
-       **Output:**  
-       ```json
-       {{"intent": "book", "name": "Alice", "appointment_date": "{tomorrow_date}", "appointment_time": "4:30 PM", "doctor": "Dr. Smith", "age": null, "gender": null, "contact_number": null, "email": null, "department": null}}
-       ```
-
-    2. **User:** "Cancel my appointment with Dr. Brown on March 10."  
-       **Output:**  
-       ```json
-       {{"intent": "cancel", "name": null, "appointment_date": "2025-03-10", "appointment_time": null, "doctor": "Dr. Brown", "age": null, "gender": null, "contact_number": null, "email": null, "department": null}}
-       ```
-       
-    3. **User:** "Reschedule my March 15th appointment from 2:00 PM to 4:00 PM on March 20th."
-       **Output:**
-       ```json
-       {{"intent": "reschedule", "name": null, "old_date": "2025-03-15", "old_time": "2:00 PM", "new_date": "2025-03-20", "new_time": "4:00 PM", "doctor": null, "age": null, "gender": null, "contact_number": null, "email": null, "department": null}}
-       ```
-       
-    4. **User:** "Show me my appointments"
-       **Output:**
-       ```json
-       {{"intent": "view", "name": null, "appointment_date": null, "appointment_time": null, "doctor": null, "age": null, "gender": null, "contact_number": null, "email": null, "department": null}}
-       ```
-
-    **User Input:** "{user_input}"  
-    **Output:** (JSON format only)
-    """
-    
-    response = llm.invoke(prompt).content.strip()
+    record_llm_call("extract_intent_and_details")
+    try:
+        response = singleflight.invoke(structured_output.json_llm(llm), build_extraction_prompt(user_input)).content.strip()
+    except Exception as e:
+        print("LLM Extraction Error:", e)
+        return {"error": "Could not process input"}
+    return parse_extraction_response(response)
 
+@traced()
+def route_and_extract(user_input):
+    """
+    Classify the message and extract appointment details in a single LLM call.
+    The returned dict carries a "route" key ("medical" or "appointment") next to
+    the usual extraction fields.
+    """
+    record_llm_call("route_and_extract")
+    prompt = build_extraction_prompt(user_input, include_route=True)
     try:
-        # Remove potential markdown code block formatting if present
-        if response.startswith("```json"):
-            response = response.replace("```json", "", 1)
-        if response.endswith("```"):
-            response = response.rsplit("```", 1)[0]
-            
-        extracted_data = json.loads(response.strip())  # Parse JSON safely
-        
-        # Apply date conversion as a fallback in case the LLM didn't convert properly
-        if "appointment_date" in extracted_data and extracted_data["appointment_date"]:
-            extracted_data["appointment_date"] = convert_relative_date(extracted_data["appointment_date"])
-        
-        if "old_date" in extracted_data and extracted_data["old_date"]:
-            extracted_data["old_date"] = convert_relative_date(extracted_data["old_date"])
-            
-        if "new_date" in extracted_data and extracted_data["new_date"]:
-            extracted_data["new_date"] = convert_relative_date(extracted_data["new_date"])
-        
-        # Convert times to 24-hour format
-        if "appointment_time" in extracted_data and extracted_data["appointment_time"]:
-            extracted_data["appointment_time"] = convert_to_24hour_format(extracted_data["appointment_time"])
-            
-        if "old_time" in extracted_data and extracted_data["old_time"]:
-            extracted_data["old_time"] = convert_to_24hour_format(extracted_data["old_time"])
-            
-        if "new_time" in extracted_data and extracted_data["new_time"]:
-            extracted_data["new_time"] = convert_to_24hour_format(extracted_data["new_time"])
+        response = singleflight.invoke(structured_output.json_llm(llm, include_route=True), prompt).content.strip()
+    except Exception as e:
+        print("LLM Extraction Error:", e)
+        return {"error": "Could not process input", "route": "appointment"}
+    return parse_route_and_extract_response(response)
 
-         # Add conversions for all date/time fields
-        date_fields = ["appointment_date", "old_date", "new_date"]
-        time_fields = ["appointment_time", "old_time", "new_time"]
-        
-        for field in date_fields:
-            if extracted_data.get(field):
-                extracted_data[field] = convert_relative_date(extracted_data[field])
-                
-        for field in time_fields:
-            if extracted_data.get(field):
-                extracted_data[field] = convert_to_24hour_format(extracted_data[field])
-        
-        return extracted_data    
-    except json.JSONDecodeError:
-        print(f"❌ JSON Parsing Error: GPT-4o Response: {response}")
-        return {"error": "Could not process input"}
+def parse_route_and_extract_response(response):
+    extracted_data = parse_extraction_response(response)
+    route = str(extracted_data.get("route") or "").strip().lower()
+    extracted_data["route"] = "medical" if route.startswith("medical") else "appointment"
+    return extracted_data
 
 # Collect missing details from the user
 def collect_missing_details(data):
@@ -1,13 +1,34 @@
-from flask import Flask, request, jsonify, render_template
+import datetime
+import hashlib
+import json
+import os
+import queue
+import time
+from flask import Flask, Response, request, jsonify, render_template, stream_with_context
 from flask_cors import CORS
 import sqlite3
-from database import init_db, book_appointment, reschedule_appointment, cancel_appointment, get_appointments
-from ai import extract_intent_and_details, collect_missing_details, process_request, convert_relative_date, convert_to_24hour_format, handle_web_request, check_missing_fields, process_web_request
-from medical_ai import handle_medical_query
+from database import init_db, book_appointment, book_appointments_bulk, ALLOCATION_POLICIES, get_doctor_schedule, set_doctor_schedule, reschedule_appointment, cancel_appointment, query_appointments, get_change_token, get_changes_since, start_change_watcher, pool_stats, APPOINTMENT_FIELDS, EXTERNAL_CHANGE_MAX_ROWS
+from change_bus import bus as change_bus
+from bulk import FORMATS, MEDIA_TYPES, detect_format, export_chunks, import_stream
+import availability
+from datetime_normalizer import parse_date, parse_time
+from ai import extract_intent_and_details, route_and_extract, collect_missing_details, process_request, convert_relative_date, convert_to_24hour_format, handle_web_request, pending_reply, check_missing_fields, process_web_request
+from medical_ai import handle_medical_query, stream_medical_query
 from detect_intent import detect_intent
+from metrics import reset_llm_calls, request_llm_calls, reset_db_queries, request_db_queries, record_duration, record_turn, turn_stats, parse_stats, record_http_request, prometheus_text
+from intent_classifier import classify_intent, is_confident
+from prompts import prompt_stats
+from llm_client import LLM_WARMUP, warm_up
+from singleflight import coalesce_stats
+import tracing
+from profiler import PROFILER, profiler
 
 app = Flask(__name__, template_folder='templates', static_folder='static')
 
+# Classify and extract with one LLM call. Set SINGLE_PASS_ROUTING=false to go back to
+# the detect_intent() + extract_intent_and_details() path.
+SINGLE_PASS_ROUTING = os.getenv("SINGLE_PASS_ROUTING", "true").lower() not in ("0", "false", "no")
+
 def route_query(user_input):    
     # """
     # Determines the type of query based on keywords.
@@ -21,36 +42,157 @@ def route_query(user_input):
     # return "appointment"
     return detect_intent(user_input)
 
+def route_and_extract_query(user_input):
+    """
+    Returns (route, extracted_data). extracted_data is None for medical queries.
+    """
+    if not SINGLE_PASS_ROUTING:
+        if route_query(user_input) == "medical":
+            return "medical", None
+        return "appointment", extract_intent_and_details(user_input)
+
+    # Confident local classification skips the routing part of the prompt entirely:
+    # medical queries go straight to the medical agent, appointments to extraction
+    label, confidence = classify_intent(user_input)
+    if is_confident(confidence):
+        if label == "medical":
+            return "medical", None
+        return "appointment", extract_intent_and_details(user_input)
+
+    extracted_data = route_and_extract(user_input)
+    if extracted_data.get("route") == "medical":
+        return "medical", None
+    return "appointment", extracted_data
+
 # Modify CORS initialization
 CORS(app, resources={r"/*": {"origins": "*"}})
 
 init_db()
 
+# Load the free-slot index for /api/availability and booking suggestions
+availability.index.reload()
+
+# Build the model client now, off the request path, instead of on the first chat message
+if LLM_WARMUP:
+    warm_up()
+
+# Stack sampling for /debug/profile
+if PROFILER:
+    profiler.start()
+
 chat_history = []
 
+@app.before_request
+def start_request_metrics():
+    reset_llm_calls()
+    reset_db_queries()
+    tracing.start_trace(tracing.incoming_trace_id(request.headers))
+
+CHAT_ENDPOINTS = ('/ai-response', '/chat')
+
+@app.after_request
+def report_llm_calls(response):
+    calls = request_llm_calls()
+    response.headers['X-LLM-Calls'] = str(len(calls))
+    response.headers['X-DB-Queries'] = str(request_db_queries())
+    trace = tracing.end_trace(request.path)
+    if trace is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        if response.is_streamed:
+            # This runs before a streamed body is generated, so time it to the end of the stream
+            method, status = request.method, response.status_code
+            response.call_on_close(lambda: record_http_request(route, method, status, trace.elapsed()))
+        else:
+            record_http_request(route, request.method, response.status_code, trace.elapsed())
+        if tracing.TRACE_ID_HEADER:
+            response.headers['X-Trace-Id'] = trace.trace_id
+        if trace.spans:
+            response.headers['Server-Timing'] = trace.server_timing()
+    if request.path in CHAT_ENDPOINTS and request.method == 'POST':
+        record_turn(len(calls))
+    if calls:
+        stats = turn_stats()
+        print(f"LLM calls for {request.path}: {len(calls)} ({', '.join(calls)}); "
+              f"{stats['local_fraction']:.0%} of {stats['turns']} turns served without the model")
+    return response
+
 @app.route('/')
 def home():
     return render_template('index.html')
 
 @app.route('/ai-response', methods=['POST'])
 def ai_response():
+    started = time.perf_counter()
     data = request.json
     user_input = data.get('message')
-    session_id = data.get('session_id', 'global_session')
-    if route_query(user_input) == "medical":  # check if it's a medical query
+    session_id = data.get('session_id')
+
+    # The answer to a question we asked while collecting appointment details
+    turn = pending_details_turn(user_input, session_id)
+    if turn is not None:
+        payload, status = turn
+        return jsonify(payload), status
+
+    # Step 1: Route the query and extract intent and details
+    route, extracted_data = route_and_extract_query(user_input)
+    if route == "medical":  # check if it's a medical query
         # Medical logic
+        if data.get('stream'):
+            return Response(stream_with_context(medical_answer_events(stream_medical_query(user_input), started)),
+                            mimetype='text/event-stream', headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
         response = handle_medical_query(user_input)
         return jsonify({"message": response})
 
     # 2. Otherwise, do the existing appointment logic
-    extracted_data = extract_intent_and_details(user_input)
-    if not extracted_data or "intent" not in extracted_data:
-        return jsonify({"error": "Couldn't understand request"}), 400   
+    if session_id:
+        payload, status = collect_appointment_details(user_input, session_id, extracted_data or {})
+    else:
+        payload, status = handle_appointment_request(extracted_data)
+    return jsonify(payload), status
+
+def pending_details_turn(user_input, session_id):
+    """
+    (payload, status) when the session is collecting appointment details and
+    `user_input` answers the question asked or gives up on it; None when the
+    message is to be routed as a new one.
+    """
+    reply = pending_reply(session_id, user_input)
+    if reply == "stop":
+        return {"message": "Okay, I've stopped collecting the appointment details."}, 200
+    if reply == "answer":
+        return collect_appointment_details(user_input, session_id)
+    return None
 
-    # Step 1: Extract intent and details
-    extracted_data = extract_intent_and_details(user_input)
-    if not extracted_data or "intent" not in extracted_data:
-        return jsonify({"error": "Couldn't understand request"}), 400
+def collect_appointment_details(user_input, session_id, extracted_data=None):
+    """
+    Multi-turn version of handle_appointment_request(): the details collected so
+    far live in the session store, each reply fills in the next missing field,
+    and the action runs once nothing is missing. Pass `extracted_data` on the
+    first turn only.
+    """
+    if extracted_data is not None and not extracted_data.get("intent"):
+        return handle_appointment_request(extracted_data)
+
+    turn = handle_web_request(user_input, session_id, extracted_data)
+    if turn['status'] == 'collecting':
+        payload = {
+            "missing_fields": turn['missing_fields'],
+            "current_state": turn['extracted_data'],
+            "intent": turn['extracted_data'].get('intent')
+        }
+        if turn['invalid_field']:
+            payload["invalid_field"] = turn['invalid_field']
+        return payload, 200
+    return handle_appointment_request(turn['extracted_data'])
+
+def handle_appointment_request(extracted_data):
+    """
+    Check the extracted appointment details and run the action once they are
+    complete. Returns (payload, status_code); shared by the WSGI and ASGI views.
+    """
+    # validate() always sets "intent", to None when the answer had no usable one
+    if not extracted_data or not extracted_data.get("intent"):
+        return {"error": "Couldn't understand request"}, 400
 
     intent = extracted_data["intent"]
     
@@ -66,11 +208,11 @@ def ai_response():
     
     # If missing fields, return them
     if missing:
-        return jsonify({
+        return {
             "missing_fields": missing,
             "current_state": extracted_data,
             "intent": intent
-        })
+        }, 200
 
     # Step 3: All fields present - process immediately
     try:
@@ -100,15 +242,24 @@ def ai_response():
                 extracted_data["appointment_time"]
             )
         else:
-            return jsonify({"error": "Invalid intent"}), 400
+            return {"error": "Invalid intent"}, 400
 
-        return jsonify({
+        if intent == "book" and result.get("error", "").startswith("No doctor available"):
+            # Offer the department's next free slots instead of a dead end
+            suggestions = availability.suggest_alternatives(
+                extracted_data.get("department", ""), extracted_data["appointment_date"], extracted_data["appointment_time"])
+            if suggestions:
+                times = ", ".join(f"{s['date']} at {s['time']} with {s['doctor_name']}" for s in suggestions)
+                return {"error": f"No doctor is available at that time. The next free slots are {times}.",
+                        "suggestions": suggestions, "appointment": result}, 200
+
+        return {
             "message": f"Appointment {intent}ed successfully!",
             "appointment": result
-        })
+        }, 200
 
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return {"error": str(e)}, 500
 
 def check_missing_fields(data):
     intent = data.get('intent', 'book')
@@ -136,13 +287,37 @@ def book():
     result = book_appointment(data['name'], data['age'], data['gender'], data['contact_number'], data['email'], data['medical_history'], data['appointment_date'], data['appointment_time'])
     return jsonify(result), (400 if "error" in result else 200)
 
+MAX_BOOKING_BATCH = 1000
+
+@app.route('/api/book-appointments:batch', methods=['POST'])
+def book_batch():
+    """
+    Book many appointments in one transaction. The body is a list of
+    /api/book-appointment bodies, or {"appointments": [...], "all_or_nothing":
+    false, "policy": "first_free"}. The response has one result per booking,
+    in order; with all_or_nothing nothing is booked unless everything can be.
+    """
+    data = request.get_json(silent=True)
+    if isinstance(data, list):
+        data = {"appointments": data}
+    if not isinstance(data, dict) or not isinstance(data.get('appointments'), list) or not data['appointments']:
+        return jsonify({"error": "Expected a non-empty list of appointments"}), 400
+    if len(data['appointments']) > MAX_BOOKING_BATCH:
+        return jsonify({"error": f"At most {MAX_BOOKING_BATCH} appointments per batch"}), 400
+    policy = data.get('policy')
+    if policy is not None and policy not in ALLOCATION_POLICIES:
+        return jsonify({"error": f"Unknown policy '{policy}'"}), 400
+    result = book_appointments_bulk(data['appointments'], policy=policy,
+                                    all_or_nothing=bool(data.get('all_or_nothing')))
+    return jsonify(result), 200
+
 @app.route('/api/reschedule-appointment', methods=['POST'])
 def reschedule():
     data = request.json
     if not all([data.get(k) for k in ('name', 'old_date', 'old_time', 'new_date', 'new_time')]):
         return jsonify({"error": "Missing data"}), 400
     success = reschedule_appointment(data['name'], data['old_date'], data['old_time'], data['new_date'], data['new_time'])
-    return jsonify({"message": "Appointment rescheduled"}) if success else jsonify({"error": "Appointment not found"}), 404
+    return (jsonify({"message": "Appointment rescheduled"}), 200) if success else (jsonify({"error": "Appointment not found"}), 404)
 
 @app.route('/api/cancel-appointment', methods=['POST'])
 def cancel():
@@ -150,11 +325,290 @@ def cancel():
     if not all([data.get(k) for k in ('name', 'date', 'time')]):
         return jsonify({"error": "Missing data"}), 400
     success = cancel_appointment(data['name'], data['date'], data['time'])
-    return jsonify({"message": "Appointment canceled"}) if success else jsonify({"error": "Appointment not found"}), 404
+    return (jsonify({"message": "Appointment canceled"}), 200) if success else (jsonify({"error": "Appointment not found"}), 404)
+
+MAX_AVAILABILITY_DAYS = 31
+MAX_NEXT_AVAILABLE = 50
+
+@app.route('/api/availability', methods=['GET'])
+def get_availability():
+    """
+    Free appointment slots from the in-memory availability index.
+
+    Query parameters:
+      department or doctor_id   whose slots (a doctor_id can be combined with its department)
+      date                      first day, default today
+      days                      number of days listed, 1-31 (default 1)
+      next                      instead of listing days, the first N (max 50) free
+                                slots at or after date and time, e.g. next=3
+      time                      with next: the earliest time on the first day, default now
+    """
+    args = request.args
+    department, doctor_id = args.get('department') or None, args.get('doctor_id') or None
+    if department is None and doctor_id is None:
+        return jsonify({"error": "department or doctor_id is required"}), 400
+    try:
+        day = parse_date(args['date']) if args.get('date') else datetime.date.today()
+        if day is None:
+            raise ValueError(f"Can't read date '{args['date']}'")
+        days = args.get('days', 1, type=int)
+        if not 1 <= days <= MAX_AVAILABILITY_DAYS:
+            raise ValueError(f"days must be between 1 and {MAX_AVAILABILITY_DAYS}")
+        count = args.get('next', type=int)
+        if count is not None and not 1 <= count <= MAX_NEXT_AVAILABLE:
+            raise ValueError(f"next must be between 1 and {MAX_NEXT_AVAILABLE}")
+        at = parse_time(args['time']) if args.get('time') else None
+        if args.get('time') and at is None:
+            raise ValueError(f"Can't read time '{args['time']}'")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    if count is not None:
+        after = datetime.datetime.combine(day, datetime.time(*at) if at else datetime.time())
+        return jsonify({"next_available": availability.index.next_available(
+            department=department, doctor_id=doctor_id, after=after, limit=count)})
+    return jsonify({"days": availability.index.free_slots(day.isoformat(), department=department,
+                                                          doctor_id=doctor_id, days=days)})
+
+@app.route('/api/doctors/<doctor_id>/schedule', methods=['GET', 'PUT'])
+def doctor_schedule(doctor_id):
+    """
+    A doctor's working hours, breaks and holidays. PUT replaces them with
+    {"hours": [{"weekday", "start_time", "end_time", "slot_minutes"}],
+     "breaks": [{"weekday" (optional), "start_time", "end_time"}],
+     "holidays": [{"start_date", "end_date", "reason"}]}
+    (weekday 0 is Monday); a doctor without hours works the default hours.
+    """
+    if request.method == 'PUT':
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict) or not all(isinstance(data.get(k, []), list) for k in ('hours', 'breaks', 'holidays')):
+            return jsonify({"error": "Expected {\"hours\": [...], \"breaks\": [...], \"holidays\": [...]}"}), 400
+        try:
+            if not set_doctor_schedule(doctor_id, data.get('hours', []), data.get('breaks', []), data.get('holidays', [])):
+                return jsonify({"error": "Doctor not found"}), 404
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+    schedule = get_doctor_schedule(doctor_id)
+    if schedule is None:
+        return jsonify({"error": "Doctor not found"}), 404
+    return jsonify(schedule)
+
+MAX_PAGE_SIZE = 1000
 
 @app.route('/api/appointments', methods=['GET'])
 def list_appointments():
-    return jsonify({"appointments": get_appointments()})
+    """
+    Appointment listing. Without query parameters it returns every appointment.
+
+    Query parameters:
+      limit, cursor         page size (max 1000) and the next_cursor of the previous page
+      order                 "asc" (default) or "desc" booking order
+      since                 only rows changed after this change_token, each with "matches"
+                            (false once it no longer passes the filters); deleted rows
+                            come back as {"id", "deleted": true}
+      date_from, date_to, doctor_id, department, status, patient_id, patient
+                            filters (patient matches the patient name)
+      fields                comma-separated appointment fields to return
+
+    Responses carry an ETag derived from the change token, so a client sending
+    If-None-Match gets 304 Not Modified until an appointment changes.
+    """
+    args = request.args
+    try:
+        limit = args.get('limit', type=int)
+        if limit is not None and not 1 <= limit <= MAX_PAGE_SIZE:
+            raise ValueError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+        since = args.get('since')
+        since = int(since) if since not in (None, '') else None
+        cursor = args.get('cursor') or None
+        if cursor is not None:
+            cursor = int(cursor)
+        order = args.get('order', 'asc')
+        if order not in ('asc', 'desc'):
+            raise ValueError("order must be 'asc' or 'desc'")
+        fields = [f for f in args.get('fields', '').split(',') if f]
+        unknown = [f for f in fields if f not in APPOINTMENT_FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    query_key = hashlib.sha1(request.query_string).hexdigest()[:12]
+    etag = f"{get_change_token()}-{query_key}"
+    if request.if_none_match.contains_weak(etag):
+        response = app.response_class(status=304)
+        response.set_etag(etag, weak=True)
+        return response
+
+    result = query_appointments(
+        limit=limit, cursor=cursor, since=since, order=order,
+        date_from=args.get('date_from'), date_to=args.get('date_to'),
+        doctor_id=args.get('doctor_id'), department=args.get('department'),
+        status=args.get('status'), patient_id=args.get('patient_id'),
+        patient_name=args.get('patient'),
+    )
+    if fields:
+        # The since-mode flags are kept whatever fields were asked for
+        keep = fields + ["matches", "deleted"]
+        result["appointments"] = [{f: appointment[f] for f in keep if f in appointment}
+                                  for appointment in result["appointments"]]
+
+    response = jsonify(result)
+    response.set_etag(f"{result['change_token']}-{query_key}", weak=True)
+    return response
+
+@app.route('/api/appointments/import', methods=['POST'])
+def import_appointments_api():
+    """
+    Bulk import from the request body, CSV or JSONL (Content-Type text/csv or
+    application/x-ndjson, or ?format=), with the same fields as the listing.
+    The body is read as it arrives and written batch_size rows per transaction.
+    Returns the summary of database.import_appointments().
+    """
+    fmt = request.args.get('format') or detect_format(content_type=request.content_type)
+    if fmt not in FORMATS:
+        return jsonify({"error": f"Send text/csv or application/x-ndjson, or pass format={'|'.join(FORMATS)}"}), 400
+    batch_size = request.args.get('batch_size', type=int)
+    if batch_size is not None and batch_size < 1:
+        return jsonify({"error": "batch_size must be positive"}), 400
+    summary = import_stream(request.stream, fmt, **({"batch_size": batch_size} if batch_size else {}))
+    return jsonify(summary)
+
+@app.route('/api/appointments/export', methods=['GET'])
+def export_appointments_api():
+    """
+    Every appointment matching the filters of /api/appointments (date_from,
+    date_to, doctor_id, department, status) as CSV (default) or JSONL
+    (?format=jsonl), streamed as it is read from the database.
+    """
+    fmt = request.args.get('format', 'csv')
+    if fmt not in FORMATS:
+        return jsonify({"error": f"format must be one of {', '.join(FORMATS)}"}), 400
+    args = request.args
+    chunks = export_chunks(fmt, date_from=args.get('date_from'), date_to=args.get('date_to'),
+                           doctor_id=args.get('doctor_id'), department=args.get('department'),
+                           status=args.get('status'))
+    return Response(stream_with_context(chunks), mimetype=MEDIA_TYPES[fmt], headers={
+        'Content-Disposition': f'attachment; filename=appointments.{fmt}',
+        'X-Accel-Buffering': 'no',
+    })
+
+SSE_HEARTBEAT_SECONDS = 15
+
+def _sse(data, event=None, event_id=None):
+    message = ""
+    if event_id is not None:
+        message += f"id: {event_id}\n"
+    if event:
+        message += f"event: {event}\n"
+    return message + f"data: {json.dumps(data)}\n\n"
+
+def medical_answer_events(chunks, started):
+    """
+    Server-Sent Events for a streamed medical answer: a "token" event with
+    {"text"} per piece, then "done" with the whole answer as {"message"}.
+    Records time to the first token and to the end of the answer, both measured
+    from `started` (the request's arrival).
+    """
+    answer = []
+    ttfb = None
+    for text in chunks:
+        if ttfb is None:
+            ttfb = time.perf_counter() - started
+            record_duration("medical_ttfb_seconds", ttfb)
+        answer.append(text)
+        yield _sse({"text": text}, "token")
+    message = "".join(answer).strip()
+    total = time.perf_counter() - started
+    record_duration("medical_stream_seconds", total)
+    print(f"Streamed medical answer: first token {ttfb or total:.2f}s, {len(message)} chars in {total:.2f}s")
+    yield _sse({"message": message}, "done")
+
+@app.route('/api/appointments/stream', methods=['GET'])
+def stream_appointments():
+    """
+    Server-Sent Events stream of appointment changes.
+
+    Events: "appointment" with {"type", "change_token", "appointment"} for every
+    committed write (type "deleted", with only the id, for a deleted row), and
+    "resync" when the client should reload its list. Each
+    event id is a change token, so a reconnecting browser sends Last-Event-ID and
+    gets the changes it missed. Idle connections cost no database queries; a
+    comment line is sent every SSE_HEARTBEAT_SECONDS to keep proxies from closing
+    them. Each open stream holds a worker thread, so run gunicorn with threads.
+    """
+    last_event_id = request.headers.get('Last-Event-ID', type=int)
+    subscription = change_bus.subscribe()
+    start_change_watcher()
+
+    def events():
+        try:
+            token = get_change_token()
+            yield "retry: 3000\n\n"
+            if last_event_id is not None and last_event_id < token:
+                if token - last_event_id > EXTERNAL_CHANGE_MAX_ROWS:
+                    yield _sse({"type": "resync", "change_token": token}, "resync", token)
+                else:
+                    for change in get_changes_since(last_event_id):
+                        yield _sse(change, "appointment", change["change_token"])
+            yield _sse({"change_token": token}, "ready")
+
+            while True:
+                try:
+                    change = subscription.get(timeout=SSE_HEARTBEAT_SECONDS)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                if subscription.overflowed or change["type"] == "resync":
+                    subscription.overflowed = False
+                    yield _sse({"type": "resync", "change_token": change["change_token"]}, "resync", change["change_token"])
+                else:
+                    yield _sse(change, "appointment", change["change_token"])
+        finally:
+            change_bus.unsubscribe(subscription)
+
+    return Response(events(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
+
+
+@app.route('/api/prompt-stats', methods=['GET'])
+def get_prompt_stats():
+    """Token usage per prompt template since the process started."""
+    return jsonify(prompt_stats())
+
+
+@app.route('/api/parse-stats', methods=['GET'])
+def get_parse_stats():
+    """How often the extraction model's JSON answer was valid, repaired or lost."""
+    return jsonify(parse_stats())
+
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Everything above plus span and request latency histograms, for Prometheus to scrape."""
+    sections = [
+        ("coalesce", coalesce_stats(), None),
+        ("db_pool", pool_stats(), None),
+        ("prompt", prompt_stats(), "template"),
+    ]
+    return Response(prometheus_text(sections), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/debug/profile', methods=['GET'])
+def get_profile():
+    """
+    Stacks seen by the sampling profiler (PROFILER=true), in collapsed format
+    for flamegraph.pl or speedscope; ?reset=1 starts a new profile.
+    """
+    if not profiler.running():
+        return jsonify({"error": "Profiler is off, start the app with PROFILER=true"}), 404
+    stats = profiler.stats()
+    return Response(profiler.collapsed(reset=request.args.get('reset') == '1'), mimetype='text/plain', headers={
+        'X-Profile-Samples': str(stats['samples']),
+        'X-Profile-Overhead': f"{stats['overhead']:.4f}",
+    })
 
 
 @app.route('/chat', methods=['POST'])
@@ -164,37 +618,25 @@ def chat():
     if not user_input:
         return jsonify({"error": "No message provided"}), 400
 
+    session_id = data.get('session_id')
+    turn = pending_details_turn(user_input, session_id)
+    if turn is not None:
+        payload, status = turn
+        return jsonify(payload), status
+
     # Agent 1: Routing Agent
-    query_type = route_query(user_input)
+    query_type, extracted_data = route_and_extract_query(user_input)
 
     if query_type == "medical":
         # Agent 2: Medical Assistant Agent handles the query
         response = handle_medical_query(user_input)
-    else:
-        extracted_data = extract_intent_and_details(user_input)
-        intent = extracted_data.get("intent", "")
-
-        # 1) Check for missing fields
-        missing_fields = check_missing_fields(extracted_data)
-        if missing_fields:
-            return jsonify({
-                "missing_fields": missing_fields,
-                "current_state": extracted_data,
-                "intent": intent
-            })
-
-        # 2) If fields are complete, process the request
-        if intent == "book":
-            result = book_appointment(...)
-            response = f"Appointment booked: {result}"
-        elif intent == "reschedule":
-            ...
-        elif intent == "cancel":
-            ...
-        else:
-            response = "Invalid intent"
-
         return jsonify({"response": response})
 
+    if session_id:
+        payload, status = collect_appointment_details(user_input, session_id, extracted_data or {})
+    else:
+        payload, status = handle_appointment_request(extracted_data)
+    return jsonify(payload), status
+
 if __name__ == '__main__':
     app.run(debug=True)
@@ -0,0 +1,198 @@
+import asyncio
+import json
+import os
+import time
+
+from asgiref.wsgi import WsgiToAsgi
+
+import app as flask_app
+from async_pipeline import aroute_and_extract_query, ahandle_medical_query, astream_medical_query
+from metrics import reset_llm_calls, request_llm_calls, record_duration, record_http_request, record_turn, turn_stats
+import tracing
+
+# ASGI entry point. The LLM-bound endpoints (/ai-response and /chat) run on the
+# event loop so a single worker can hold many conversations open while they wait
+# on the model; every other route is served by the Flask app unchanged.
+#
+#     uvicorn asgi:application --workers 2
+#
+# Flask's own `async def` views still occupy a WSGI worker for the whole request,
+# which is why this is a separate entry point instead of async views in app.py.
+
+# Overall deadline for one chat turn, in seconds
+REQUEST_TIMEOUT_SECONDS = float(os.getenv("REQUEST_TIMEOUT_SECONDS", "60"))
+
+wsgi_application = WsgiToAsgi(flask_app.app)
+
+
+async def _read_json(receive):
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            break
+    try:
+        return json.loads(body or b"null")
+    except ValueError:
+        return None
+
+
+def _trace_headers(trace):
+    headers = []
+    if trace is not None and tracing.TRACE_ID_HEADER:
+        headers.append((b"x-trace-id", trace.trace_id.encode("latin-1")))
+    if trace is not None and trace.spans:
+        headers.append((b"server-timing", trace.server_timing().encode("latin-1")))
+    return headers
+
+
+async def _send_json(send, payload, status=200, llm_calls=0, trace=None):
+    body = json.dumps(payload).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"access-control-allow-origin", b"*"),
+            (b"x-llm-calls", str(llm_calls).encode()),
+        ] + _trace_headers(trace),
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _send_events(send, events, llm_calls=0, trace=None):
+    await send({
+        "type": "http.response.start",
+        "status": 200,
+        "headers": [
+            (b"content-type", b"text/event-stream"),
+            (b"cache-control", b"no-cache"),
+            (b"x-accel-buffering", b"no"),
+            (b"access-control-allow-origin", b"*"),
+            (b"x-llm-calls", str(llm_calls).encode()),
+        ] + _trace_headers(trace),
+    })
+    async for event in events:
+        await send({"type": "http.response.body", "body": event.encode(), "more_body": True})
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def medical_answer_events(chunks, started):
+    """Async version of app.medical_answer_events()."""
+    answer = []
+    ttfb = None
+    async for text in chunks:
+        if ttfb is None:
+            ttfb = time.perf_counter() - started
+            record_duration("medical_ttfb_seconds", ttfb)
+        answer.append(text)
+        yield flask_app._sse({"text": text}, "token")
+    message = "".join(answer).strip()
+    total = time.perf_counter() - started
+    record_duration("medical_stream_seconds", total)
+    print(f"Streamed medical answer: first token {ttfb or total:.2f}s, {len(message)} chars in {total:.2f}s")
+    yield flask_app._sse({"message": message}, "done")
+
+
+async def _appointment_details(user_input, session_id, extracted_data):
+    # Booking, rescheduling and cancelling hit SQLite; keep that off the event loop
+    if session_id:
+        return await asyncio.to_thread(flask_app.collect_appointment_details, user_input, session_id, extracted_data or {})
+    return await asyncio.to_thread(flask_app.handle_appointment_request, extracted_data)
+
+
+async def ai_response(data, started):
+    user_input = data.get('message')
+    session_id = data.get('session_id')
+
+    turn = await asyncio.to_thread(flask_app.pending_details_turn, user_input, session_id)
+    if turn is not None:
+        return turn
+
+    route, extracted_data = await aroute_and_extract_query(user_input, flask_app.SINGLE_PASS_ROUTING)
+    if route == "medical":
+        if data.get('stream'):
+            # Returned as an event stream instead of (payload, status)
+            return medical_answer_events(astream_medical_query(user_input), started), None
+        return {"message": await ahandle_medical_query(user_input)}, 200
+
+    return await _appointment_details(user_input, session_id, extracted_data)
+
+
+async def chat(data, started):
+    user_input = data.get('message')
+    if not user_input:
+        return {"error": "No message provided"}, 400
+
+    session_id = data.get('session_id')
+    turn = await asyncio.to_thread(flask_app.pending_details_turn, user_input, session_id)
+    if turn is not None:
+        return turn
+
+    query_type, extracted_data = await aroute_and_extract_query(user_input, flask_app.SINGLE_PASS_ROUTING)
+    if query_type == "medical":
+        return {"response": await ahandle_medical_query(user_input)}, 200
+
+    return await _appointment_details(user_input, session_id, extracted_data)
+
+
+ASYNC_ROUTES = {
+    "/ai-response": ai_response,
+    "/chat": chat,
+}
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "lifespan":
+        return await _lifespan(receive, send)
+
+    handler = ASYNC_ROUTES.get(scope.get("path"))
+    if scope["type"] != "http" or handler is None or scope["method"] != "POST":
+        return await wsgi_application(scope, receive, send)
+
+    started = time.perf_counter()
+    reset_llm_calls()
+    headers = {name.decode("latin-1").lower(): value.decode("latin-1") for name, value in scope.get("headers", [])}
+    tracing.start_trace(tracing.incoming_trace_id(headers))
+    data = await _read_json(receive)
+    if not isinstance(data, dict):
+        trace = tracing.end_trace(scope["path"])
+        record_http_request(scope["path"], "POST", 400, trace.elapsed())
+        return await _send_json(send, {"error": "Invalid JSON"}, 400, trace=trace)
+
+    try:
+        payload, status = await asyncio.wait_for(handler(data, started), REQUEST_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        payload, status = {"error": "The assistant took too long to respond, please try again"}, 504
+    except Exception as e:
+        print(f"Error handling {scope['path']}:", e)
+        payload, status = {"error": str(e)}, 500
+
+    trace = tracing.end_trace(scope["path"])
+    if status is not None:
+        record_http_request(scope["path"], "POST", status, trace.elapsed())
+    calls = request_llm_calls()
+    record_turn(len(calls))
+    if calls:
+        stats = turn_stats()
+        print(f"LLM calls for {scope['path']}: {len(calls)} ({', '.join(calls)}); "
+              f"{stats['local_fraction']:.0%} of {stats['turns']} turns served without the model")
+    if status is None:
+        # Timed to the end of the stream, not to the headers
+        try:
+            return await _send_events(send, payload, len(calls), trace)
+        finally:
+            record_http_request(scope["path"], "POST", 200, trace.elapsed())
+    await _send_json(send, payload, status, len(calls), trace)
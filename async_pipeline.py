@@ -0,0 +1,180 @@
+import asyncio
+import os
+import time
+import weakref
+
+import ai
+import detect_intent
+import medical_ai
+import singleflight
+import structured_output
+from intent_classifier import classify_intent, is_confident
+from metrics import record_llm_call, record_duration
+from prompts import render as render_prompt
+from tracing import record_usage, traced
+
+# Async counterparts of the LLM-bound steps behind /ai-response and /chat, used by
+# the ASGI entry point (asgi.py). They share prompts, parsing and caches with the
+# sync functions and await the model with `ainvoke` so one worker can serve many
+# conversations while they wait on the LLM.
+
+# Upper bound on in-flight calls per model, and per-call timeout in seconds
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "32"))
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "30"))
+
+# {event loop: {model: semaphore}}; a semaphore can only be used on one loop
+_semaphores = weakref.WeakKeyDictionary()
+
+
+def _semaphore(model):
+    per_loop = _semaphores.setdefault(asyncio.get_running_loop(), {})
+    semaphore = per_loop.get(model)
+    if semaphore is None:
+        semaphore = per_loop[model] = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+    return semaphore
+
+
+async def ainvoke(llm, prompt, stage):
+    """
+    Await one model call, bounded by the model's semaphore and LLM_TIMEOUT_SECONDS.
+    Identical calls already in flight are awaited instead of repeated.
+    """
+    async def call():
+        async with _semaphore(singleflight.model_name(llm)):
+            return await asyncio.wait_for(llm.ainvoke(prompt), LLM_TIMEOUT_SECONDS)
+
+    record_llm_call(stage)
+    response = await singleflight.ainvoke(llm, prompt, call)
+    return response.content.strip()
+
+
+@traced("detect_intent")
+async def adetect_intent(user_input):
+    label, confidence = classify_intent(user_input)
+    if is_confident(confidence):
+        return label
+    try:
+        response = await ainvoke(detect_intent.llm, detect_intent.build_classification_prompt(user_input), "detect_intent")
+        return detect_intent.parse_classification(response)
+    except Exception as e:
+        print("LLM Classification Error:", e)
+        # Default to 'appointment' on error
+        return "appointment"
+
+
+@traced("extract_intent_and_details")
+async def aextract_intent_and_details(user_input):
+    try:
+        response = await ainvoke(structured_output.json_llm(ai.llm), ai.build_extraction_prompt(user_input),
+                                 "extract_intent_and_details")
+    except Exception as e:
+        print("LLM Extraction Error:", str(e) or type(e).__name__)
+        return {"error": "Could not process input"}
+    return ai.parse_extraction_response(response)
+
+
+@traced("route_and_extract")
+async def aroute_and_extract(user_input):
+    try:
+        response = await ainvoke(structured_output.json_llm(ai.llm, include_route=True),
+                                 ai.build_extraction_prompt(user_input, include_route=True), "route_and_extract")
+    except Exception as e:
+        print("LLM Extraction Error:", str(e) or type(e).__name__)
+        return {"error": "Could not process input", "route": "appointment"}
+    return ai.parse_route_and_extract_response(response)
+
+
+async def aroute_and_extract_query(user_input, single_pass=True):
+    """Async version of app.route_and_extract_query(); returns (route, extracted_data)."""
+    if not single_pass:
+        if await adetect_intent(user_input) == "medical":
+            return "medical", None
+        return "appointment", await aextract_intent_and_details(user_input)
+
+    label, confidence = classify_intent(user_input)
+    if is_confident(confidence):
+        if label == "medical":
+            return "medical", None
+        return "appointment", await aextract_intent_and_details(user_input)
+
+    extracted_data = await aroute_and_extract(user_input)
+    if extracted_data.get("route") == "medical":
+        return "medical", None
+    return "appointment", extracted_data
+
+
+@traced("handle_medical_query")
+async def ahandle_medical_query(user_input):
+    # The caches read and write SQLite and search the semantic index, so off the loop
+    cached = await asyncio.to_thread(medical_ai.get_cached_answer, user_input)
+    if cached is not None:
+        return cached
+
+    prompt = render_prompt("medical", user_input=user_input)
+    start = time.perf_counter()
+    try:
+        response = await ainvoke(medical_ai.medical_ai, prompt, "handle_medical_query")
+    except Exception as e:
+        return f"Error processing medical query: {str(e) or type(e).__name__}"
+    record_duration("medical_generation_seconds", time.perf_counter() - start)
+
+    await asyncio.to_thread(medical_ai.store_answer, user_input, response)
+    return response
+
+
+async def astream_medical_query(user_input):
+    """Async version of medical_ai.stream_medical_query()."""
+    cached = await asyncio.to_thread(medical_ai.get_cached_answer, user_input)
+    if cached is not None:
+        yield cached
+        return
+
+    prompt = render_prompt("medical", user_input=user_input)
+    key = singleflight.call_key(medical_ai.medical_ai, prompt)
+    flights = singleflight.async_flights
+    future, leader = flights.begin(key) if singleflight.SINGLE_FLIGHT else (None, True)
+    if not leader:
+        # The same question is being answered right now; wait for the whole answer
+        # (the stream that answers it is bounded by LLM_TIMEOUT_SECONDS per piece)
+        try:
+            yield await flights.wait(future)
+        except Exception as e:
+            yield f"Error processing medical query: {str(e) or type(e).__name__}"
+        return
+
+    chunks = []
+    answer = None
+    error = None
+    start = time.perf_counter()
+    try:
+        async with _semaphore(singleflight.model_name(medical_ai.medical_ai)):
+            record_llm_call("stream_medical_query")
+            stream = medical_ai.medical_ai.astream(prompt).__aiter__()
+            while True:
+                # LLM_TIMEOUT_SECONDS bounds each wait for the next piece
+                try:
+                    chunk = await asyncio.wait_for(stream.__anext__(), LLM_TIMEOUT_SECONDS)
+                except StopAsyncIteration:
+                    break
+                record_usage(chunk, "stream_medical_query")
+                if not chunk.content:
+                    continue
+                if not chunks:
+                    record_duration("medical_first_token_seconds", time.perf_counter() - start)
+                chunks.append(chunk.content)
+                yield chunk.content
+        answer = "".join(chunks).strip()
+    except Exception as e:
+        error = e
+        yield f"Error processing medical query: {str(e) or type(e).__name__}"
+        return
+    except BaseException as e:
+        # Closed or cancelled before the end (client went away)
+        error = e
+        raise
+    finally:
+        if future is not None:
+            flights.finish(key, future, result=answer, error=error)
+    record_duration("medical_generation_seconds", time.perf_counter() - start)
+
+    await asyncio.to_thread(medical_ai.store_answer, user_input, answer)
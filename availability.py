@@ -0,0 +1,203 @@
+import datetime
+import os
+import threading
+
+import numpy as np
+
+from database import get_active_slots, get_change_token, get_changes_since, get_schedules
+from schedule import CELLS_PER_DAY, SCHEDULE_RESOLUTION_MINUTES, format_minutes, minute_of_day
+
+# In-memory index of booked appointment slots. Free slots are the doctors'
+# schedules (schedule.py: working hours, slot length, breaks, holidays) minus
+# these bookings, computed for all the doctors and days asked about in one
+# go, so "which Cardiology slots are free next week" or "when is the next free
+# slot" don't query the database at all.
+#
+# The index is loaded from the Appointments table (today onwards) on first use
+# and brought up to date before each query: one read of the change sequence,
+# and when it moved, the rows written or deleted since (by any process). It
+# pulls rather than subscribing to the change bus, so it doesn't keep the
+# change watcher and the read-back of every write busy when no SSE client is
+# connected. It only answers questions; book_appointment() still checks the
+# slot in its write transaction.
+
+# How far ahead next_available() looks
+AVAILABILITY_HORIZON_DAYS = int(os.getenv("AVAILABILITY_HORIZON_DAYS", "60"))
+# Changes since the last query beyond which the index reloads instead
+AVAILABILITY_RELOAD_CHANGES = 10000
+# Days next_available() computes at a time
+_SEARCH_DAYS = 7
+
+
+class AvailabilityIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._token = None  # change token the index is current up to
+        self._loaded_from = None  # first date the index has appointments for
+        # (doctor_id, date) -> {(minute of day, slot minutes or 0): active appointments starting then}
+        self._day_bookings = {}
+        self._appointments = {}  # appointment_id -> (row_version, (doctor_id, date, (minute, length)) or None)
+        self.reloads = 0
+        self.changes_applied = 0
+
+    # -- keeping up to date
+
+    def _reload(self):
+        # The token is read first: a change made while the rows are read is
+        # applied again by the next _sync(), which the row versions make harmless
+        self._token = get_change_token()
+        self._day_bookings, self._appointments = {}, {}
+        self._loaded_from = datetime.date.today().isoformat()
+        for appointment_id, version, doctor_id, date, time_text, length in get_active_slots(self._loaded_from):
+            self._set(appointment_id, version, doctor_id, date, time_text, length, True)
+        self.reloads += 1
+
+    def _set(self, appointment_id, version, doctor_id, date, time_text, length, active):
+        previous = self._appointments.get(appointment_id)
+        if previous is not None:
+            if version is not None and previous[0] is not None and version <= previous[0]:
+                return  # an older change than the one already applied
+            if previous[1] is not None:
+                self._release(*previous[1])
+        key = None
+        minute = minute_of_day(time_text) if active else None
+        if minute is not None:
+            booking = (minute, length or 0)
+            key = (doctor_id, date, booking)
+            bookings = self._day_bookings.setdefault((doctor_id, date), {})
+            bookings[booking] = bookings.get(booking, 0) + 1
+        self._appointments[appointment_id] = (version, key)
+
+    def _release(self, doctor_id, date, booking):
+        bookings = self._day_bookings[doctor_id, date]
+        if bookings[booking] > 1:
+            bookings[booking] -= 1
+            return
+        del bookings[booking]
+        if not bookings:
+            del self._day_bookings[doctor_id, date]
+
+    def _sync(self):
+        """Apply the changes written since the last query; reload when there are too many."""
+        token = get_change_token()
+        if self._token is None or not 0 <= token - self._token <= AVAILABILITY_RELOAD_CHANGES:
+            self._reload()
+            return
+        if token == self._token:
+            return
+        for change in get_changes_since(self._token):
+            appointment, version = change["appointment"], change["change_token"]
+            if appointment.get("deleted"):
+                self._set(appointment["id"], version, None, None, None, None, False)
+            else:
+                self._set(appointment["id"], version, appointment["doctorId"], appointment["date"],
+                          appointment["time"], appointment.get("slotMinutes"), appointment["status"] != "Cancelled")
+            self._token = max(self._token, version)
+            self.changes_applied += 1
+        self._token = max(self._token, token)
+
+    def reload(self):
+        with self._lock:
+            self._reload()
+
+    # -- queries
+
+    def _free(self, schedules, positions, first_day, days):
+        """schedule.Schedules.free_starts() for the doctors at `positions`, with their bookings."""
+        doctor_ids = [schedules.doctor_ids[position] for position in positions]
+        bookings = []
+        for day_number in range(days):
+            date = (first_day + datetime.timedelta(days=day_number)).isoformat()
+            for row, doctor_id in enumerate(doctor_ids):
+                booked = self._day_bookings.get((doctor_id, date))
+                if booked:
+                    bookings.extend((row, day_number, minute, length) for minute, length in booked)
+        return schedules.free_starts(positions, first_day, days, bookings)
+
+    def free_slots(self, date, department=None, doctor_id=None, days=1):
+        """
+        Free slots of the department's doctors, or of one doctor, on `days` days
+        from `date` ("YYYY-MM-DD"): [{"date", "slots": [{"time", "doctors":
+        [{"doctor_id", "doctor_name"}]}]}]. Days before the index was loaded
+        (i.e. past days) have no free slots.
+        """
+        first_day = datetime.date.fromisoformat(date)
+        with self._lock:
+            self._sync()
+            schedules = get_schedules()
+            positions = schedules.positions_of(department, doctor_id)
+            free = self._free(schedules, positions, first_day, days)
+            result = []
+            for day_number in range(days):
+                date = (first_day + datetime.timedelta(days=day_number)).isoformat()
+                slots = []
+                if date >= self._loaded_from:
+                    # Free (cell, doctor) pairs in time order, then doctor order
+                    cells, rows = np.nonzero(free[:, day_number, :].T)
+                    for cell, row in zip(cells.tolist(), rows.tolist()):
+                        if not slots or slots[-1][0] != cell:
+                            slots.append((cell, []))
+                        position = positions[row]
+                        slots[-1][1].append({"doctor_id": schedules.doctor_ids[position],
+                                             "doctor_name": schedules.names[position]})
+                result.append({"date": date, "slots": [
+                    {"time": format_minutes(cell * SCHEDULE_RESOLUTION_MINUTES), "doctors": doctors}
+                    for cell, doctors in slots]})
+            return result
+
+    def next_available(self, department=None, doctor_id=None, after=None, limit=5, days=AVAILABILITY_HORIZON_DAYS):
+        """
+        The first `limit` free slots at or after `after` (a datetime, default
+        now, and never earlier) within `days` days: [{"date", "time",
+        "doctor_id", "doctor_name"}], each slot with its first free doctor in
+        rowid order.
+        """
+        now = datetime.datetime.now()
+        after = max(after, now) if after else now
+        with self._lock:
+            self._sync()
+            schedules = get_schedules()
+            positions = schedules.positions_of(department, doctor_id)
+            if not len(positions):
+                return []
+            day = max(after.date(), datetime.date.fromisoformat(self._loaded_from))
+            # The first cell that starts at or after `after` on its day
+            first_cell = 0
+            if day == after.date():
+                first_cell = -(-(after.hour * 60 + after.minute) // SCHEDULE_RESOLUTION_MINUTES)
+            found, searched = [], 0
+            while searched < days and len(found) < limit:
+                chunk = min(_SEARCH_DAYS, days - searched)
+                free = self._free(schedules, positions, day, chunk)
+                free[:, 0, :first_cell] = False
+                for flat in np.flatnonzero(free.any(axis=0))[:limit - len(found)]:
+                    day_number, cell = divmod(int(flat), CELLS_PER_DAY)
+                    position = positions[int(np.argmax(free[:, day_number, cell]))]
+                    found.append({"date": (day + datetime.timedelta(days=day_number)).isoformat(),
+                                  "time": format_minutes(cell * SCHEDULE_RESOLUTION_MINUTES),
+                                  "doctor_id": schedules.doctor_ids[position],
+                                  "doctor_name": schedules.names[position]})
+                day += datetime.timedelta(days=chunk)
+                searched += chunk
+                first_cell = 0
+            return found
+
+    def stats(self):
+        with self._lock:
+            return {"loaded_from": self._loaded_from, "booked_days": len(self._day_bookings),
+                    "appointments": len(self._appointments), "reloads": self.reloads,
+                    "changes_applied": self.changes_applied}
+
+
+index = AvailabilityIndex()
+
+
+def suggest_alternatives(department, date, time_text, limit=3):
+    """Free slots of the department nearest after the requested date and time, for "no doctor available" replies."""
+    try:
+        day = datetime.date.fromisoformat(date)
+    except (TypeError, ValueError):
+        return []
+    minute = minute_of_day(time_text) or 0
+    after = datetime.datetime.combine(day, datetime.time(minute // 60, minute % 60))
+    return index.next_available(department=department, after=after, limit=limit)
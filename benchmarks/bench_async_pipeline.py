@@ -0,0 +1,155 @@
+"""
+Throughput of the chat endpoints: sync Flask workers versus the ASGI pipeline.
+
+    python benchmarks/bench_async_pipeline.py
+    python benchmarks/bench_async_pipeline.py --latency 0.8 --workers 4 --sessions 1 10 100
+
+Starts fake_llm_server.py, which answers every completion after --latency
+seconds, and points the app's models at it, so the numbers measure how
+many conversations each stack can keep waiting on the LLM at once. "sync" runs
+/chat through the Flask app on a pool of --workers threads (one request per
+worker, like gunicorn sync workers); "async" runs the same requests through
+asgi.application on one event loop. Caches are disabled.
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+_scratch = tempfile.mkdtemp()
+os.environ["HOSPITAL_DB_FILE"] = os.path.join(_scratch, "hospital_db.sqlite3")
+shutil.copy(os.path.join(ROOT, "hospital_db.sqlite3"), os.environ["HOSPITAL_DB_FILE"])
+os.environ["MEDICAL_CACHE_ENABLED"] = "false"
+os.environ["SEMANTIC_CACHE_ENABLED"] = "false"
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+
+from langchain_openai import ChatOpenAI  # noqa: E402
+
+import ai  # noqa: E402
+import app as flask_app  # noqa: E402
+import asgi  # noqa: E402
+import detect_intent  # noqa: E402
+import medical_ai  # noqa: E402
+from fake_llm import FakeChatModel  # noqa: E402
+from fake_llm_server import start_server  # noqa: E402
+
+QUESTIONS = [
+    "What are the symptoms of {}?",
+    "How is {} usually treated?",
+    "What causes {} and how can I prevent it?",
+]
+CONDITIONS = ["flu", "migraine", "asthma", "diabetes", "anemia", "bronchitis", "eczema", "arthritis"]
+
+
+def use_fake_models(port):
+    model = ChatOpenAI(model="bench", api_key="bench", base_url=f"http://127.0.0.1:{port}/v1", max_retries=0)
+    ai.llm = detect_intent.llm = medical_ai.medical_ai = model
+
+
+def messages(sessions, turns):
+    return [[QUESTIONS[(s + t) % len(QUESTIONS)].format(CONDITIONS[(s * turns + t) % len(CONDITIONS)])
+             for t in range(turns)] for s in range(sessions)]
+
+
+def run_sync(conversations, workers):
+    client = flask_app.app.test_client()
+    latencies = []
+
+    def turn(message):
+        response = client.post("/chat", json={"message": message})
+        assert response.status_code == 200, response.get_data(as_text=True)
+
+    def session(conversation):
+        # A session waits for each answer before sending its next message; every
+        # message occupies a worker for as long as the LLM takes
+        result = []
+        for message in conversation:
+            start = time.perf_counter()
+            pool.submit(turn, message).result()
+            result.append(time.perf_counter() - start)
+        return result
+
+    with ThreadPoolExecutor(workers) as pool, ThreadPoolExecutor(len(conversations)) as sessions:
+        start = time.perf_counter()
+        for result in sessions.map(session, conversations):
+            latencies.extend(result)
+        elapsed = time.perf_counter() - start
+    return latencies, elapsed
+
+
+async def _asgi_post(path, payload):
+    body = json.dumps(payload).encode()
+    sent = {}
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            sent["status"] = message["status"]
+        else:
+            sent["body"] = message.get("body", b"")
+
+    scope = {"type": "http", "method": "POST", "path": path, "headers": [(b"content-type", b"application/json")]}
+    await asgi.application(scope, receive, send)
+    return sent["status"], sent["body"]
+
+
+def run_async(conversations):
+    latencies = []
+
+    async def session(conversation):
+        for message in conversation:
+            start = time.perf_counter()
+            status, body = await _asgi_post("/chat", {"message": message})
+            assert status == 200, body
+            latencies.append(time.perf_counter() - start)
+
+    async def main():
+        start = time.perf_counter()
+        await asyncio.gather(*(session(conversation) for conversation in conversations))
+        return time.perf_counter() - start
+
+    elapsed = asyncio.run(main())
+    return latencies, elapsed
+
+
+def report(mode, sessions, latencies, elapsed):
+    latencies = sorted(latencies)
+    p50 = statistics.median(latencies)
+    p99 = latencies[min(len(latencies) - 1, int(0.99 * len(latencies)))]
+    print(f"{mode:<6} {sessions:>9} {len(latencies) / elapsed:>10.1f} {p50 * 1e3:>9.0f}ms {p99 * 1e3:>9.0f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=0.5, help="seconds per fake LLM call")
+    parser.add_argument("--workers", type=int, default=4, help="sync worker threads")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--turns", type=int, default=3, help="messages per session")
+    args = parser.parse_args()
+
+    server = start_server(FakeChatModel(latency=args.latency, tokens_per_second=0))
+    use_fake_models(server.server_address[1])
+    print(f"fake LLM latency {args.latency * 1e3:.0f}ms, {args.workers} sync workers, {args.turns} turns per session\n")
+    print(f"{'mode':<6} {'sessions':>9} {'req/s':>10} {'p50':>11} {'p99':>11}")
+    for sessions in args.sessions:
+        conversations = messages(sessions, args.turns)
+        report("sync", sessions, *run_sync(conversations, args.workers))
+        report("async", sessions, *run_async(conversations))
+
+    server.shutdown()
+    shutil.rmtree(_scratch, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
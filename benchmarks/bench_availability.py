@@ -0,0 +1,124 @@
+"""
+Free-slot questions answered by the availability index and the schedule
+engine (availability.py, schedule.py) versus by querying the Appointments
+table slot by slot.
+
+    python benchmarks/bench_availability.py
+    python benchmarks/bench_availability.py --doctors 500 --days 31
+
+Adds --doctors doctors to a "Bench" department of a scratch copy of the
+database, a third of them with 20-minute slots and a lunch break and the rest
+on the default hours, books about half of their slots over the next --days
+days, then times per call:
+  - free slots of the department over one day and over --days days, from the
+    index: one (doctors, days, cells) array computation
+  - the next five free slots
+  - the same one-day answer probing each slot the way book_appointment()
+    does: the department's doctors and that day's bookings, checked against
+    the schedules
+"""
+import argparse
+import datetime
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def per_call(fn, calls):
+    start = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - start) / calls
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--doctors", type=int, default=200)
+    parser.add_argument("--days", type=int, default=31)
+    parser.add_argument("--calls", type=int, default=200)
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp()
+    try:
+        db_file = os.path.join(scratch, "hospital_db.sqlite3")
+        shutil.copy(os.path.join(ROOT, "hospital_db.sqlite3"), db_file)
+        os.environ.update(HOSPITAL_DB_FILE=db_file, TRACING="false")
+        import availability
+        import database
+        from schedule import format_minutes
+        database.init_db()
+
+        conn = sqlite3.connect(db_file)
+        first_id = conn.execute("SELECT MAX(doctor_id) FROM Doctors").fetchone()[0] + 1
+        doctor_ids = list(range(first_id, first_id + args.doctors))
+        conn.executemany("INSERT INTO Doctors VALUES (?, ?, 'Bench', 1, 10, '', '')",
+                         [(doctor_id, f"Dr. Bench {doctor_id}") for doctor_id in doctor_ids])
+        conn.commit()
+        conn.close()
+        for doctor_id in doctor_ids[::3]:
+            database.set_doctor_schedule(
+                doctor_id, [{"weekday": w, "start_time": "08:00", "end_time": "16:00", "slot_minutes": 20} for w in range(5)],
+                breaks=[{"start_time": "12:00", "end_time": "13:00"}])
+
+        # Book every other slot of every doctor
+        today = datetime.date.today()
+        schedules = database.get_schedules(max_age=0)
+        rows = []
+        for day_number in range(1, args.days + 1):
+            day = today + datetime.timedelta(days=day_number)
+            lengths = schedules.slot_lengths(schedules.positions_of(department="Bench"), day, 1)
+            for row, doctor_id in enumerate(doctor_ids):
+                for cell in lengths[row, 0].nonzero()[0][::2]:
+                    rows.append((f"bench{len(rows)}", "bench-patient", doctor_id, "Bench", day.isoformat(),
+                                 format_minutes(int(cell) * 5), "Scheduled"))
+        conn = sqlite3.connect(db_file)
+        conn.execute("INSERT INTO Patients VALUES ('bench-patient', 'Bench', 40, 'Female', '', '', '')")
+        conn.executemany("INSERT INTO Appointments (appointment_id, patient_id, doctor_id, department, date, time, status)"
+                         " VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+        conn.commit()
+
+        start = time.perf_counter()
+        availability.index.reload()
+        load = time.perf_counter() - start
+
+        day = (today + datetime.timedelta(days=1)).isoformat()
+        slot_times = [slot["time"] for slot in availability.index.free_slots(day, department="Bench")[0]["slots"]]
+        booked_times = sorted({row[5] for row in rows if row[4] == day})
+        probe_times = sorted(set(slot_times) | set(booked_times))
+
+        def free_slots_sql():
+            free = []
+            query = {"specialization": "Bench", "date": day}
+            for time_text in probe_times:
+                doctors = conn.execute(database._DEPARTMENT_DOCTORS_SQL, query).fetchall()
+                booked = {}
+                for doctor_id, booked_time, length in conn.execute(database._DEPARTMENT_DAY_BOOKINGS_SQL, query):
+                    booked.setdefault(doctor_id, []).append((booked_time, length))
+                if database._free_doctors(database.get_schedules(), doctors, day, time_text, booked):
+                    free.append(time_text)
+            return free
+
+        index_day = per_call(lambda: availability.index.free_slots(day, department="Bench"), args.calls)
+        index_range = per_call(lambda: availability.index.free_slots(day, department="Bench", days=args.days),
+                               max(1, args.calls // 10))
+        index_next = per_call(lambda: availability.index.next_available(department="Bench", limit=5), args.calls)
+        sql_day = per_call(free_slots_sql, max(1, args.calls // 20))
+        conn.close()
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    print(f"{args.doctors} doctors, {len(rows):,} appointments over {args.days} days; index loaded in {load * 1e3:.0f} ms")
+    print(f"free slots, one day:    index {index_day * 1e3:.2f} ms, "
+          f"probing each slot ({len(probe_times)} slots) {sql_day * 1e3:.1f} ms ({sql_day / index_day:.0f}x)")
+    print(f"free slots, {args.days} days:    index {index_range * 1e3:.2f} ms")
+    print(f"next 5 free slots:      index {index_next * 1e3:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
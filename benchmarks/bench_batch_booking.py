@@ -0,0 +1,73 @@
+"""
+Booking many appointments one request at a time versus in one batch.
+
+    python benchmarks/bench_batch_booking.py
+    python benchmarks/bench_batch_booking.py --bookings 1000
+
+Books --bookings appointments on a scratch copy of the database through the
+Flask test client, once as that many POST /api/book-appointment requests and
+once as a single POST /api/book-appointments:batch, each on empty days so
+both book the same slots, and prints the time per booking.
+"""
+import argparse
+import datetime
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+DEPARTMENTS = ("Cardiology", "Neurology", "Pediatrics", "Orthopedics", "Dermatology")
+
+
+def bookings(count, first_day):
+    """Bookings spread over the departments and half-hour slots from `first_day` on."""
+    for i in range(count):
+        slot = i // len(DEPARTMENTS)
+        minutes = 9 * 60 + 30 * (slot % 16)
+        yield {
+            "name": f"Batch Patient {i}", "age": 40, "gender": "Female", "contact_number": "5550100100",
+            "email": f"batch{i}@example.com", "medical_history": DEPARTMENTS[i % len(DEPARTMENTS)],
+            "appointment_date": (first_day + datetime.timedelta(days=slot // 16)).isoformat(),
+            "appointment_time": f"{minutes // 60:02d}:{minutes % 60:02d}",
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--bookings", type=int, default=500)
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp()
+    try:
+        shutil.copy(os.path.join(ROOT, "hospital_db.sqlite3"), scratch)
+        os.environ.update(HOSPITAL_DB_FILE=os.path.join(scratch, "hospital_db.sqlite3"), TRACING="false",
+                          LLM_PROVIDER="fake", LLM_WARMUP="false")
+        import app
+        client = app.app.test_client()
+
+        start = time.perf_counter()
+        for booking in bookings(args.bookings, datetime.date(2040, 1, 1)):
+            response = client.post("/api/book-appointment", json=booking)
+            assert response.status_code == 200, response.get_json()
+        single = (time.perf_counter() - start) / args.bookings
+
+        start = time.perf_counter()
+        response = client.post("/api/book-appointments:batch",
+                               json=list(bookings(args.bookings, datetime.date(2041, 1, 1))))
+        batch = (time.perf_counter() - start) / args.bookings
+        result = response.get_json()
+        assert result["booked"] == args.bookings, result["results"][:3]
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    print(f"{args.bookings} bookings")
+    print(f"one request each: {single * 1e3:.2f} ms per booking")
+    print(f"one batch:        {batch * 1e3:.3f} ms per booking ({single / batch:.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Bulk appointment import and export (bulk.py) on a generated history file.
+
+    python benchmarks/bench_bulk.py
+    python benchmarks/bench_bulk.py --rows 100000 --format jsonl
+
+Writes --rows appointments to a CSV or JSONL file, one per free (doctor, date,
+time) slot from 2000-01-01 on, every tenth row with only a department so the
+import has to pick the doctor, then in a fresh process on a scratch copy of
+the database times `bulk.import_stream` and a full `bulk.export_chunks`,
+printing rows per second and the process's peak memory. Running it with a
+tenth of the rows shows whether memory stays flat as the file grows.
+"""
+import argparse
+import csv
+import datetime
+import json
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FIELDS = ["patientName", "patientAge", "patientGender", "department", "doctorId", "date", "time", "status"]
+SLOTS_PER_DAY = 20  # 09:00 to 18:30, every half hour
+
+_CHILD = """
+import json, resource, sys, time
+sys.path.insert(0, {root!r})
+import bulk
+import database
+database.init_db()
+start = time.perf_counter()
+with open({path!r}, "rb") as f:
+    summary = bulk.import_stream(f, {fmt!r}, {batch_size})
+import_seconds = time.perf_counter() - start
+start = time.perf_counter()
+exported = 0
+for chunk in bulk.export_chunks({fmt!r}, {batch_size}):
+    exported += chunk.count("\\n")
+export_seconds = time.perf_counter() - start
+print("RESULT", json.dumps({{"summary": summary, "import_seconds": import_seconds, "exported": exported,
+                            "export_seconds": export_seconds,
+                            "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}}))
+"""
+
+
+def write_history(path, fmt, rows, doctors):
+    """One appointment per slot, cycling through the doctors before moving to the next slot."""
+    day = datetime.date(2000, 1, 1)
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f, lineterminator="\n")
+        if fmt == "csv":
+            writer.writerow(FIELDS)
+        for i in range(rows):
+            slot, doctor = divmod(i, len(doctors))
+            date = (day + datetime.timedelta(days=slot // SLOTS_PER_DAY)).isoformat()
+            minutes = 9 * 60 + 30 * (slot % SLOTS_PER_DAY)
+            doctor_id, department = doctors[doctor]
+            # Department only: the import books the first free doctor there,
+            # which at this slot is always free since slots are filled in order
+            row = [f"Patient {i}", 20 + i % 60, ("Female", "Male")[i % 2], department,
+                   "" if i % 10 == 0 and doctor == 0 else doctor_id, date,
+                   f"{minutes // 60:02d}:{minutes % 60:02d}", "Completed"]
+            if fmt == "csv":
+                writer.writerow(row)
+            else:
+                f.write(json.dumps(dict(zip(FIELDS, row))) + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--format", choices=("csv", "jsonl"), default="csv")
+    parser.add_argument("--batch-size", type=int, default=20000)
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp()
+    try:
+        db_file = os.path.join(scratch, "hospital_db.sqlite3")
+        shutil.copy(os.path.join(ROOT, "hospital_db.sqlite3"), db_file)
+        conn = sqlite3.connect(db_file)
+        doctors = conn.execute("SELECT doctor_id, specialization FROM Doctors ORDER BY doctor_id").fetchall()
+        # Start from an empty table so the generated slots can't collide with existing bookings
+        conn.execute("DELETE FROM Appointments")
+        conn.commit()
+        conn.close()
+
+        path = os.path.join(scratch, f"history.{args.format}")
+        write_history(path, args.format, args.rows, doctors)
+        size_mb = os.path.getsize(path) / 1e6
+        print(f"{args.rows:,} rows, {size_mb:.0f} MB of {args.format}, {len(doctors)} doctors")
+
+        env = dict(os.environ, HOSPITAL_DB_FILE=db_file, TRACING="false")
+        result = subprocess.run(
+            [sys.executable, "-c", _CHILD.format(root=ROOT, path=path, fmt=args.format, batch_size=args.batch_size)],
+            cwd=scratch, env=env, capture_output=True, text=True)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+    line = next((line for line in result.stdout.splitlines() if line.startswith("RESULT ")), None)
+    if line is None:
+        raise RuntimeError("import failed:\n" + "\n".join(result.stderr.strip().splitlines()[-5:]))
+    result = json.loads(line[len("RESULT "):])
+    summary = result["summary"]
+    print(f"import: {summary['imported']:,} imported, {summary['invalid']} invalid, {summary['duplicates']} duplicates, "
+          f"{summary['conflicts']} conflicts in {result['import_seconds']:.1f}s "
+          f"({summary['rows'] / result['import_seconds']:,.0f} rows/s)")
+    print(f"export: {result['exported']:,} lines in {result['export_seconds']:.1f}s "
+          f"({result['exported'] / result['export_seconds']:,.0f} rows/s)")
+    print(f"peak memory: {result['peak_rss_mb']:.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
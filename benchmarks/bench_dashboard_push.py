@@ -0,0 +1,140 @@
+"""
+Database load from idle dashboards: 3-second polling versus the SSE stream.
+
+    python benchmarks/bench_dashboard_push.py
+    python benchmarks/bench_dashboard_push.py --dashboards 500 --seconds 30 --write-every 5
+
+Runs the Flask app in-process against a scratch copy of hospital_db.sqlite3 and
+simulates N open dashboards in three modes:
+
+    poll-full   the old client: GET /api/appointments every 3 s
+    poll-etag   GET ?limit=4&order=desc with If-None-Match every 3 s
+    sse         one /api/appointments/stream connection per dashboard
+
+A booking is made every --write-every seconds so the streams carry real events.
+Reports SQL statements per minute (counted with an SQLite trace callback) and
+events delivered.
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+_scratch = tempfile.mkdtemp()
+os.environ["HOSPITAL_DB_FILE"] = os.path.join(_scratch, "hospital_db.sqlite3")
+shutil.copy(os.path.join(ROOT, "hospital_db.sqlite3"), os.environ["HOSPITAL_DB_FILE"])
+
+import database  # noqa: E402
+
+_query_count = 0
+_count_lock = threading.Lock()
+_original_connect = database.ConnectionPool._connect
+
+
+def _counting_connect(pool):
+    conn = _original_connect(pool)
+
+    def trace(statement):
+        global _query_count
+        if statement.lstrip()[:6].upper() in ("SELECT", "INSERT", "UPDATE", "DELETE"):
+            with _count_lock:
+                _query_count += 1
+
+    conn.set_trace_callback(trace)
+    return conn
+
+
+database.ConnectionPool._connect = _counting_connect
+
+import app as flask_app  # noqa: E402
+
+
+def poller(client, stop, url, use_etag, interval):
+    etag = None
+    while not stop.is_set():
+        headers = {"If-None-Match": etag} if use_etag and etag else {}
+        response = client.get(url, headers=headers)
+        if use_etag and response.status_code == 200:
+            etag = response.headers.get("ETag")
+        stop.wait(interval)
+
+
+def sse_listener(client, stop, received):
+    response = client.get("/api/appointments/stream", buffered=False)
+    for chunk in response.response:
+        if stop.is_set():
+            break
+        if b"event: appointment" in chunk:
+            with _count_lock:
+                received[0] += 1
+    response.close()
+
+
+def writer(stop, every, counter):
+    n = 0
+    while not stop.wait(every):
+        n += 1
+        database.book_appointment(f"Load Test {n}", 40, "F", "555-0100", "load@example.com",
+                                  "Cardiology", f"2040-01-{n % 28 + 1:02d}", f"{8 + n % 10:02d}:00")
+        counter[0] += 1
+
+
+def run_mode(mode, dashboards, seconds, write_every, poll_interval):
+    global _query_count
+    client = flask_app.app.test_client()
+    stop = threading.Event()
+    received, writes = [0], [0]
+    threads = []
+    for _ in range(dashboards):
+        if mode == "poll-full":
+            target, args = poller, (client, stop, "/api/appointments", False, poll_interval)
+        elif mode == "poll-etag":
+            target, args = poller, (client, stop, "/api/appointments?limit=4&order=desc", True, poll_interval)
+        else:
+            target, args = sse_listener, (client, stop, received)
+        threads.append(threading.Thread(target=target, args=args, daemon=True))
+
+    for thread in threads:
+        thread.start()
+    time.sleep(1.0)  # let the clients connect before measuring
+    with _count_lock:
+        _query_count = 0
+    write_thread = threading.Thread(target=writer, args=(stop, write_every, writes), daemon=True)
+    write_thread.start()
+    time.sleep(seconds)
+    with _count_lock:
+        queries = _query_count
+    stop.set()
+    # Wake the SSE listeners so they notice the stop flag
+    database.change_bus.publish({"type": "resync", "change_token": 0})
+
+    per_minute = queries * 60.0 / seconds
+    line = f"{mode:<10} {dashboards:>6} dashboards  {per_minute:>10.0f} SQL statements/min  ({writes[0]} bookings)"
+    if mode == "sse":
+        line += f"  {received[0]} events delivered"
+    print(line)
+    return per_minute
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dashboards", type=int, default=500)
+    parser.add_argument("--seconds", type=float, default=15)
+    parser.add_argument("--write-every", type=float, default=5)
+    parser.add_argument("--poll-interval", type=float, default=3)
+    parser.add_argument("--modes", nargs="+", default=["poll-full", "poll-etag", "sse"])
+    args = parser.parse_args()
+
+    for mode in args.modes:
+        run_mode(mode, args.dashboards, args.seconds, args.write_every, args.poll_interval)
+    shutil.rmtree(_scratch, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
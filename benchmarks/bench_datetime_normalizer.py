@@ -0,0 +1,336 @@
+"""
+Date/time normalization: datetime_normalizer against the original ai.py functions.
+
+    python benchmarks/bench_datetime_normalizer.py
+    python benchmarks/bench_datetime_normalizer.py --cases 20000 --seed 3
+
+Two parts:
+
+  corpus     generates random dates and times in the spellings users and the LLM
+             produce, each with its known answer, and checks properties of both
+             implementations: the right value, idempotence, and output that is
+             either ISO/HH:MM or the input unchanged. Where the old functions
+             return a date in the past for a day/month without a year, the new
+             one rolls over to next year; those are counted separately.
+  timing     per-call latency, cold and memoized, and a batch of extracted
+             records normalized once with normalize_records() versus the old
+             parse_extraction_response() path that converted every field twice.
+
+The legacy_* functions below are the previous implementations, kept verbatim.
+"""
+import argparse
+import datetime
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import datetime_normalizer  # noqa: E402
+from datetime_normalizer import normalize_date, normalize_time, normalize_records  # noqa: E402
+
+MONTH_NAMES = ["january", "february", "march", "april", "may", "june", "july",
+               "august", "september", "october", "november", "december"]
+WEEKDAY_NAMES = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+ISO_DATE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+HH_MM = re.compile(r"^\d{2}:\d{2}$")
+
+
+def legacy_convert_to_24hour_format(time_str):
+    """Convert 12-hour time format to 24-hour format"""
+    if not time_str:
+        return None
+
+    # Check if already in 24-hour format (no AM/PM)
+    if "AM" not in time_str.upper() and "PM" not in time_str.upper() and ":" in time_str:
+        return time_str
+
+    # Handle formats like "5 PM", "5PM", "5:30 PM", etc.
+    time_str = time_str.strip().upper()
+
+    # Extract hours, minutes, and AM/PM
+    match = re.match(r"(\d+)(?::(\d+))?\s*(AM|PM)?", time_str)
+    if match:
+        hours, minutes, period = match.groups()
+        hours = int(hours)
+        minutes = int(minutes) if minutes else 0
+
+        # Convert to 24-hour format
+        if period == "PM" and hours < 12:
+            hours += 12
+        elif period == "AM" and hours == 12:
+            hours = 0
+
+        return f"{hours:02d}:{minutes:02d}"
+
+    return time_str
+
+def legacy_convert_relative_date(date_text):
+    """Convert relative date terms to actual dates if they weren't converted by the LLM"""
+    today = datetime.date.today()
+
+    if not date_text:
+        return None
+
+    # Check if date is already in YYYY-MM-DD format
+    if isinstance(date_text, str) and len(date_text) == 10 and date_text[4] == '-' and date_text[7] == '-':
+        return date_text
+
+    date_text = str(date_text).lower()
+
+    if date_text == "today":
+        return today.strftime('%Y-%m-%d')
+    elif date_text == "tomorrow":
+        return (today + datetime.timedelta(days=1)).strftime('%Y-%m-%d')
+    elif date_text == "day after tomorrow":
+        return (today + datetime.timedelta(days=2)).strftime('%Y-%m-%d')
+    elif "next week" in date_text:
+        return (today + datetime.timedelta(days=7)).strftime('%Y-%m-%d')
+
+    # Handle formats like "22March", "22-March", "March22", etc.
+    date_patterns = [
+        # Day first patterns (22March, 22-March, 22 March)
+        r"(\d{1,2})[\s-]?(january|february|march|april|may|june|july|august|september|october|november|december)",
+        r"(\d{1,2})[\s-]?(jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)",
+        # Month first patterns (March22, March-22, March 22)
+        r"(january|february|march|april|may|june|july|august|september|october|november|december)[\s-]?(\d{1,2})",
+        r"(jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[\s-]?(\d{1,2})"
+    ]
+
+    for pattern in date_patterns:
+        match = re.search(pattern, date_text, re.IGNORECASE)
+        if match:
+            groups = match.groups()
+            day = groups[0] if groups[0].isdigit() else groups[1]
+            month_str = groups[1] if groups[0].isdigit() else groups[0]
+
+            # Convert month name to number
+            months = {
+                'jan': 1, 'january': 1,
+                'feb': 2, 'february': 2,
+                'mar': 3, 'march': 3,
+                'apr': 4, 'april': 4,
+                'may': 5,
+                'jun': 6, 'june': 6,
+                'jul': 7, 'july': 7,
+                'aug': 8, 'august': 8,
+                'sep': 9, 'september': 9,
+                'oct': 10, 'october': 10,
+                'nov': 11, 'november': 11,
+                'dec': 12, 'december': 12
+            }
+
+            month = months.get(month_str.lower())
+            if month:
+                try:
+                    return datetime.date(today.year, month, int(day)).strftime('%Y-%m-%d')
+                except ValueError:
+                    pass  # Invalid date (e.g., February 30)
+
+    # Try to parse date in common formats
+    try:
+        # Month name formats like "March 15"
+        for fmt in ["%B %d", "%b %d", "%B %dth", "%b %dth"]:
+            try:
+                parsed_date = datetime.datetime.strptime(date_text, fmt)
+                # Set the year to current year
+                return datetime.date(today.year, parsed_date.month, parsed_date.day).strftime('%Y-%m-%d')
+            except ValueError:
+                pass
+
+        # Try more formats like MM/DD or MM-DD
+        for fmt in ["%m/%d", "%m-%d"]:
+            try:
+                parsed_date = datetime.datetime.strptime(date_text, fmt)
+                # Set the year to current year
+                return datetime.date(today.year, parsed_date.month, parsed_date.day).strftime('%Y-%m-%d')
+            except ValueError:
+                pass
+    except Exception:
+        # If all parsing fails, return the original text
+        pass
+
+    return date_text
+
+
+def ordinal(n):
+    suffix = "th" if 10 <= n % 100 <= 20 else {1: "st", 2: "nd", 3: "rd"}.get(n % 10, "th")
+    return f"{n}{suffix}"
+
+
+def upcoming(today, month, day):
+    date = datetime.date(today.year, month, day)
+    return date if date >= today else datetime.date(today.year + 1, month, day)
+
+
+def random_date_case(rng, today):
+    """(text, expected date) in one of the spellings the normalizer supports."""
+    kind = rng.randrange(9)
+    if kind == 0:
+        word, days = rng.choice([("today", 0), ("tomorrow", 1), ("day after tomorrow", 2), ("next week", 7)])
+        return rng.choice([word, word.title(), word.upper()]), today + datetime.timedelta(days=days)
+    if kind == 1:
+        weekday = rng.randrange(7)
+        days_ahead = (weekday - today.weekday()) % 7 or 7
+        name = WEEKDAY_NAMES[weekday]
+        return rng.choice([f"next {name}", name, name[:3].title()]), today + datetime.timedelta(days=days_ahead)
+    if kind == 2:
+        amount, unit = rng.randrange(1, 10), rng.choice(["days", "weeks"])
+        return f"in {amount} {unit}", today + datetime.timedelta(days=amount * (7 if unit == "weeks" else 1))
+
+    month = rng.randrange(1, 13)
+    day = rng.randrange(1, 29)
+    name = MONTH_NAMES[month - 1]
+    short = name[:3]
+    if kind == 3:
+        date = datetime.date(today.year + rng.randrange(0, 3), month, day)
+        return date.isoformat(), date
+    if kind == 4:
+        year = today.year + rng.randrange(1, 3)
+        return rng.choice([f"{name.title()} {ordinal(day)} {year}", f"{day} {short} {year}", f"{month}/{day}/{year}"]), \
+            datetime.date(year, month, day)
+    spelling = rng.choice([
+        f"{day}{name}", f"{day}-{name}", f"{day} {name}", f"{name}{day}", f"{name}-{day}", f"{name} {day}",
+        f"{short} {day}", f"{day} {short.title()}", f"{name.title()} {ordinal(day)}", f"the {ordinal(day)} of {name}",
+        f"{month:02d}/{day:02d}", f"{month}-{day}",
+    ])
+    return spelling, upcoming(today, month, day)
+
+
+def random_time_case(rng):
+    hour, minute = rng.randrange(24), rng.choice([0, 0, 15, 30, 45, rng.randrange(60)])
+    twelve = hour % 12 or 12
+    period = "AM" if hour < 12 else "PM"
+    spelling = rng.choice([
+        f"{hour:02d}:{minute:02d}", f"{twelve}:{minute:02d} {period}", f"{twelve}:{minute:02d}{period.lower()}",
+        f"{twelve}:{minute:02d} {period[0].lower()}.m.",
+    ] + ([f"{twelve} {period}", f"{twelve}{period.lower()}", f"at {twelve} {period}"] if minute == 0 else []))
+    return spelling, f"{hour:02d}:{minute:02d}"
+
+
+def check_corpus(cases, seed):
+    rng = random.Random(seed)
+    today = datetime.date.today()
+    results = {"date": {"new ok": 0, "legacy ok": 0, "legacy past (no rollover)": 0, "legacy unparsed": 0},
+               "time": {"new ok": 0, "legacy ok": 0, "legacy unpadded": 0, "legacy unparsed": 0}}
+    failures = []
+
+    for _ in range(cases):
+        text, expected = random_date_case(rng, today)
+        new = normalize_date(text, today)
+        legacy = legacy_convert_relative_date(text)
+        if new == expected.isoformat():
+            results["date"]["new ok"] += 1
+        else:
+            failures.append(("date", text, new, expected.isoformat()))
+        # Idempotent, and either ISO or the input as given
+        assert normalize_date(new, today) == new, text
+        assert ISO_DATE.match(new) or new == text, text
+        if legacy == expected.isoformat():
+            results["date"]["legacy ok"] += 1
+        elif ISO_DATE.match(legacy or "") and legacy.replace(str(today.year), str(today.year + 1), 1) == expected.isoformat():
+            results["date"]["legacy past (no rollover)"] += 1
+        else:
+            results["date"]["legacy unparsed"] += 1
+
+        text, expected = random_time_case(rng)
+        new = normalize_time(text)
+        legacy = legacy_convert_to_24hour_format(text)
+        if new == expected:
+            results["time"]["new ok"] += 1
+        else:
+            failures.append(("time", text, new, expected))
+        assert normalize_time(new) == new, text
+        assert HH_MM.match(new) or new == text, text
+        if legacy == expected:
+            results["time"]["legacy ok"] += 1
+        elif legacy and legacy.zfill(5) == expected:
+            results["time"]["legacy unpadded"] += 1
+        else:
+            results["time"]["legacy unparsed"] += 1
+
+    print(f"corpus: {cases} dates and {cases} times (seed {seed})")
+    for kind, counts in results.items():
+        print(f"  {kind}: " + ", ".join(f"{name} {count / cases:.1%}" for name, count in counts.items()))
+    for kind, text, got, expected in failures[:10]:
+        print(f"  new {kind} mismatch: {text!r} -> {got!r}, expected {expected!r}")
+    return not failures
+
+
+def timeit(function, inputs, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for value in inputs:
+            function(value)
+        elapsed = (time.perf_counter() - start) / len(inputs)
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def legacy_normalize(record):
+    # What parse_extraction_response() used to do: each field converted twice
+    for field in ("appointment_date", "old_date", "new_date"):
+        if record.get(field):
+            record[field] = legacy_convert_relative_date(record[field])
+    for field in ("appointment_time", "old_time", "new_time"):
+        if record.get(field):
+            record[field] = legacy_convert_to_24hour_format(record[field])
+    for field in ("appointment_date", "old_date", "new_date"):
+        if record.get(field):
+            record[field] = legacy_convert_relative_date(record[field])
+    for field in ("appointment_time", "old_time", "new_time"):
+        if record.get(field):
+            record[field] = legacy_convert_to_24hour_format(record[field])
+    return record
+
+
+def run_timing(cases, seed):
+    rng = random.Random(seed)
+    today = datetime.date.today()
+    dates = [random_date_case(rng, today)[0] for _ in range(cases)]
+    times = [random_time_case(rng)[0] for _ in range(cases)]
+    distinct_dates = list(dict.fromkeys(dates))
+
+    print(f"\nper call ({len(distinct_dates)} distinct date strings)")
+    datetime_normalizer._parse_date.cache_clear()
+    cold = timeit(lambda text: datetime_normalizer._parse_date(" ".join(text.lower().split()), today), distinct_dates, repeat=1)
+    rows = [
+        ("legacy convert_relative_date", timeit(legacy_convert_relative_date, dates)),
+        ("normalize_date, cold", cold),
+        ("normalize_date, memoized", timeit(lambda text: normalize_date(text, today), dates)),
+        ("legacy convert_to_24hour_format", timeit(legacy_convert_to_24hour_format, times)),
+        ("normalize_time, memoized", timeit(normalize_time, times)),
+    ]
+    for name, seconds in rows:
+        print(f"  {name:<34} {seconds * 1e6:>8.2f} us")
+
+    records = [{"intent": "reschedule", "appointment_date": dates[i], "appointment_time": times[i],
+                "old_date": dates[-i - 1], "old_time": times[-i - 1], "new_date": dates[i // 2], "new_time": times[i // 2]}
+               for i in range(cases)]
+    start = time.perf_counter()
+    for record in records:
+        legacy_normalize(dict(record))
+    legacy_batch = time.perf_counter() - start
+    start = time.perf_counter()
+    normalize_records(records, today)
+    batch = time.perf_counter() - start
+    print(f"\nbatch of {cases} extracted records (6 date/time fields each)")
+    print(f"  legacy, every field converted twice  {legacy_batch * 1e3:>8.1f} ms")
+    print(f"  normalize_records()                  {batch * 1e3:>8.1f} ms  ({legacy_batch / batch:.0f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cases", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    ok = check_corpus(args.cases, args.seed)
+    run_timing(args.cases, args.seed)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Query latency of the appointment lookups before and after the index migration.
+
+    python benchmarks/bench_db_indexes.py                   # 1M appointments
+    python benchmarks/bench_db_indexes.py --appointments 200000
+
+Seeds a scratch database at the base schema (migration 1), times the queries
+that book/reschedule/cancel run, applies the remaining migrations and times
+them again.
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from migrations import apply_migrations
+
+SPECIALIZATIONS = ["Cardiology", "Neurology", "Pediatrics", "Orthopedics", "Dermatology",
+                   "Gynecology", "Oncology", "Psychiatry", "Radiology", "Urology"]
+TIMES = [f"{hour:02d}:{minute:02d}" for hour in range(8, 20) for minute in (0, 30)]
+
+
+def seed(conn, appointments, doctors, patients, rng):
+    conn.execute("DELETE FROM Doctors")
+    conn.executemany(
+        "INSERT INTO Doctors (doctor_id, name, specialization) VALUES (?, ?, ?)",
+        [(f"D{i:05d}", f"Dr. Doctor{i}", SPECIALIZATIONS[i % len(SPECIALIZATIONS)]) for i in range(doctors)]
+    )
+    conn.executemany(
+        "INSERT INTO Patients (patient_id, name, age, gender, contact_number, email, medical_history) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        ((f"P{i:07d}", f"Patient {i}", 20 + i % 60, "F" if i % 2 else "M", "555-0100", f"p{i}@example.com",
+          SPECIALIZATIONS[i % len(SPECIALIZATIONS)]) for i in range(patients))
+    )
+
+    # Walk (doctor, day, time) so every active slot is booked at most once
+    def rows():
+        slot = 0
+        for i in range(appointments):
+            doctor = slot % doctors
+            day_time = slot // doctors
+            day, time_index = divmod(day_time, len(TIMES))
+            date = f"{2020 + day // 336}-{(day // 28) % 12 + 1:02d}-{day % 28 + 1:02d}"
+            slot += 1
+            yield (f"A{i:08d}", f"P{rng.randrange(patients):07d}", f"D{doctor:05d}",
+                   SPECIALIZATIONS[doctor % len(SPECIALIZATIONS)], date, TIMES[time_index],
+                   "Cancelled" if i % 10 == 0 else "Scheduled")
+
+    conn.executemany(
+        "INSERT INTO Appointments (appointment_id, patient_id, doctor_id, department, date, time, status) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        rows()
+    )
+    conn.commit()
+
+
+def sample_lookups(conn, count, rng):
+    rows = conn.execute(
+        "SELECT a.patient_id, p.name, a.doctor_id, d.specialization, a.date, a.time FROM Appointments a "
+        "JOIN Patients p ON p.patient_id = a.patient_id JOIN Doctors d ON d.doctor_id = a.doctor_id "
+        "WHERE a.rowid IN (SELECT abs(random()) % (SELECT MAX(rowid) FROM Appointments) + 1 FROM Appointments LIMIT ?)",
+        (count,)
+    ).fetchall()
+    rng.shuffle(rows)
+    return rows
+
+
+QUERIES = {
+    "patient by name": ("SELECT patient_id FROM Patients WHERE name = ?", lambda r: (r[1],)),
+    "patient appointment slot": (
+        "SELECT appointment_id FROM Appointments WHERE patient_id = ? AND date = ? AND time = ?",
+        lambda r: (r[0], r[4], r[5])),
+    "doctors by specialization": ("SELECT doctor_id, name FROM Doctors WHERE specialization = ?", lambda r: (r[3],)),
+    "doctor slot taken": (
+        "SELECT appointment_id FROM Appointments WHERE doctor_id = ? AND date = ? AND time = ? AND status != 'Cancelled'",
+        lambda r: (r[2], r[4], r[5])),
+}
+
+
+def time_queries(conn, samples):
+    results = {}
+    for name, (sql, params) in QUERIES.items():
+        latencies = []
+        for row in samples:
+            start = time.perf_counter()
+            conn.execute(sql, params(row)).fetchall()
+            latencies.append(time.perf_counter() - start)
+        results[name] = latencies
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--appointments", type=int, default=1_000_000)
+    parser.add_argument("--patients", type=int, default=200_000)
+    parser.add_argument("--doctors", type=int, default=300)
+    parser.add_argument("--samples", type=int, default=50)
+    args = parser.parse_args()
+    rng = random.Random(7)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        run(os.path.join(tmp, "bench_indexes.sqlite3"), args, rng)
+
+
+def run(path, args, rng):
+    conn = sqlite3.connect(path)
+    apply_migrations(conn, target_version=1)
+
+    start = time.perf_counter()
+    seed(conn, args.appointments, args.doctors, args.patients, rng)
+    print(f"seeded {args.appointments} appointments, {args.patients} patients, {args.doctors} doctors "
+          f"in {time.perf_counter() - start:.1f}s ({path})")
+
+    samples = sample_lookups(conn, args.samples, rng)
+    before = time_queries(conn, samples)
+
+    start = time.perf_counter()
+    applied = apply_migrations(conn)
+    print(f"applied migrations {applied} in {time.perf_counter() - start:.1f}s\n")
+    after = time_queries(conn, samples)
+
+    print(f"{'query':<28} {'before p50':>12} {'after p50':>12} {'speedup':>9}")
+    for name in QUERIES:
+        b = statistics.median(before[name])
+        a = statistics.median(after[name])
+        print(f"{name:<28} {b * 1e3:>10.3f}ms {a * 1e3:>10.3f}ms {b / a:>8.0f}x")
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Routing benchmark: local intent classifier vs the LLM-only detect_intent path.
+
+    python benchmarks/bench_intent_routing.py            # local classifier only
+    python benchmarks/bench_intent_routing.py --llm      # also time the Gemini path
+    python benchmarks/bench_intent_routing.py --eval-file benchmarks/intent_eval.jsonl
+
+Reports accuracy, escalation rate and p50/p99 routing latency on a labelled set,
+and the escalation rate and local accuracy at a range of confidence thresholds.
+The default set, benchmarks/intent_heldout.jsonl, was written separately from
+the classifier's rules: paraphrases without the obvious keywords, typos, and
+messages that mix symptoms with a booking request. benchmarks/intent_eval.jsonl
+was written alongside the rules and only shows they do what they say.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from intent_classifier import classify_intent, is_confident, CONFIDENCE_THRESHOLD
+
+EVAL_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "intent_heldout.jsonl")
+SWEEP_THRESHOLDS = [0.6, 0.7, 0.8, 0.85, 0.9, 0.95, 0.98]
+
+
+def load_eval_set(path=EVAL_FILE):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(pct / 100.0 * (len(values) - 1))))
+    return values[index]
+
+
+def report(name, predictions, latencies, escalated=None):
+    correct = sum(1 for label, predicted in predictions if label == predicted)
+    print(f"\n{name}")
+    print(f"  accuracy:        {correct / len(predictions):.1%} ({correct}/{len(predictions)})")
+    if escalated is not None:
+        print(f"  escalation rate: {escalated / len(predictions):.1%} ({escalated}/{len(predictions)})")
+    print(f"  p50 latency:     {percentile(latencies, 50) * 1e6:.1f} us")
+    print(f"  p99 latency:     {percentile(latencies, 99) * 1e6:.1f} us")
+    print(f"  mean latency:    {statistics.mean(latencies) * 1e6:.1f} us")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--llm", action="store_true", help="also run the LLM-only path (needs GEMINI_API_KEY)")
+    parser.add_argument("--threshold", type=float, default=CONFIDENCE_THRESHOLD)
+    parser.add_argument("--eval-file", default=EVAL_FILE)
+    parser.add_argument("--repeat", type=int, default=200, help="timing repetitions per example for the local path")
+    args = parser.parse_args()
+
+    examples = load_eval_set(args.eval_file)
+    print(f"{len(examples)} labelled examples from {os.path.basename(args.eval_file)}, "
+          f"confidence threshold {args.threshold}")
+
+    # Local classifier alone, and the subset it would answer without the LLM
+    predictions, latencies, confident = [], [], []
+    for example in examples:
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            label, confidence = classify_intent(example["text"])
+        latencies.append((time.perf_counter() - start) / args.repeat)
+        predictions.append((example["label"], label))
+        if is_confident(confidence, args.threshold):
+            confident.append((example["label"], label))
+    report("Local classifier (all examples)", predictions, latencies, escalated=len(examples) - len(confident))
+    if confident:
+        correct = sum(1 for label, predicted in confident if label == predicted)
+        print(f"  accuracy when not escalated: {correct / len(confident):.1%} ({correct}/{len(confident)})")
+
+    mistakes = [(example["text"], example["label"]) for example, (_, predicted) in zip(examples, predictions)
+                if example["label"] != predicted]
+    for text, label in mistakes:
+        print(f"  miss: expected {label!r}: {text}")
+
+    # Escalating more buys local accuracy; the threshold is picked from this table
+    scored = [(example["label"], classify_intent(example["text"])) for example in examples]
+    print(f"\n  {'threshold':>9} {'escalated':>10} {'local accuracy':>15} {'local errors':>13}")
+    for threshold in SWEEP_THRESHOLDS:
+        local = [(label, predicted) for label, (predicted, confidence) in scored if is_confident(confidence, threshold)]
+        errors = sum(1 for label, predicted in local if label != predicted)
+        accuracy = f"{1 - errors / len(local):.1%}" if local else "-"
+        print(f"  {threshold:>9} {1 - len(local) / len(scored):>10.1%} {accuracy:>15} {errors:>13}")
+
+    if not args.llm:
+        print("\nLLM-only path skipped (pass --llm to include it)")
+        return
+
+    from detect_intent import detect_intent_llm
+
+    llm_predictions, llm_latencies = [], []
+    hybrid_predictions, hybrid_latencies = [], []
+    for example, local_latency in zip(examples, latencies):
+        start = time.perf_counter()
+        llm_label = detect_intent_llm(example["text"])
+        llm_latency = time.perf_counter() - start
+        llm_predictions.append((example["label"], llm_label))
+        llm_latencies.append(llm_latency)
+
+        label, confidence = classify_intent(example["text"])
+        if is_confident(confidence, args.threshold):
+            hybrid_predictions.append((example["label"], label))
+            hybrid_latencies.append(local_latency)
+        else:
+            hybrid_predictions.append((example["label"], llm_label))
+            hybrid_latencies.append(local_latency + llm_latency)
+
+    report("LLM only (detect_intent_llm)", llm_predictions, llm_latencies)
+    report("Local classifier with LLM fallback (detect_intent)", hybrid_predictions, hybrid_latencies,
+           escalated=len(examples) - len(confident))
+
+
+if __name__ == "__main__":
+    main()
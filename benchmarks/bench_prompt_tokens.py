@@ -0,0 +1,58 @@
+"""
+Prompt size of the extraction prompts: every few-shot example versus the registry's selection.
+
+    python benchmarks/bench_prompt_tokens.py
+    PROMPT_TOKEN_BUDGET=700 python benchmarks/bench_prompt_tokens.py
+
+Renders the "extract" and "route_and_extract" prompts for the
+messages in benchmarks/intent_eval.jsonl, once with all examples (what every
+call used to send) and once through prompts.py, and reports tokens per prompt
+and render time. Tokens are the estimate in prompts.count_tokens(), or exact
+with PROMPT_TOKENIZER=cl100k_base and tiktoken installed.
+"""
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import prompts  # noqa: E402
+from prompts import PROMPTS, PromptTemplate, count_tokens, guess_intent  # noqa: E402
+
+EVAL_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "intent_eval.jsonl")
+
+
+def main():
+    with open(EVAL_FILE) as f:
+        messages = [json.loads(line)["text"] for line in f if line.strip()]
+
+    print(f"{len(messages)} messages, budget {prompts.PROMPT_TOKEN_BUDGET} tokens, "
+          f"{prompts.PROMPT_MAX_EXAMPLES} examples\n")
+    print(f"{'template':<20} {'all examples':>14} {'selected':>10} {'saved':>7} {'render p50':>12}")
+    for name in ("extract", "route_and_extract"):
+        template = PROMPTS[name]
+        everything = PromptTemplate(name + "_all", template.prefix, template.suffix, template.examples,
+                                    max_examples=len(template.examples), budget=10 ** 6)
+        before, after, latencies = [], [], []
+        for message in messages:
+            hint = guess_intent(message)
+            if name == "route_and_extract":
+                hint = hint or "medical"
+            before.append(count_tokens(everything.render(hint, user_input=message)))
+            start = time.perf_counter()
+            prompt = template.render(hint, user_input=message)
+            latencies.append(time.perf_counter() - start)
+            after.append(count_tokens(prompt))
+        b, a = statistics.mean(before), statistics.mean(after)
+        print(f"{name:<20} {b:>14.0f} {a:>10.0f} {1 - a / b:>7.0%} {statistics.median(latencies) * 1e6:>10.0f}us")
+
+    print("\nprompt_stats():")
+    for name, stats in prompts.prompt_stats().items():
+        if stats["calls"] and not name.endswith("_all"):
+            print(f"  {name}: {json.dumps({k: round(v, 1) for k, v in stats.items()})}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Semantic cache lookup latency versus index size.
+
+    python benchmarks/bench_semantic_cache.py
+    python benchmarks/bench_semantic_cache.py --sizes 1000 10000 100000 500000 --nprobe 16
+
+Compares exact brute-force search with the IVF index on synthetic clustered unit
+vectors (real question embeddings cluster by topic) and reports p50/p99 lookup
+latency, IVF recall against brute force, and the embedding cost per question.
+
+First checks that question pairs which differ in one deciding word (hypo- vs
+hyperthyroidism, child vs adult, high vs low, one drug vs another) are never
+served each other's answer by the default cache, and exits non-zero if one is.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from semantic_cache import BruteForceIndex, HashingEmbedder, IVFIndex, SemanticCache
+
+# (cached question, new question): a different question each time, most of them
+# scoring above the old 0.9 threshold with the hashing embedder
+DIFFERENT_QUESTIONS = [
+    ("What are the early warning signs and symptoms of hypothyroidism in women over fifty?",
+     "What are the early warning signs and symptoms of hyperthyroidism in women over fifty?"),
+    ("What is the recommended maximum daily dose of paracetamol for a child with a fever and a sore throat?",
+     "What is the recommended maximum daily dose of paracetamol for an adult with a fever and a sore throat?"),
+    ("What lifestyle changes and home remedies help with high blood pressure during the winter months?",
+     "What lifestyle changes and home remedies help with low blood pressure during the winter months?"),
+    ("Can I take ibuprofen together with my blood pressure tablets in the morning after breakfast?",
+     "Can I take naproxen together with my blood pressure tablets in the morning after breakfast?"),
+    ("How long does it take for amoxicillin to start working on a chest infection?",
+     "How long does it take for azithromycin to start working on a chest infection?"),
+    ("Is it safe to take paracetamol while breastfeeding?", "Is it safe to take paracetamol while pregnant?"),
+    ("What are the symptoms of type 1 diabetes?", "What are the symptoms of type 2 diabetes?"),
+    ("Is it safe to drink alcohol with antibiotics?", "Is it not safe to drink alcohol with antibiotics?"),
+]
+# Rewordings that should still be served from the cache
+SAME_QUESTIONS = [
+    ("What are the symptoms of flu?", "what are the symptoms of the flu"),
+    ("How do I treat a migraine?", "how do I treat migraine, please"),
+]
+
+
+def check_guards(embedder):
+    cache = SemanticCache(embedder)
+    failures = 0
+    print(f"guard checks at threshold {cache.threshold}:")
+    for cached, asked, should_hit in ([(a, b, False) for a, b in DIFFERENT_QUESTIONS]
+                                      + [(a, b, True) for a, b in SAME_QUESTIONS]):
+        cache.add(cached, cached)
+        match = cache.lookup(asked)
+        served = match is not None and match[0] == cached
+        similarity = float(embedder.embed(cached) @ embedder.embed(asked))
+        ok = served == should_hit
+        failures += not ok
+        print(f"  {'ok  ' if ok else 'FAIL'} {similarity:.3f} {'hit ' if served else 'miss'} {asked}")
+    print()
+    return failures
+
+
+def clustered_vectors(count, dim, clusters, rng):
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, clusters, count)] + 0.5 * rng.standard_normal((count, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def time_queries(index, queries):
+    latencies, results = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results.append(index.search(query)[0])
+        latencies.append(time.perf_counter() - start)
+    return np.array(latencies), results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000, 300000])
+    parser.add_argument("--dim", type=int, default=512)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--nprobe", type=int, default=8)
+    args = parser.parse_args()
+    rng = np.random.default_rng(42)
+
+    embedder = HashingEmbedder(dim=args.dim)
+    question = "What are the common symptoms of seasonal flu in adults?"
+    start = time.perf_counter()
+    for _ in range(1000):
+        embedder.embed(question)
+    print(f"hashing embedder: {(time.perf_counter() - start) / 1000 * 1e6:.1f} us per question (dim {args.dim})\n")
+    failures = check_guards(embedder)
+
+    print(f"{'size':>8} | {'brute p50':>10} {'brute p99':>10} | {'ivf p50':>10} {'ivf p99':>10} {'recall':>7} | {'ivf build':>9}")
+    for size in args.sizes:
+        vectors = clustered_vectors(size, args.dim, clusters=max(10, size // 200), rng=rng)
+        # Queries are perturbed copies of stored vectors, like paraphrased questions
+        picks = rng.integers(0, size, args.queries)
+        queries = vectors[picks] + 0.1 * rng.standard_normal((args.queries, args.dim)).astype(np.float32)
+        queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+        brute = BruteForceIndex(args.dim, initial_capacity=size)
+        brute.add_many(vectors)
+        brute_latencies, brute_results = time_queries(brute, queries)
+
+        start = time.perf_counter()
+        ivf = IVFIndex(args.dim, nprobe=args.nprobe, initial_capacity=size)
+        ivf.add_many(vectors)
+        build_time = time.perf_counter() - start
+        ivf_latencies, ivf_results = time_queries(ivf, queries)
+        recall = np.mean([a == b for a, b in zip(brute_results, ivf_results)])
+
+        print(f"{size:>8} | {np.percentile(brute_latencies, 50) * 1e3:>8.3f}ms {np.percentile(brute_latencies, 99) * 1e3:>8.3f}ms"
+              f" | {np.percentile(ivf_latencies, 50) * 1e3:>8.3f}ms {np.percentile(ivf_latencies, 99) * 1e3:>8.3f}ms {recall:>7.1%}"
+              f" | {build_time:>8.2f}s")
+    if failures:
+        sys.exit(f"{failures} guard checks failed")
+
+
+if __name__ == "__main__":
+    main()
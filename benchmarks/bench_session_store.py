@@ -0,0 +1,129 @@
+"""
+Session store backends under many abandoned conversations.
+
+    python benchmarks/bench_session_store.py
+    python benchmarks/bench_session_store.py --sessions 200000 --max-entries 10000
+
+Starts --sessions conversations that never finish (the usual case for a chat
+widget) against the old module-level dict and each session store, and reports
+get/set latency, how many sessions each keeps, and the Python heap they hold.
+The Redis store runs against FakeRedis below, an in-process stand-in for the
+get/set(ex=)/delete commands it uses; point REDIS_URL at a server and pass
+--redis to use a real one.
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from session import MemorySessionStore, SQLiteSessionStore, RedisSessionStore  # noqa: E402
+
+
+class FakeRedis:
+    """The subset of redis.Redis used by RedisSessionStore, with key expiry."""
+
+    def __init__(self):
+        self._data = {}
+
+    def get(self, key):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[0] is not None and entry[0] <= time.time():
+            del self._data[key]
+            return None
+        return entry[1]
+
+    def set(self, key, value, ex=None):
+        self._data[key] = (time.time() + ex if ex else None, value.encode() if isinstance(value, str) else value)
+
+    def delete(self, key):
+        return 1 if self._data.pop(key, None) is not None else 0
+
+    def dbsize(self):
+        return len(self._data)
+
+
+class DictStore:
+    """The old behaviour: a plain dict that keeps every session forever."""
+
+    def __init__(self):
+        self._states = {}
+
+    def get(self, session_id):
+        return self._states.get(session_id)
+
+    def set(self, session_id, state):
+        self._states[session_id] = state
+
+    def __len__(self):
+        return len(self._states)
+
+
+def conversation_state(i):
+    return {
+        'extracted_data': {
+            'intent': 'book', 'name': f'Patient {i}', 'appointment_date': '2030-01-15',
+            'appointment_time': '10:00', 'age': None, 'gender': None, 'contact_number': None,
+            'email': None, 'department': 'Cardiology', 'old_date': None, 'old_time': None,
+            'new_date': None, 'new_time': None,
+        },
+        'missing_fields': ['age', 'gender', 'contact_number', 'email'],
+    }
+
+
+def run(name, store, sessions, size=len):
+    tracemalloc.start()
+    set_latencies, get_latencies = [], []
+    for i in range(sessions):
+        session_id = f"session-{i:08d}"
+        start = time.perf_counter()
+        store.set(session_id, conversation_state(i))
+        set_latencies.append(time.perf_counter() - start)
+        if i % 10 == 0:
+            start = time.perf_counter()
+            store.get(session_id)
+            get_latencies.append(time.perf_counter() - start)
+    heap = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print(f"{name:<8} {size(store):>9} {statistics.median(set_latencies) * 1e6:>9.1f}us "
+          f"{statistics.median(get_latencies) * 1e6:>9.1f}us {heap / 2**20:>9.1f}MB")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=100_000)
+    parser.add_argument("--max-entries", type=int, default=10_000)
+    parser.add_argument("--redis", action="store_true", help="use the server at REDIS_URL")
+    args = parser.parse_args()
+
+    print(f"{args.sessions} abandoned conversations\n")
+    print(f"{'store':<8} {'kept':>9} {'set p50':>11} {'get p50':>11} {'heap':>11}")
+    run("dict", DictStore(), args.sessions)
+    run("memory", MemorySessionStore(args.max_entries, ttl_seconds=1800), args.sessions)
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SQLiteSessionStore(os.path.join(tmp, "sessions.sqlite3"), ttl_seconds=1800)
+        run("sqlite", store, args.sessions)
+        store._conn.close()
+
+    if args.redis:
+        import redis
+        client = redis.Redis.from_url(os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+    else:
+        client = FakeRedis()
+    run("redis", RedisSessionStore(client, ttl_seconds=1800), args.sessions, size=lambda store: store.client.dbsize())
+
+    # Expiry: everything above is past its TTL once the clock passes it
+    store = MemorySessionStore(args.max_entries, ttl_seconds=0)
+    for i in range(1000):
+        store.set(f"session-{i}", conversation_state(i))
+    print(f"\nexpire() on a memory store with TTL 0 removed {store.expire()} of 1000 sessions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""
+Identical concurrent model calls coalesced into one upstream call.
+
+    python benchmarks/bench_singleflight.py
+    CONCURRENCY=200 python benchmarks/bench_singleflight.py
+
+Sends CONCURRENCY identical requests at once to a fake model that takes
+LLM_LATENCY seconds per call, through the threaded path (singleflight.invoke,
+used by ai.py, detect_intent.py and medical_ai.py), the asyncio path
+(async_pipeline.ainvoke) and both medical answer streams, and checks that each
+makes exactly one upstream call while every caller gets the answer. Distinct
+prompts must still get their own calls, and an upstream error must reach every
+waiting caller. Exits non-zero when a check fails.
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import singleflight  # noqa: E402
+
+CONCURRENCY = int(os.getenv("CONCURRENCY", "50"))
+LLM_LATENCY = float(os.getenv("LLM_LATENCY", "0.2"))
+
+
+class Message:
+    def __init__(self, content):
+        self.content = content
+
+
+class SlowLLM:
+    """Counts upstream calls; every call sleeps LLM_LATENCY seconds."""
+
+    model = "fake-slow"
+
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _answer(self, prompt):
+        with self._lock:
+            self.calls += 1
+        if self.fail:
+            raise RuntimeError("upstream unavailable")
+        return f"answer to {prompt[-20:]}"
+
+    def invoke(self, prompt):
+        time.sleep(LLM_LATENCY)
+        return Message(self._answer(prompt))
+
+    async def ainvoke(self, prompt):
+        await asyncio.sleep(LLM_LATENCY)
+        return Message(self._answer(prompt))
+
+    def stream(self, prompt):
+        answer = self._answer(prompt)
+        for word in answer.split(" "):
+            time.sleep(LLM_LATENCY / 4)
+            yield Message(word + " ")
+
+    async def astream(self, prompt):
+        answer = self._answer(prompt)
+        for word in answer.split(" "):
+            await asyncio.sleep(LLM_LATENCY / 4)
+            yield Message(word + " ")
+
+
+failures = []
+
+
+def check(name, llm, results, expected_calls, elapsed):
+    ok = llm.calls == expected_calls and len(results) == CONCURRENCY
+    print(f"{name:<34} {CONCURRENCY:>8} {llm.calls:>9} {elapsed:>9.2f}s  {'ok' if ok else 'FAIL'}")
+    if not ok:
+        failures.append(name)
+
+
+def run_threads(fn):
+    barrier = threading.Barrier(CONCURRENCY)
+
+    def call(i):
+        barrier.wait()
+        return fn(i)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(CONCURRENCY) as pool:
+        results = list(pool.map(call, range(CONCURRENCY)))
+    return results, time.perf_counter() - start
+
+
+def threaded_invoke():
+    llm = SlowLLM()
+    results, elapsed = run_threads(lambda i: singleflight.invoke(llm, "same prompt").content)
+    check("threads: identical invoke", llm, results, 1, elapsed)
+    assert len(set(results)) == 1
+
+    llm = SlowLLM()
+    results, elapsed = run_threads(lambda i: singleflight.invoke(llm, f"prompt {i % 5}").content)
+    check("threads: 5 distinct prompts", llm, results, 5, elapsed)
+
+    llm = SlowLLM(fail=True)
+
+    def failing(i):
+        try:
+            singleflight.invoke(llm, "same prompt")
+        except RuntimeError as e:
+            return str(e)
+
+    results, elapsed = run_threads(failing)
+    check("threads: upstream error shared", llm, results, 1, elapsed)
+    assert set(results) == {"upstream unavailable"}
+
+
+def threaded_stream(medical_ai):
+    llm = medical_ai.medical_ai = SlowLLM()
+    results, elapsed = run_threads(lambda i: "".join(medical_ai.stream_medical_query("What causes colds?")))
+    check("threads: medical answer stream", llm, results, 1, elapsed)
+    assert len(set(r.strip() for r in results)) == 1
+
+
+async def async_invoke(async_pipeline):
+    llm = SlowLLM()
+    start = time.perf_counter()
+    results = await asyncio.gather(*(async_pipeline.ainvoke(llm, "same prompt", "bench")
+                                     for _ in range(CONCURRENCY)))
+    check("asyncio: identical ainvoke", llm, results, 1, time.perf_counter() - start)
+    assert len(set(results)) == 1
+
+    # The caller that started the call giving up doesn't cancel it for the others
+    llm = SlowLLM()
+    start = time.perf_counter()
+    first = asyncio.ensure_future(async_pipeline.ainvoke(llm, "same prompt", "bench"))
+    await asyncio.sleep(0)
+    rest = [asyncio.ensure_future(async_pipeline.ainvoke(llm, "same prompt", "bench"))
+            for _ in range(CONCURRENCY - 1)]
+    first.cancel()
+    results = await asyncio.gather(*rest)
+    check("asyncio: first caller cancelled", llm, results + [None], 1, time.perf_counter() - start)
+
+
+async def async_stream(async_pipeline, medical_ai):
+    llm = medical_ai.medical_ai = SlowLLM()
+
+    async def read():
+        return "".join([piece async for piece in async_pipeline.astream_medical_query("What causes flu?")])
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(read() for _ in range(CONCURRENCY)))
+    check("asyncio: medical answer stream", llm, results, 1, time.perf_counter() - start)
+    assert len(set(r.strip() for r in results)) == 1
+
+
+def main():
+    # No answer caches, so every question reaches the (fake) model
+    os.environ["MEDICAL_CACHE_ENABLED"] = "false"
+    os.environ["SEMANTIC_CACHE_ENABLED"] = "false"
+    import medical_ai
+    import async_pipeline
+    medical_ai.medical_cache = medical_ai.semantic_cache = None
+
+    print(f"{'path':<34} {'callers':>8} {'upstream':>9} {'elapsed':>10}")
+    threaded_invoke()
+    threaded_stream(medical_ai)
+    asyncio.run(async_invoke(async_pipeline))
+    asyncio.run(async_stream(async_pipeline, medical_ai))
+    print(f"\ncoalesce_stats(): {singleflight.coalesce_stats()}")
+    if failures:
+        sys.exit(f"failed: {', '.join(failures)}")
+
+
+if __name__ == "__main__":
+    main()
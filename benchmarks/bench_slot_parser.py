@@ -0,0 +1,85 @@
+"""
+How many follow-up answers the local slot parser handles without the LLM.
+
+    python benchmarks/bench_slot_parser.py
+
+Runs typical replies to "Please provide your <field>" through
+slot_parser.parse_field() and reports, per field, the share parsed locally,
+whether the parsed values are right, and the parse latency. Replies the parser
+rejects are the turns that fall back to ai.extract_field().
+"""
+import datetime
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# Departments are read from the Doctors table of a scratch copy of the database
+_scratch = tempfile.mkdtemp()
+os.environ["HOSPITAL_DB_FILE"] = os.path.join(_scratch, "hospital_db.sqlite3")
+shutil.copy(os.path.join(ROOT, "hospital_db.sqlite3"), os.environ["HOSPITAL_DB_FILE"])
+
+import slot_parser  # noqa: E402
+
+TODAY = datetime.date.today()
+TOMORROW = (TODAY + datetime.timedelta(days=1)).isoformat()
+NEXT_MONTH = (TODAY + datetime.timedelta(days=30)).isoformat()
+NEXT_FRIDAY = (TODAY + datetime.timedelta(days=(4 - TODAY.weekday()) % 7 or 7)).isoformat()
+
+# (field, reply, expected value; None means the LLM should handle it)
+ANSWERS = [
+    ("age", "34", 34), ("age", "I'm 34", 34), ("age", "34 years old", 34), ("age", "age 7", 7),
+    ("age", "thirty four", None), ("age", "200", None),
+    ("age", "8 months", None), ("age", "18 months old", 1), ("age", "3 weeks", None), ("age", "10 days old", None),
+    ("gender", "F", "Female"), ("gender", "male", "Male"), ("gender", "Woman", "Female"),
+    ("gender", "other", "Other"), ("gender", "prefer not to say", None),
+    ("contact_number", "555-123-4567", "5551234567"), ("contact_number", "+44 20 7946 0958", "+442079460958"),
+    ("contact_number", "(555) 123 4567", "5551234567"), ("contact_number", "my number is 5551234567", None),
+    ("email", "ann@example.com", "ann@example.com"), ("email", "It's Bob.Smith@Mail.org", "bob.smith@mail.org"),
+    ("email", "ann at example dot com", None),
+    ("department", "Cardiology", "Cardiology"), ("department", "cardio", "Cardiology"),
+    ("department", "neurology department", "Neurology"), ("department", "pediatrcs", "Pediatrics"),
+    ("department", "skin doctor", None),
+    ("appointment_time", "5 PM", "17:00"), ("appointment_time", "5:30pm", "17:30"), ("appointment_time", "09:15", "09:15"),
+    ("appointment_time", "at 11 a.m.", "11:00"), ("appointment_time", "noon", "12:00"),
+    ("appointment_time", "after lunch", None),
+    ("appointment_date", "tomorrow", TOMORROW), ("appointment_date", NEXT_MONTH, NEXT_MONTH),
+    ("appointment_date", "next friday", NEXT_FRIDAY),
+    ("appointment_date", "whenever works", None), ("appointment_date", "2020-01-01", None),
+    ("appointment_date", "2099-01-01", None),
+    ("name", "Ann Lee", "Ann Lee"), ("name", "O'Brien", "O'Brien"), ("name", "my name is 42", None),
+]
+
+
+def main():
+    by_field = defaultdict(lambda: {"total": 0, "local": 0, "wrong": 0})
+    latencies = []
+    for field, reply, expected in ANSWERS:
+        start = time.perf_counter()
+        value = slot_parser.parse_field(field, reply)
+        latencies.append(time.perf_counter() - start)
+        stats = by_field[field]
+        stats["total"] += 1
+        if value is not None:
+            stats["local"] += 1
+        if value != expected:
+            stats["wrong"] += 1
+            print(f"  mismatch: {field} {reply!r} -> {value!r}, expected {expected!r}")
+
+    print(f"\n{'field':<18} {'replies':>8} {'local':>8} {'wrong':>6}")
+    for field, stats in by_field.items():
+        print(f"{field:<18} {stats['total']:>8} {stats['local'] / stats['total']:>8.0%} {stats['wrong']:>6}")
+    total = len(ANSWERS)
+    local = sum(stats["local"] for stats in by_field.values())
+    print(f"\n{local}/{total} replies ({local / total:.0%}) parsed without a model call, "
+          f"p50 {statistics.median(latencies) * 1e6:.1f}us")
+    shutil.rmtree(_scratch, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Worker cold start: time and memory to import app.py.
+
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --baseline <git revision>
+    python benchmarks/bench_startup.py --runs 10 --module asgi
+
+Imports the app in fresh interpreters under `python -X importtime` (with the
+model client warm-up off, like a worker before its first request) and reports
+the median wall-clock import time, peak RSS, and the slowest modules imported
+directly by the app. With --baseline, the same is measured for an older
+revision of the tree (extracted with `git archive`) for a before/after table.
+Each run uses a scratch copy of the database.
+"""
+import argparse
+import json
+import os
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_CHILD = """
+import resource, sys, time
+sys.path.insert(0, {tree!r})
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print("RESULT", elapsed, rss * (1 if sys.platform == "darwin" else 1024))
+"""
+
+_IMPORTTIME = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( +)(\S+)")
+
+
+def measure(tree, module, runs):
+    times, rss, modules = [], [], {}
+    for _ in range(runs):
+        scratch = tempfile.mkdtemp()
+        try:
+            shutil.copy(os.path.join(tree, "hospital_db.sqlite3"), scratch)
+            env = dict(os.environ, LLM_WARMUP="false", PYTHONDONTWRITEBYTECODE="1",
+                       HOSPITAL_DB_FILE=os.path.join(scratch, "hospital_db.sqlite3"))
+            env.setdefault("GEMINI_API_KEY", "benchmark")
+            result = subprocess.run(
+                [sys.executable, "-X", "importtime", "-c", _CHILD.format(tree=tree, module=module)],
+                cwd=scratch, env=env, capture_output=True, text=True,
+            )
+        finally:
+            shutil.rmtree(scratch, ignore_errors=True)
+        line = next((line for line in result.stdout.splitlines() if line.startswith("RESULT")), None)
+        if line is None:
+            tail = "\n".join(result.stderr.strip().splitlines()[-3:])
+            raise RuntimeError(f"importing {module} from {tree} failed:\n{tail}")
+        _, elapsed, max_rss = line.split()
+        times.append(float(elapsed))
+        rss.append(int(max_rss))
+        # Modules imported directly by `module` are one level below it
+        for match in _IMPORTTIME.finditer(result.stderr):
+            if len(match.group(3)) == 3:
+                modules.setdefault(match.group(4), []).append(int(match.group(2)) / 1e6)
+    slowest = sorted(((statistics.median(v), name) for name, v in modules.items()), reverse=True)
+    return {"import_seconds": statistics.median(times), "rss_mb": statistics.median(rss) / 2 ** 20,
+            "slowest_imports": [(name, seconds) for seconds, name in slowest[:8]]}
+
+
+def checkout(revision):
+    tree = tempfile.mkdtemp()
+    archive = subprocess.run(["git", "archive", revision], cwd=ROOT, capture_output=True, check=True)
+    subprocess.run(["tar", "-x", "-C", tree], input=archive.stdout, check=True)
+    return tree
+
+
+def report(label, result):
+    print(f"{label}: import {result['import_seconds'] * 1000:.0f} ms, peak RSS {result['rss_mb']:.0f} MB")
+    for name, seconds in result["slowest_imports"]:
+        print(f"    {name:<28} {seconds * 1000:>7.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--baseline", help="git revision to compare against")
+    parser.add_argument("--module", default="app")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    results = {}
+    if args.baseline:
+        tree = checkout(args.baseline)
+        try:
+            results["baseline"] = measure(tree, args.module, args.runs)
+        finally:
+            shutil.rmtree(tree, ignore_errors=True)
+        report(f"baseline ({args.baseline})", results["baseline"])
+    results["current"] = measure(ROOT, args.module, args.runs)
+    report("current", results["current"])
+
+    if args.baseline:
+        before, after = results["baseline"], results["current"]
+        print(f"\nimport time {before['import_seconds'] * 1000:.0f} -> {after['import_seconds'] * 1000:.0f} ms "
+              f"({1 - after['import_seconds'] / before['import_seconds']:.0%} faster), "
+              f"RSS {before['rss_mb']:.0f} -> {after['rss_mb']:.0f} MB")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
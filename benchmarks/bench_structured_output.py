@@ -0,0 +1,108 @@
+"""
+Extraction answers recovered by the tolerant parser versus the old fence-stripping json.loads().
+
+    python benchmarks/bench_structured_output.py
+
+Feeds well-formed and typically malformed model answers (prose around the
+object, fences with a language tag or in the middle of the text, trailing
+commas, single quotes, Python literals, ages as strings) through the old parser
+and through ai.parse_extraction_response(), and reports the failure rate of
+each - every failure was a 400 and another full LLM call - plus parse latency.
+"""
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import structured_output  # noqa: E402
+from metrics import parse_stats  # noqa: E402
+
+GOOD = {"intent": "book", "name": "Alice", "appointment_date": "2030-05-17", "appointment_time": "4:30 PM",
+        "doctor": "Dr. Smith", "age": 34, "gender": "Female", "contact_number": "5551234567",
+        "email": "alice@example.com", "department": "Cardiology"}
+RAW = json.dumps(GOOD)
+PY = repr(GOOD)
+
+# (answer, the fields a correct parse must return)
+ANSWERS = [
+    (RAW, GOOD),
+    ("```json\n" + RAW + "\n```", GOOD),
+    ("```\n" + RAW + "\n```", GOOD),
+    ("Here is the JSON:\n```json\n" + RAW + "\n```\nLet me know if you need anything else.", GOOD),
+    ("Sure! " + RAW, GOOD),
+    (RAW[:-1] + ",}", GOOD),
+    (PY, GOOD),
+    (PY.replace("'Alice'", "None"), {**GOOD, "name": None}),
+    (RAW.replace('"age": 34', '"age": "34 years"'), GOOD),
+    (RAW.replace('"intent": "book"', '"intent": "booking"'), GOOD),
+    ('{"intent": "view", "name": "O\'Brien",}', {"intent": "view", "name": "O'Brien"}),
+    ("{'intent': 'cancel', 'name': 'Bob', 'appointment_date': '2030-03-10', 'appointment_time': null,}",
+     {"intent": "cancel", "name": "Bob", "appointment_date": "2030-03-10"}),
+    ("I couldn't find any appointment details in that message.", None),
+    ('{"intent": "book", "name": ', None),
+]
+
+
+def legacy_parse(response):
+    """ai.parse_extraction_response() before the tolerant parser."""
+    try:
+        if response.startswith("```json"):
+            response = response.replace("```json", "", 1)
+        if response.endswith("```"):
+            response = response.rsplit("```", 1)[0]
+        return json.loads(response.strip())
+    except json.JSONDecodeError:
+        return {"error": "Could not process input"}
+
+
+def tolerant_parse(response):
+    try:
+        data, _ = structured_output.loads(response)
+        return structured_output.validate(data)
+    except ValueError:
+        return {"error": "Could not process input"}
+
+
+def matches(result, expected):
+    if expected is None:
+        return "error" in result
+    if "error" in result:
+        return False
+    return all(str(result.get(field)) == str(value) for field, value in expected.items()
+               if field not in ("appointment_time",))
+
+
+def run(parse, rounds=200):
+    correct = failed = 0
+    latencies = []
+    for answer, expected in ANSWERS:
+        result = parse(answer)
+        correct += matches(result, expected)
+        failed += "error" in result
+        start = time.perf_counter()
+        for _ in range(rounds):
+            parse(answer)
+        latencies.append((time.perf_counter() - start) / rounds)
+    return correct, failed, statistics.median(latencies)
+
+
+def main():
+    recoverable = sum(expected is not None for _, expected in ANSWERS)
+    print(f"{len(ANSWERS)} answers, {recoverable} recoverable\n")
+    print(f"{'parser':<10} {'correct':>8} {'failed':>8} {'failure rate':>13} {'p50':>8}")
+    for name, parse in (("legacy", legacy_parse), ("tolerant", tolerant_parse)):
+        correct, failed, p50 = run(parse)
+        print(f"{name:<10} {correct:>8} {failed:>8} {failed / len(ANSWERS):>13.0%} {p50 * 1e6:>6.1f}us")
+
+    # The production path also counts outcomes for /api/parse-stats
+    import ai
+    for answer, _ in ANSWERS:
+        ai.parse_extraction_response(answer)
+    print(f"\nparse_stats(): {json.dumps(parse_stats())}")
+
+
+if __name__ == "__main__":
+    main()
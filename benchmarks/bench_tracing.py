@@ -0,0 +1,205 @@
+"""
+Overhead of the tracing spans (tracing.py) and the sampling profiler (profiler.py).
+
+    python benchmarks/bench_tracing.py
+    python benchmarks/bench_tracing.py --repeats 7 --requests 500
+
+Three measurements:
+  - the cost of one span (a no-op function with and without @traced) and of
+    the per-request bookkeeping (trace id, request histogram, Server-Timing)
+  - the profiler's own time per sample, with --profile-threads threads
+  - the spans each kind of request records, which with those costs gives the
+    expected overhead per request
+  - the time per request in fresh processes with TRACING=false, with the
+    default TRACING=true, and with TRACING=true plus PROFILER=true, --repeats
+    times each, alternating; the best run of each is compared
+
+Requests are sent one at a time through the Flask test client against the
+fake model with no latency and a scratch copy of the database, so the times
+are the CPU the app spends per request, where instrumentation overhead is at
+its largest in relative terms; waits on the model or on locks only make it
+smaller. On a busy or single-core machine the measured times vary by more
+than the overhead, which is why the expected figure is printed next to them.
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+CONFIGS = {
+    "off": {"TRACING": "false", "PROFILER": "false"},
+    "tracing": {"TRACING": "true", "PROFILER": "false"},
+    "tracing+profiler": {"TRACING": "true", "PROFILER": "true"},
+}
+
+# name -> (method, path, JSON body); {i} is the request number
+REQUESTS = {
+    "list_appointments": ("GET", "/api/appointments?limit=20", None),
+    "book_appointment": ("POST", "/api/book-appointment", {
+        "name": "Bench Patient {i}", "age": 40, "gender": "Female", "contact_number": "5550100100",
+        "email": "bench{i}@example.com", "medical_history": "Cardiology", "appointment_date": "day {i}",
+        "appointment_time": "10:00"}),
+    "chat_medical": ("POST", "/ai-response", {"message": "What are the symptoms of flu number {i}?"}),
+    "chat_booking_turn": ("POST", "/ai-response", {"message": "Book an appointment for Jia Chen tomorrow at 10am",
+                                                   "session_id": "bench-{i}"}),
+}
+
+_CHILD = """
+import datetime, json, os, sys, time
+sys.path.insert(0, {root!r})
+import app
+import metrics
+client = app.app.test_client()
+requests = {requests!r}
+
+def body(template, i):
+    if template is None:
+        return None
+    values = {{key: value.format(i=i) if isinstance(value, str) else value for key, value in template.items()}}
+    if values.get("appointment_date", "").startswith("day "):
+        # Every booking gets its own day, so none of them collide
+        values["appointment_date"] = (datetime.date(2031, 1, 1) + datetime.timedelta(days=i + 20)).isoformat()
+    return values
+
+def spans_recorded():
+    return sum(values["count"] for (metric, _), values in metrics.histograms().items()
+               if metric == "span_duration_seconds")
+
+results = {{}}
+for name, (method, path, template) in requests.items():
+    # Warm up, then time {count} requests
+    for i in range(20):
+        client.open(path, method=method, json=body(template, -1 - i))
+    spans = spans_recorded()
+    start = time.perf_counter()
+    for i in range({count}):
+        response = client.open(path, method=method, json=body(template, i))
+        assert response.status_code < 400, (name, response.status_code, response.get_data(as_text=True))
+    results[name] = {{"seconds": (time.perf_counter() - start) / {count},
+                     "spans": (spans_recorded() - spans) / {count}}}
+print("RESULT", json.dumps(results))
+"""
+
+
+def span_cost(calls):
+    """Nanoseconds added by one @traced call, measured inside a request trace."""
+    import tracing
+
+    def plain():
+        return None
+
+    traced = tracing.traced("bench")(plain)
+    tracing.start_trace()
+    best = {}
+    for name, fn in (("plain", plain), ("traced", traced)):
+        samples = []
+        for _ in range(5):
+            start = time.perf_counter()
+            for _ in range(calls):
+                fn()
+            samples.append((time.perf_counter() - start) / calls)
+        best[name] = min(samples)
+    tracing.end_trace("bench")
+    return (best["traced"] - best["plain"]) * 1e9
+
+
+def request_cost(calls):
+    """Nanoseconds of per-request bookkeeping: trace start and end, request histogram, headers."""
+    import metrics
+    import tracing
+    start = time.perf_counter()
+    for _ in range(calls):
+        trace = tracing.start_trace(None)
+        trace.spans.append(("db.query_appointments", 0.0, 0.001))
+        tracing.end_trace("/bench")
+        metrics.record_http_request("/bench", "GET", 200, trace.elapsed())
+        trace.server_timing()
+    return (time.perf_counter() - start) / calls * 1e9
+
+
+def profiler_cost(threads, depth, seconds=2.0):
+    """Profiler stats after sampling `threads` threads `depth` frames deep for `seconds`."""
+    import threading
+    from profiler import SamplingProfiler
+    stop = threading.Event()
+
+    def nest(level):
+        if level:
+            return nest(level - 1)
+        stop.wait()
+
+    workers = [threading.Thread(target=nest, args=(depth,), daemon=True) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    profiler = SamplingProfiler().start()
+    time.sleep(seconds)
+    profiler.stop()
+    stop.set()
+    return profiler.stats()
+
+
+def serve_requests(config, count):
+    scratch = tempfile.mkdtemp()
+    try:
+        shutil.copy(os.path.join(ROOT, "hospital_db.sqlite3"), scratch)
+        env = dict(os.environ, **CONFIGS[config], HOSPITAL_DB_FILE=os.path.join(scratch, "hospital_db.sqlite3"),
+                   LLM_PROVIDER="fake", FAKE_LLM_LATENCY="0", FAKE_LLM_TOKENS_PER_SECOND="0",
+                   MEDICAL_CACHE_ENABLED="false", SEMANTIC_CACHE_ENABLED="false", SESSION_STORE="memory",
+                   LLM_WARMUP="false", TRACE_SLOW_REQUEST_SECONDS="0")
+        result = subprocess.run([sys.executable, "-c", _CHILD.format(root=ROOT, requests=REQUESTS, count=count)],
+                                cwd=scratch, env=env, capture_output=True, text=True)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+    line = next((line for line in result.stdout.splitlines() if line.startswith("RESULT ")), None)
+    if line is None:
+        raise RuntimeError(f"{config} run failed:\n" + "\n".join(result.stderr.strip().splitlines()[-5:]))
+    return json.loads(line[len("RESULT "):])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=300, help="requests of each kind per run")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--span-calls", type=int, default=200000)
+    parser.add_argument("--profile-threads", type=int, default=16, help="threads for the profiler cost")
+    args = parser.parse_args()
+
+    per_span = span_cost(args.span_calls)
+    per_request = request_cost(args.span_calls // 10)
+    print(f"one span: {per_span:.0f} ns, per-request bookkeeping: {per_request:.0f} ns")
+    stats = profiler_cost(args.profile_threads, 40)
+    print(f"profiler: {stats['sample_cost_us']:.0f} us per sample of {args.profile_threads} threads 40 frames deep, "
+          f"every {stats['interval_ms']:.0f} ms = {stats['overhead']:.1%} of a core")
+
+    runs = {config: {name: [] for name in REQUESTS} for config in CONFIGS}
+    spans = {}
+    for repeat in range(args.repeats):
+        for config in CONFIGS:
+            for name, result in serve_requests(config, args.requests).items():
+                runs[config][name].append(result["seconds"])
+                if config == "tracing":
+                    spans[name] = result["spans"]
+        print(f"  repeat {repeat + 1}/{args.repeats} done")
+
+    print(f"\nbest time per request over {args.repeats} runs of {args.requests}")
+    print(f"{'request':<20} {'spans':>6} {'expected':>9} " + " ".join(f"{config:>20}" for config in CONFIGS))
+    for name in REQUESTS:
+        base = min(runs["off"][name])
+        expected = (spans[name] * per_span + per_request) / 1e9 / base
+        cells = []
+        for config in CONFIGS:
+            value = min(runs[config][name])
+            change = "" if config == "off" else f" ({(value - base) / base:+.1%})"
+            cells.append(f"{value * 1e6:>7.0f} us{change:<10}")
+        print(f"{name:<20} {spans[name]:>6.1f} {expected:>+9.1%} " + " ".join(f"{cell:>20}" for cell in cells))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,427 @@
+"""
+End-to-end load test: replays conversation traces against the app's endpoints.
+
+    python benchmarks/load_test.py
+    python benchmarks/load_test.py --users 16 --iterations 10 --llm-latency 0.5
+    python benchmarks/load_test.py --scenarios medical chat_booking --compare benchmarks/results/<old>.json
+    python benchmarks/load_test.py --url http://127.0.0.1:5000     # a running server
+
+Each scenario is a trace of requests one user makes (see SCENARIOS):
+  medical              medical question to /ai-response
+  chat_booking         booking request, then answering each follow-up question
+  chat_reschedule      book through the API, then reschedule by chat, giving the old slot when asked
+  chat_cancel          book through the API, then cancel by chat
+  api_booking          /api/book-appointment, /api/reschedule-appointment, /api/cancel-appointment
+  list_appointments    /api/appointments: latest page, a filtered page, the full listing
+
+--users threads replay each scenario --iterations times, one scenario after
+another. In-process runs use a scratch copy of the database seeded with
+--seed-appointments bookings, the fake LLM backend (LLM_PROVIDER=fake, see
+fake_llm.py) with --llm-latency seconds per call, and no answer caches. Every
+booking gets its own slot, so runs are repeatable for a given --seed.
+
+Reported per scenario: runs and requests per second, p50/p95/p99 latency per
+request and per run, errors, and LLM calls and SQL statements per run (from
+the X-LLM-Calls and X-DB-Queries headers). Results are written as JSON
+(default benchmarks/results/load_test-<commit>.json); --compare prints the
+change against an earlier results file.
+"""
+import argparse
+import datetime
+import itertools
+import json
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+DEPARTMENTS = ["Cardiology", "Dermatology", "Gynecology", "Neurology", "Oncology",
+               "Orthopedics", "Pediatrics", "Psychiatry", "Radiology", "Urology"]
+FIRST_NAMES = ["Alice", "Bruno", "Chen", "Dana", "Emeka", "Farah", "Goran", "Hana", "Ivan", "Jia"]
+QUESTIONS = [
+    "What are the symptoms of {}?",
+    "How is {} usually treated?",
+    "What causes {} and how can I prevent it?",
+    "Is {} contagious?",
+]
+CONDITIONS = ["flu", "migraine", "asthma", "diabetes", "anemia", "bronchitis", "eczema", "arthritis",
+              "sinusitis", "gout", "psoriasis", "tonsillitis"]
+
+# Slots handed out to bookings start this many days ahead, clear of seeded data
+SLOT_START_DAYS = 400
+SLOT_TIMES = [f"{9 + i // 2:02d}:{(i % 2) * 30:02d}" for i in range(16)]  # 09:00 .. 16:30
+
+_department_counter = itertools.count()
+_slot_counters = {department: itertools.count() for department in DEPARTMENTS}
+_run_counter = itertools.count()
+_slot_lock = threading.Lock()
+
+
+def next_slot(department=None):
+    """
+    (department, date, time) no other booking of the department uses in this
+    run, so any of its doctors is free; the department rotates unless given.
+    """
+    with _slot_lock:
+        department = department or DEPARTMENTS[next(_department_counter) % len(DEPARTMENTS)]
+        day, index = divmod(next(_slot_counters[department]), len(SLOT_TIMES))
+    date = datetime.date.today() + datetime.timedelta(days=SLOT_START_DAYS + day)
+    return department, date.isoformat(), SLOT_TIMES[index]
+
+
+def _letters(n):
+    word = ""
+    while True:
+        n, rest = divmod(n, 26)
+        word = chr(ord("a") + rest) + word
+        if not n:
+            return word
+        n -= 1
+
+
+def patient(k, rng):
+    """A patient with a unique name (the app looks patients up by name)."""
+    first = FIRST_NAMES[k % len(FIRST_NAMES)]
+    return {
+        "name": f"{first} Q{_letters(k)}",
+        "age": str(rng.randint(18, 90)),
+        "gender": rng.choice(["Male", "Female"]),
+        "contact_number": f"555{rng.randint(1000000, 9999999)}",
+        "email": f"{first.lower()}.{_letters(k)}@example.com",
+    }
+
+
+class Response:
+    def __init__(self, status, body, headers):
+        self.status = status
+        self.body = body
+        self.headers = headers
+
+    def json(self):
+        try:
+            return json.loads(self.body or b"null")
+        except ValueError:
+            return None
+
+
+class InProcessClient:
+    """Requests through the Flask app in this process, one test client per thread."""
+
+    def __init__(self, app):
+        self.app = app
+        self._local = threading.local()
+
+    def request(self, method, path, payload=None):
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        response = client.open(path, method=method, json=payload)
+        return Response(response.status_code, response.get_data(), response.headers)
+
+
+class HttpClient:
+    """Requests to a running server."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip("/")
+
+    def request(self, method, path, payload=None):
+        data = json.dumps(payload).encode() if payload is not None else None
+        request = urllib.request.Request(self.base_url + path, data=data, method=method,
+                                         headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(request, timeout=120) as response:
+                return Response(response.status, response.read(), response.headers)
+        except urllib.error.HTTPError as e:
+            return Response(e.code, e.read(), e.headers)
+
+
+class ScenarioError(Exception):
+    pass
+
+
+class Run:
+    """One replay of a scenario: the requests made and what they cost."""
+
+    def __init__(self, client):
+        self.client = client
+        self.latencies = []
+        self.llm_calls = 0
+        self.db_queries = 0
+
+    def call(self, method, path, payload=None, expect_status=200, expect_key=None):
+        start = time.perf_counter()
+        response = self.client.request(method, path, payload)
+        self.latencies.append(time.perf_counter() - start)
+        self.llm_calls += int(response.headers.get("X-LLM-Calls") or 0)
+        self.db_queries += int(response.headers.get("X-DB-Queries") or 0)
+        body = response.json()
+        if response.status != expect_status:
+            raise ScenarioError(f"{method} {path}: HTTP {response.status} {str(body)[:120]}")
+        if expect_key and not (isinstance(body, dict) and expect_key in body):
+            raise ScenarioError(f"{method} {path}: no {expect_key!r} in {str(body)[:120]}")
+        return body
+
+    def chat(self, session_id, message, answers, max_turns=12):
+        """Send `message`, then answer each follow-up question from `answers` until the action runs."""
+        body = self.call("POST", "/ai-response", {"message": message, "session_id": session_id})
+        for _ in range(max_turns):
+            if not body.get("missing_fields"):
+                break
+            field = body["missing_fields"][0]
+            if field not in answers:
+                raise ScenarioError(f"asked for {field!r}, which the trace has no answer for")
+            body = self.call("POST", "/ai-response", {"message": answers[field], "session_id": session_id})
+        if "message" not in body:
+            raise ScenarioError(f"conversation didn't finish: {str(body)[:120]}")
+        return body
+
+
+def book_through_api(run, person):
+    department, date, time_ = next_slot()
+    run.call("POST", "/api/book-appointment", {
+        **person, "medical_history": department, "appointment_date": date, "appointment_time": time_,
+    }, expect_key="appointment_id")
+    return department, date, time_
+
+
+def scenario_medical(run, k, rng):
+    question = QUESTIONS[k % len(QUESTIONS)].format(CONDITIONS[(k // len(QUESTIONS)) % len(CONDITIONS)])
+    run.call("POST", "/ai-response", {"message": question, "session_id": f"load-{k}"}, expect_key="message")
+
+
+def scenario_chat_booking(run, k, rng):
+    department, date, time_ = next_slot()
+    person = patient(k, rng)
+    answers = {**person, "department": department, "appointment_date": date, "appointment_time": time_}
+    message = rng.choice([
+        "Book an appointment for {name} on {date} at {time}",
+        "I need an appointment for {name} on {date} at {time} please",
+    ]).format(name=person["name"], date=date, time=time_)
+    run.chat(f"load-{k}", message, answers)
+
+
+def scenario_chat_reschedule(run, k, rng):
+    person = patient(k, rng)
+    department, old_date, old_time = book_through_api(run, person)
+    _, new_date, new_time = next_slot(department)
+    message = f"Reschedule the appointment for {person['name']} to {new_date} at {new_time}"
+    run.chat(f"load-{k}", message, {"old_date": old_date, "old_time": old_time,
+                                     "new_date": new_date, "new_time": new_time, "name": person["name"]})
+
+
+def scenario_chat_cancel(run, k, rng):
+    person = patient(k, rng)
+    _, date, time_ = book_through_api(run, person)
+    message = f"Cancel the appointment for {person['name']} on {date} at {time_}"
+    run.chat(f"load-{k}", message, {"name": person["name"], "appointment_date": date, "appointment_time": time_})
+
+
+def scenario_api_booking(run, k, rng):
+    person = patient(k, rng)
+    department, date, time_ = book_through_api(run, person)
+    _, new_date, new_time = next_slot(department)
+    run.call("POST", "/api/reschedule-appointment", {
+        "name": person["name"], "old_date": date, "old_time": time_, "new_date": new_date, "new_time": new_time,
+    }, expect_key="message")
+    run.call("POST", "/api/cancel-appointment", {"name": person["name"], "date": new_date, "time": new_time},
+             expect_key="message")
+
+
+def scenario_list_appointments(run, k, rng):
+    run.call("GET", "/api/appointments?limit=50&order=desc", expect_key="appointments")
+    run.call("GET", f"/api/appointments?department={DEPARTMENTS[k % len(DEPARTMENTS)]}&limit=100",
+             expect_key="appointments")
+    run.call("GET", "/api/appointments")
+
+
+SCENARIOS = {
+    "medical": scenario_medical,
+    "chat_booking": scenario_chat_booking,
+    "chat_reschedule": scenario_chat_reschedule,
+    "chat_cancel": scenario_chat_cancel,
+    "api_booking": scenario_api_booking,
+    "list_appointments": scenario_list_appointments,
+}
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))] if values else 0.0
+
+
+def run_scenario(name, client, users, iterations, seed):
+    scenario = SCENARIOS[name]
+    runs, errors = [], []
+    lock = threading.Lock()
+
+    def user(u):
+        rng = random.Random(f"{seed}-{name}-{u}")
+        for _ in range(iterations):
+            # Unique across scenarios, so patient names and session ids never repeat
+            with _slot_lock:
+                k = next(_run_counter)
+            run = Run(client)
+            start = time.perf_counter()
+            try:
+                scenario(run, k, rng)
+                error = None
+            except ScenarioError as e:
+                error = str(e)
+            with lock:
+                runs.append((run, time.perf_counter() - start))
+                if error:
+                    errors.append(error)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(users) as pool:
+        list(pool.map(user, range(users)))
+    elapsed = time.perf_counter() - start
+
+    requests = [latency for run, _ in runs for latency in run.latencies]
+    durations = [duration for _, duration in runs]
+    ms = lambda seconds: round(seconds * 1000, 2)  # noqa: E731
+    return {
+        "runs": len(runs),
+        "requests": len(requests),
+        "errors": len(errors),
+        "error_samples": errors[:5],
+        "elapsed_seconds": round(elapsed, 3),
+        "runs_per_second": round(len(runs) / elapsed, 2),
+        "requests_per_second": round(len(requests) / elapsed, 2),
+        "request_latency_ms": {"p50": ms(percentile(requests, 0.5)), "p95": ms(percentile(requests, 0.95)),
+                               "p99": ms(percentile(requests, 0.99)), "max": ms(max(requests, default=0))},
+        "run_latency_ms": {"p50": ms(percentile(durations, 0.5)), "p95": ms(percentile(durations, 0.95)),
+                           "p99": ms(percentile(durations, 0.99))},
+        "llm_calls_per_run": round(statistics.mean(run.llm_calls for run, _ in runs), 2) if runs else 0,
+        "db_queries_per_run": round(statistics.mean(run.db_queries for run, _ in runs), 2) if runs else 0,
+    }
+
+
+def seed_database(count, seed):
+    """Book `count` appointments over the next 60 days; returns how many got a slot."""
+    from database import book_appointment
+    rng = random.Random(seed)
+    booked = 0
+    for k in range(count):
+        date = (datetime.date.today() + datetime.timedelta(days=rng.randint(1, 60))).isoformat()
+        result = book_appointment(f"Seed Patient {k}", rng.randint(18, 90), rng.choice(["Male", "Female"]),
+                                  f"555{rng.randint(1000000, 9999999)}", f"seed{k}@example.com",
+                                  rng.choice(DEPARTMENTS), date, rng.choice(SLOT_TIMES))
+        booked += "error" not in result
+    return booked
+
+
+def in_process_client(args):
+    scratch = tempfile.mkdtemp()
+    shutil.copy(os.path.join(ROOT, "hospital_db.sqlite3"), scratch)
+    os.chdir(scratch)
+    os.environ.update({
+        "HOSPITAL_DB_FILE": os.path.join(scratch, "hospital_db.sqlite3"),
+        "LLM_PROVIDER": "fake",
+        "FAKE_LLM_LATENCY": str(args.llm_latency),
+        "FAKE_LLM_SEED": str(args.seed),
+        "FAKE_LLM_TOKENS_PER_SECOND": "0",
+        "MEDICAL_CACHE_ENABLED": "false",
+        "SEMANTIC_CACHE_ENABLED": "false",
+        "SESSION_STORE": "memory",
+        "LLM_WARMUP": "false",
+    })
+    import app as flask_app
+    booked = seed_database(args.seed_appointments, args.seed)
+    print(f"Seeded {booked} of {args.seed_appointments} appointments in {scratch}")
+    return InProcessClient(flask_app.app), scratch
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\nchange against {baseline_path} (commit {baseline.get('commit')}):")
+    print(f"{'scenario':<20} {'runs/s':>16} {'p50 ms':>18} {'p95 ms':>18}")
+    for name, now in results["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if not before:
+            continue
+        cells = []
+        for old, new in ((before["runs_per_second"], now["runs_per_second"]),
+                         (before["request_latency_ms"]["p50"], now["request_latency_ms"]["p50"]),
+                         (before["request_latency_ms"]["p95"], now["request_latency_ms"]["p95"])):
+            change = f"{(new - old) / old:+.0%}" if old else "n/a"
+            cells.append(f"{old:>7.1f}->{new:<7.1f}{change:>5}")
+        print(f"{name:<20} " + " ".join(cells))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--users", type=int, default=8, help="concurrent simulated users")
+    parser.add_argument("--iterations", type=int, default=5, help="scenario runs per user")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="seconds per fake LLM call")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--seed-appointments", type=int, default=1000)
+    parser.add_argument("--url", help="test a running server instead of the app in this process")
+    parser.add_argument("--output", help="results file (default benchmarks/results/load_test-<commit>.json)")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    args = parser.parse_args()
+
+    # Paths are resolved before an in-process run moves to its scratch directory
+    args.output = os.path.abspath(args.output) if args.output else None
+    args.compare = os.path.abspath(args.compare) if args.compare else None
+    scratch = None
+    if args.url:
+        client = HttpClient(args.url)
+    else:
+        client, scratch = in_process_client(args)
+
+    results = {
+        "commit": git_commit(),
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "config": {"users": args.users, "iterations": args.iterations, "llm_latency": args.llm_latency,
+                   "seed": args.seed, "seed_appointments": args.seed_appointments, "url": args.url},
+        "scenarios": {},
+    }
+    print(f"\n{args.users} users x {args.iterations} runs, fake LLM latency {args.llm_latency * 1000:.0f}ms\n")
+    print(f"{'scenario':<20} {'runs/s':>8} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} "
+          f"{'errors':>7} {'llm/run':>8} {'sql/run':>8}")
+    for name in args.scenarios:
+        stats = run_scenario(name, client, args.users, args.iterations, args.seed)
+        results["scenarios"][name] = stats
+        latency = stats["request_latency_ms"]
+        print(f"{name:<20} {stats['runs_per_second']:>8.1f} {stats['requests_per_second']:>8.1f} "
+              f"{latency['p50']:>6.0f}ms {latency['p95']:>6.0f}ms {latency['p99']:>6.0f}ms "
+              f"{stats['errors']:>7} {stats['llm_calls_per_run']:>8.1f} {stats['db_queries_per_run']:>8.1f}")
+        for sample in stats["error_samples"]:
+            print(f"    {sample}")
+
+    output = args.output or os.path.join(ROOT, "benchmarks", "results", f"load_test-{results['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {output}")
+    if args.compare:
+        compare(results, args.compare)
+    if scratch:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
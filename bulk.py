@@ -0,0 +1,133 @@
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import time
+
+from database import APPOINTMENT_FIELDS, BULK_BATCH_SIZE, import_appointments, init_db, iter_appointment_rows
+
+# Bulk appointment import and export as CSV or JSONL (one JSON object per
+# line), with the APPOINTMENT_FIELDS of /api/appointments as columns, so an
+# export can be imported again as is. Both directions stream: the input is
+# read and written BULK_BATCH_SIZE rows at a time and the output is produced
+# as the rows are read, so memory doesn't grow with the file.
+#
+#     python bulk.py import history.csv
+#     python bulk.py export appointments.jsonl --date-from 2024-01-01
+#     curl --data-binary @history.csv -H 'Content-Type: text/csv' localhost:5000/api/appointments/import
+#     curl 'localhost:5000/api/appointments/export?format=jsonl&department=Cardiology' > cardiology.jsonl
+
+FORMATS = ("csv", "jsonl")
+MEDIA_TYPES = {"csv": "text/csv", "jsonl": "application/x-ndjson"}
+_FORMAT_NAMES = {
+    ".csv": "csv", ".jsonl": "jsonl", ".ndjson": "jsonl",
+    "text/csv": "csv", "application/x-ndjson": "jsonl", "application/jsonl": "jsonl",
+    "application/x-jsonlines": "jsonl", "application/json": "jsonl",
+}
+
+
+def detect_format(path=None, content_type=None):
+    """"csv" or "jsonl" from a file name or a Content-Type; None when neither tells."""
+    if path:
+        fmt = _FORMAT_NAMES.get(os.path.splitext(path)[1].lower())
+        if fmt:
+            return fmt
+    if content_type:
+        return _FORMAT_NAMES.get(content_type.split(";")[0].strip().lower())
+    return None
+
+
+def read_records(stream, fmt):
+    """(line number, record) for each row of a CSV or JSONL text stream, read lazily."""
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record
+        return
+    for line_number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            record = None  # reported as an invalid row
+        yield line_number, record
+
+
+def import_stream(binary_stream, fmt, batch_size=BULK_BATCH_SIZE, progress=None):
+    """Import the CSV or JSONL in `binary_stream`; see database.import_appointments()."""
+    # utf-8-sig: spreadsheet programs start their CSV files with a byte order mark
+    text = io.TextIOWrapper(binary_stream, encoding="utf-8-sig", newline="")
+    return import_appointments(read_records(text, fmt), batch_size=batch_size, progress=progress)
+
+
+def export_chunks(fmt, batch_size=BULK_BATCH_SIZE, **filters):
+    """The appointments matching `filters` as CSV or JSONL text, one chunk per batch of rows."""
+    batches = iter_appointment_rows(batch_size=batch_size, **filters)
+    if fmt == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator="\n")
+        writer.writerow(APPOINTMENT_FIELDS)
+        for rows in batches:
+            writer.writerows(rows)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()  # the header of an empty export
+        return
+    for rows in batches:
+        yield "".join(json.dumps(dict(zip(APPOINTMENT_FIELDS, row))) + "\n" for row in rows)
+
+
+def _print_progress(started):
+    def progress(summary):
+        elapsed = time.perf_counter() - started
+        print(f"  {summary['rows']} rows read, {summary['imported']} imported "
+              f"({summary['rows'] / elapsed:,.0f} rows/s)", file=sys.stderr)
+    return progress
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk appointment import and export")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = commands.add_parser("import", help="import appointments from a CSV or JSONL file")
+    import_parser.add_argument("file", help="file to read, - for standard input")
+    import_parser.add_argument("--format", choices=FORMATS, help="default: from the file extension, else csv")
+    import_parser.add_argument("--batch-size", type=int, default=BULK_BATCH_SIZE, help="rows per transaction")
+
+    export_parser = commands.add_parser("export", help="export appointments to a CSV or JSONL file")
+    export_parser.add_argument("file", nargs="?", default="-", help="file to write, - (default) for standard output")
+    export_parser.add_argument("--format", choices=FORMATS, help="default: from the file extension, else csv")
+    for name in ("date-from", "date-to", "doctor-id", "department", "status"):
+        export_parser.add_argument(f"--{name}")
+    args = parser.parse_args()
+
+    fmt = args.format or detect_format(args.file) or "csv"
+    init_db()
+    if args.command == "import":
+        started = time.perf_counter()
+        if args.file == "-":
+            summary = import_stream(sys.stdin.buffer, fmt, args.batch_size, _print_progress(started))
+        else:
+            with open(args.file, "rb") as f:
+                summary = import_stream(f, fmt, args.batch_size, _print_progress(started))
+        print(json.dumps(summary, indent=2))
+        return
+
+    filters = {"date_from": args.date_from, "date_to": args.date_to, "doctor_id": args.doctor_id,
+               "department": args.department, "status": args.status}
+    out = sys.stdout if args.file == "-" else open(args.file, "w", encoding="utf-8", newline="")
+    try:
+        for chunk in export_chunks(fmt, **filters):
+            out.write(chunk)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+import queue
+import threading
+from collections import deque
+
+# In-process publish/subscribe channel for appointment changes. database.py
+# publishes after every committed booking, reschedule or cancellation and each
+# Server-Sent Events connection in app.py holds one subscription.
+
+
+class Subscription:
+    def __init__(self, maxsize):
+        self.queue = queue.Queue(maxsize=maxsize)
+        # Set when events had to be dropped because the consumer fell behind;
+        # the consumer should then reload its view instead of applying deltas
+        self.overflowed = False
+
+    def get(self, timeout=None):
+        """Next event, or raises queue.Empty after `timeout` seconds."""
+        return self.queue.get(timeout=timeout)
+
+
+class ChangeBus:
+    def __init__(self, subscriber_queue_size=256, remember=1024):
+        self.subscriber_queue_size = subscriber_queue_size
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._recent_versions = deque(maxlen=remember)
+        self.published = 0
+
+    def subscribe(self, queue_size=None):
+        subscription = Subscription(queue_size or self.subscriber_queue_size)
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def has_subscribers(self):
+        return bool(self._subscribers)
+
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    def publish(self, event, version=None):
+        """
+        Deliver `event` to every subscriber without blocking the publisher.
+        `version` is the change token of the write, used by was_published().
+        """
+        with self._lock:
+            if version is not None:
+                self._recent_versions.append(version)
+            subscribers = list(self._subscribers)
+            self.published += 1
+        for subscription in subscribers:
+            try:
+                subscription.queue.put_nowait(event)
+            except queue.Full:
+                subscription.overflowed = True
+
+    def was_published(self, version):
+        with self._lock:
+            return version in self._recent_versions
+
+
+bus = ChangeBus()
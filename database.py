@@ -1,115 +1,346 @@
+import datetime
+import os
+import queue
+import re
 import sqlite3
+import threading
+import time
 import uuid
+from contextlib import contextmanager
 
-DB_FILE = "hospital_db.sqlite3"
+from migrations import apply_migrations
+from change_bus import bus as change_bus
+from datetime_normalizer import parse_date, parse_time
+from metrics import record_db_query
+from schedule import Schedules, SCHEDULE_RESOLUTION_MINUTES, format_minutes, minute_of_day
+from tracing import span, traced
+
+DB_FILE = os.getenv("HOSPITAL_DB_FILE", "hospital_db.sqlite3")
+
+# Connection pool settings
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "8"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))  # seconds to wait for a free connection
+DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+
+def _trace_statement(statement):
+    record_db_query()
+
+class ConnectionPool:
+    """
+    Fixed-size pool of SQLite connections shared by all request threads.
+
+    Connections are opened lazily up to `size`, run in WAL mode with
+    synchronous=NORMAL and a busy timeout, and are handed out through
+    connection(). Checkout counts and wait times are kept for stats().
+    """
+
+    def __init__(self, path, size=DB_POOL_SIZE, timeout=DB_POOL_TIMEOUT, busy_timeout_ms=DB_BUSY_TIMEOUT_MS):
+        self.path = path
+        self.size = size
+        self.timeout = timeout
+        self.busy_timeout_ms = busy_timeout_ms
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._opened = 0
+        self._in_use = 0
+        self._checkouts = 0
+        self._timeouts = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    @traced("db.connect")
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout_ms / 1000, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        # Per-request statement counts (X-DB-Queries)
+        conn.set_trace_callback(_trace_statement)
+        return conn
+
+    def _checkout(self):
+        start = time.perf_counter()
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = None
+            with self._lock:
+                if self._opened < self.size:
+                    self._opened += 1
+                    open_new = True
+                else:
+                    open_new = False
+            if open_new:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._lock:
+                        self._opened -= 1
+                    raise
+            else:
+                try:
+                    conn = self._idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    with self._lock:
+                        self._timeouts += 1
+                    raise TimeoutError(f"No database connection available after {self.timeout}s")
+
+        waited = time.perf_counter() - start
+        with self._lock:
+            self._in_use += 1
+            self._checkouts += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+        return conn
+
+    def _release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        with self._lock:
+            self._in_use -= 1
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        """
+        Check out a connection for the duration of the block. The transaction is
+        committed when the block exits normally and rolled back on an exception.
+        """
+        with span("db.checkout"):
+            conn = self._checkout()
+        try:
+            yield conn
+            if conn.in_transaction:
+                conn.commit()
+        except BaseException:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+        finally:
+            self._release(conn)
+
+    def close(self):
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._opened -= 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "pool_size": self.size,
+                "open_connections": self._opened,
+                "in_use": self._in_use,
+                "idle": self._idle.qsize(),
+                "checkouts": self._checkouts,
+                "checkout_timeouts": self._timeouts,
+                "checkout_wait_avg_ms": (self._wait_total / self._checkouts * 1000) if self._checkouts else 0.0,
+                "checkout_wait_max_ms": self._wait_max * 1000,
+            }
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """The process-wide pool for DB_FILE, created on first use."""
+    global _pool
+    if _pool is None or _pool.path != DB_FILE:
+        with _pool_lock:
+            if _pool is None or _pool.path != DB_FILE:
+                if _pool is not None:
+                    _pool.close()
+                _pool = ConnectionPool(DB_FILE)
+    return _pool
+
+def get_connection():
+    """Context manager yielding a pooled connection; see ConnectionPool.connection()."""
+    return get_pool().connection()
+
+def pool_stats():
+    return get_pool().stats()
 
 def init_db():
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    
-    # Create patients table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS Patients (
-            patient_id TEXT PRIMARY KEY,
-            name TEXT NOT NULL,
-            age INTEGER,
-            gender TEXT,
-            contact_number TEXT,
-            email TEXT,
-            medical_history TEXT
-        )
-    ''')
-    
-    # Create doctors table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS Doctors (
-            doctor_id TEXT PRIMARY KEY,
-            name TEXT NOT NULL,
-            specialization TEXT NOT NULL
-        )
-    ''')
-    
-    # Create appointments table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS Appointments (
-            appointment_id TEXT PRIMARY KEY,
-            patient_id TEXT NOT NULL,
-            doctor_id TEXT NOT NULL,
-            department TEXT NOT NULL,
-            date TEXT NOT NULL,
-            time TEXT NOT NULL,
-            status TEXT NOT NULL,
-            FOREIGN KEY (patient_id) REFERENCES Patients (patient_id),
-            FOREIGN KEY (doctor_id) REFERENCES Doctors (doctor_id)
+    """Create or upgrade the schema by applying any pending migrations."""
+    with get_connection() as conn:
+        applied = apply_migrations(conn)
+    if applied:
+        print(f"Applied database migrations: {applied}")
+
+# Doctors of a specialization with their number of active appointments that
+# day (day_load), and those appointments' start times and lengths. Whether a doctor is free
+# for a slot is decided against the schedules by _free_doctors().
+_DEPARTMENT_DOCTORS_SQL = """
+    SELECT d.rowid, d.doctor_id, d.name,
+           (SELECT COUNT(*) FROM Appointments l
+            WHERE l.doctor_id = d.doctor_id AND l.date = :date AND l.status != 'Cancelled') AS day_load
+    FROM Doctors d
+    WHERE d.specialization = :specialization
+    ORDER BY d.rowid
+"""
+_DEPARTMENT_DAY_BOOKINGS_SQL = """
+    SELECT a.doctor_id, a.time, a.slot_minutes FROM Doctors d
+    JOIN Appointments a ON a.doctor_id = d.doctor_id
+    WHERE d.specialization = :specialization AND a.date = :date AND a.status != 'Cancelled'
+"""
+
+def _free_doctors(schedules, doctors, date, slot_time, booked):
+    """
+    The `doctors` rows ((rowid, doctor_id, ...)) with a free slot starting at
+    `slot_time` on `date`: the slot is in their schedule and overlaps none of
+    their active appointments that day, `booked` {doctor_id: [(start time,
+    slot_minutes)]}. Appointments without a recorded length take their slot's
+    length, or DEFAULT_SLOT_MINUTES off the doctor's grid, as in the
+    availability index.
+    """
+    rows = [row for row in doctors if schedules.position(row[1]) is not None]
+    if not rows:
+        return []
+    bookings = [(i, minute, length or 0) for i, row in enumerate(rows) for time_text, length in booked.get(row[1], ())
+                for minute in [minute_of_day(time_text)] if minute is not None]
+    free = schedules.free_at([schedules.position(row[1]) for row in rows], datetime.date.fromisoformat(date),
+                             minute_of_day(slot_time), bookings)
+    return [row for row, is_free in zip(rows, free) if is_free]
+
+_round_robin_last = {}  # specialization -> rowid of the last doctor picked
+_round_robin_lock = threading.Lock()
+
+def _first_free(candidates, specialization):
+    return candidates[0]
+
+def _least_loaded(candidates, specialization):
+    return min(candidates, key=lambda candidate: candidate[3])
+
+def _round_robin(candidates, specialization):
+    with _round_robin_lock:
+        last = _round_robin_last.get(specialization, -1)
+        chosen = next((c for c in candidates if c[0] > last), candidates[0])
+        _round_robin_last[specialization] = chosen[0]
+    return chosen
+
+# Doctor allocation policies: name -> function(candidates, specialization) returning
+# one of the (rowid, doctor_id, name, day_load) candidate rows, which are in rowid order
+ALLOCATION_POLICIES = {
+    "first_free": _first_free,
+    "least_loaded": _least_loaded,
+    "round_robin": _round_robin,
+}
+DOCTOR_ALLOCATION_POLICY = os.getenv("DOCTOR_ALLOCATION_POLICY", "first_free")
+if DOCTOR_ALLOCATION_POLICY not in ALLOCATION_POLICIES:
+    # A typo here would otherwise fail every booking
+    print(f"Unknown DOCTOR_ALLOCATION_POLICY {DOCTOR_ALLOCATION_POLICY!r} (expected one of "
+          f"{', '.join(ALLOCATION_POLICIES)}); using first_free")
+    DOCTOR_ALLOCATION_POLICY = "first_free"
+
+# Doctor schedules (schedule.py), kept per process and reloaded when the
+# ScheduleVersion row, which triggers bump on every change, has moved. Readers
+# that can live with a slightly old copy check at most every SCHEDULE_CHECK_SECONDS.
+SCHEDULE_CHECK_SECONDS = float(os.getenv("SCHEDULE_CHECK_SECONDS", "1"))
+_schedules = {"value": None, "checked_at": 0.0}
+_schedules_lock = threading.Lock()
+
+def _current_schedules(cursor, cached):
+    version = cursor.execute("SELECT value FROM ScheduleVersion WHERE id = 1").fetchone()[0]
+    if cached is None or cached.version != version:
+        cached = Schedules(
+            cursor.execute("SELECT doctor_id, name, specialization FROM Doctors ORDER BY rowid").fetchall(),
+            cursor.execute("SELECT doctor_id, weekday, start_time, end_time, slot_minutes FROM DoctorWorkingHours").fetchall(),
+            cursor.execute("SELECT doctor_id, weekday, start_time, end_time FROM DoctorBreaks").fetchall(),
+            cursor.execute("SELECT doctor_id, start_date, end_date FROM DoctorHolidays").fetchall(),
+            version=version,
         )
-    ''')
-    
-    # Insert sample doctors if table is empty
-    cursor.execute("SELECT COUNT(*) FROM Doctors")
-    if cursor.fetchone()[0] == 0:
-        sample_doctors = [
-            ("DOC001", "Dr. Smith", "Cardiology"),
-            ("DOC002", "Dr. Johnson", "Neurology"),
-            ("DOC003", "Dr. Williams", "Pediatrics"),
-            ("DOC004", "Dr. Brown", "Orthopedics"),
-            ("DOC005", "Dr. Jones", "Dermatology")
-        ]
-        cursor.executemany("INSERT INTO Doctors (doctor_id, name, specialization) VALUES (?, ?, ?)", sample_doctors)
-    
-    conn.commit()
-    conn.close()
+    with _schedules_lock:
+        _schedules["value"], _schedules["checked_at"] = cached, time.monotonic()
+    return cached
 
-def book_appointment(name, age, gender, contact_number, email, medical_history, appointment_date, appointment_time):
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    
+@traced("db.get_schedules")
+def get_schedules(cursor=None, max_age=SCHEDULE_CHECK_SECONDS):
+    """
+    The doctors' schedule.Schedules. The cached copy is returned as is when it
+    was checked less than `max_age` seconds ago; otherwise ScheduleVersion is
+    read, with `cursor` (e.g. inside a write transaction) or a pooled
+    connection, and the tables are reloaded if it moved.
+    """
+    with _schedules_lock:
+        cached = _schedules["value"]
+        if cached is not None and time.monotonic() - _schedules["checked_at"] < max_age:
+            return cached
+    if cursor is not None:
+        return _current_schedules(cursor, cached)
+    with get_connection() as conn:
+        return _current_schedules(conn.cursor(), cached)
+
+def _slot_time(appointment_date, appointment_time):
+    """
+    ("HH:MM", None) for a readable time on a YYYY-MM-DD date, else (None, error
+    message). Times are stored as HH:MM so a doctor's slot has one spelling.
+    """
     try:
-        patient_id = str(uuid.uuid4())[:8]  # Generate a unique 8-character patient ID
-        appointment_id = str(uuid.uuid4())[:8]  # Generate a unique 8-character appointment ID
-        
-        # Insert new patient record
-        cursor.execute("""
-            INSERT INTO Patients (patient_id, name, age, gender, contact_number, email, medical_history)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (patient_id, name, age, gender, contact_number, email, medical_history))
-        conn.commit()
-        
-        # Look for doctors with matching specialization
-        cursor.execute("""
-            SELECT doctor_id, name FROM Doctors
-            WHERE specialization = ?
-        """, (medical_history,))
-        doctors = cursor.fetchall()
-        
-        if not doctors:
-            conn.close()
-            return {"error": f"No doctors found with specialization '{medical_history}'"}
-        
-        selected_doctor = None
-        for doctor in doctors:
-            doc_id, doc_name = doctor
+        datetime.date.fromisoformat(appointment_date)
+    except (TypeError, ValueError):
+        return None, f"Can't read the appointment date '{appointment_date}', use YYYY-MM-DD"
+    minute = minute_of_day(appointment_time)
+    if minute is None:
+        return None, f"Can't read the appointment time '{appointment_time}'"
+    return format_minutes(minute), None
+
+@traced("db.book_appointment")
+def book_appointment(name, age, gender, contact_number, email, medical_history, appointment_date, appointment_time, policy=None):
+    """
+    Book the slot with a free doctor of the `medical_history` specialization.
+    The doctor is picked by the allocation `policy` (default DOCTOR_ALLOCATION_POLICY)
+    and the patient and appointment are only written once a doctor is found, all in
+    one write transaction so concurrent bookings cannot take the same slot.
+    """
+    choose = ALLOCATION_POLICIES[policy or DOCTOR_ALLOCATION_POLICY]
+    appointment_time, error = _slot_time(appointment_date, appointment_time)
+    if error:
+        return {"error": error}
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            # Take the write lock up front so the free-doctor check and the insert
+            # see the same state
+            cursor.execute("BEGIN IMMEDIATE")
+
+            with span("db.free_doctors"):
+                query = {"specialization": medical_history, "date": appointment_date}
+                doctors = cursor.execute(_DEPARTMENT_DOCTORS_SQL, query).fetchall()
+                booked = {}
+                for doctor_id, booked_time, length in cursor.execute(_DEPARTMENT_DAY_BOOKINGS_SQL, query):
+                    booked.setdefault(doctor_id, []).append((booked_time, length))
+                # Doctors with a slot starting then that no appointment overlaps
+                schedules = get_schedules(cursor, max_age=0)
+                candidates = _free_doctors(schedules, doctors, appointment_date, appointment_time, booked)
+
+            if not candidates:
+                cursor.execute("SELECT 1 FROM Doctors WHERE specialization = ? LIMIT 1", (medical_history,))
+                if cursor.fetchone() is None:
+                    return {"error": f"No doctors found with specialization '{medical_history}'"}
+                return {"error": "No doctor available at the given time. Please choose another date/time."}
+
+            _, doctor_id, doctor_name, _ = choose(candidates, medical_history)
+
+            patient_id = str(uuid.uuid4())[:8]  # Generate a unique 8-character patient ID
+            appointment_id = str(uuid.uuid4())[:8]  # Generate a unique 8-character appointment ID
+
+            # Insert new patient record
             cursor.execute("""
-                SELECT appointment_id FROM Appointments
-                WHERE doctor_id = ? AND date = ? AND time = ?
-            """, (doc_id, appointment_date, appointment_time))
-            
-            if cursor.fetchone() is None:
-                selected_doctor = (doc_id, doc_name)
-                break
-        
-        if not selected_doctor:
-            conn.close()
-            return {"error": "No doctor available at the given time. Please choose another date/time."}
-        
-        doctor_id, doctor_name = selected_doctor
-        
-        # Insert appointment
-        cursor.execute("""
-            INSERT INTO Appointments (appointment_id, patient_id, doctor_id, department, date, time, status)
-            VALUES (?, ?, ?, ?, ?, ?, 'Scheduled')
-        """, (appointment_id, patient_id, doctor_id, medical_history, appointment_date, appointment_time))
-        
-        conn.commit()
+                INSERT INTO Patients (patient_id, name, age, gender, contact_number, email, medical_history)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (patient_id, name, age, gender, contact_number, email, medical_history))
+
+            # Insert appointment
+            cursor.execute("""
+                INSERT INTO Appointments (appointment_id, patient_id, doctor_id, department, date, time, status, slot_minutes)
+                VALUES (?, ?, ?, ?, ?, ?, 'Scheduled', ?)
+            """, (appointment_id, patient_id, doctor_id, medical_history, appointment_date, appointment_time,
+                  schedules.slot_minutes_at(doctor_id, appointment_date, appointment_time)))
+
+        _publish_change("booked", appointment_id)
         return {
             "message": f"Appointment scheduled with Dr. {doctor_name}",
             "patient_id": patient_id,
@@ -117,107 +348,243 @@ def book_appointment(name, age, gender, contact_number, email, medical_history,
             "doctor_id": doctor_id,
             "doctor_name": doctor_name
         }
-    
+
     except Exception as e:
-        conn.rollback()
         return {"error": str(e)}
-    
-    finally:
-        conn.close()
 
+BOOKING_FIELDS = ("name", "age", "gender", "contact_number", "email", "medical_history",
+                  "appointment_date", "appointment_time")
 
-def reschedule_appointment(patient_name, old_date, old_time, new_date, new_time):
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    
-    # Get the patient_id from the patients table
-    cursor.execute("SELECT patient_id FROM Patients WHERE name = ?", (patient_name,))
-    patient = cursor.fetchone()
+# Active appointments of the given specializations' doctors on the given dates;
+# the {specializations} and {dates} placeholders are filled with "?, ?, ..."
+_BOOKED_SLOTS_SQL = """
+    SELECT a.doctor_id, a.date, a.time, a.slot_minutes FROM Doctors d
+    JOIN Appointments a ON a.doctor_id = d.doctor_id
+    WHERE d.specialization IN ({specializations}) AND a.date IN ({dates}) AND a.status != 'Cancelled'
+"""
 
-    if not patient:
-        conn.close()
-        return False
+def _reserve_versions(cursor, count):
+    """
+    Take `count` values of the change sequence in the current write transaction,
+    for rows inserted with their row_version set (migration 4); returns the first.
+    """
+    version = cursor.execute("SELECT value FROM ChangeSequence WHERE id = 1").fetchone()[0]
+    cursor.execute("UPDATE ChangeSequence SET value = value + ? WHERE id = 1", (count,))
+    return version + 1
 
-    patient_id = patient[0]
+@traced("db.book_appointments_bulk")
+def book_appointments_bulk(bookings, policy=None, all_or_nothing=False):
+    """
+    Book many appointments in one write transaction. `bookings` is a list of
+    dicts with the BOOKING_FIELDS (the book_appointment() arguments).
 
-    # Find the appointment based on patient_id, old_date, and old_time
-    cursor.execute("""
-        SELECT appointment_id FROM Appointments WHERE patient_id = ? AND date = ? AND time = ?
-    """, (patient_id, old_date, old_time))
+    The doctors and booked slots of every specialization and date in the batch
+    are read once, and doctors who have the slot in their schedule are allocated
+    in order against that view, so bookings in the same batch can't take each
+    other's slots either. Returns
+    {"booked", "failed", "results"} with one book_appointment()-style result
+    per booking, in order. With `all_or_nothing` a single failure books none.
+    """
+    choose = ALLOCATION_POLICIES[policy or DOCTOR_ALLOCATION_POLICY]
+    results = [None] * len(bookings)
+    valid = []
+    for i, booking in enumerate(bookings):
+        if not isinstance(booking, dict) or not all(booking.get(k) for k in BOOKING_FIELDS):
+            results[i] = {"error": "Missing data"}
+            continue
+        slot_time, error = _slot_time(booking["appointment_date"], booking["appointment_time"])
+        if error:
+            results[i] = {"error": error}
+        else:
+            valid.append((i, dict(booking, appointment_time=slot_time)))
 
-    appointment = cursor.fetchone()
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
 
-    if not appointment:
-        conn.close()
-        return False
+            specializations = sorted({booking["medical_history"] for _, booking in valid})
+            dates = sorted({booking["appointment_date"] for _, booking in valid})
+            doctors = {}  # specialization -> [(rowid, doctor_id, name)], in rowid order
+            booked, day_load = {}, {}  # (date, doctor_id) -> [(start time, slot_minutes)]
+            if valid:
+                for rowid, doctor_id, doctor_name, specialization in cursor.execute(
+                        "SELECT rowid, doctor_id, name, specialization FROM Doctors WHERE specialization IN ({}) "
+                        "ORDER BY rowid".format(", ".join("?" * len(specializations))), specializations):
+                    doctors.setdefault(specialization, []).append((rowid, doctor_id, doctor_name))
+                with span("db.free_doctors"):
+                    for doctor_id, date, slot_time, length in cursor.execute(_BOOKED_SLOTS_SQL.format(
+                            specializations=", ".join("?" * len(specializations)),
+                            dates=", ".join("?" * len(dates))), specializations + dates):
+                        booked.setdefault((date, doctor_id), []).append((slot_time, length))
+                        day_load[doctor_id, date] = day_load.get((doctor_id, date), 0) + 1
 
-    appointment_id = appointment[0]
+            schedules = get_schedules(cursor, max_age=0) if valid else None
+            ids = iter(_new_ids(2 * len(valid)))
+            patients, appointments = [], []
+            for i, booking in valid:
+                specialization = booking["medical_history"]
+                appointment_date, appointment_time = booking["appointment_date"], booking["appointment_time"]
+                if specialization not in doctors:
+                    results[i] = {"error": f"No doctors found with specialization '{specialization}'"}
+                    continue
+                candidates = _free_doctors(
+                    schedules,
+                    [(rowid, doctor_id, doctor_name, day_load.get((doctor_id, appointment_date), 0))
+                     for rowid, doctor_id, doctor_name in doctors[specialization]],
+                    appointment_date, appointment_time,
+                    {doctor_id: booked.get((appointment_date, doctor_id), ())
+                     for _, doctor_id, _ in doctors[specialization]})
+                if not candidates:
+                    results[i] = {"error": "No doctor available at the given time. Please choose another date/time."}
+                    continue
+                _, doctor_id, doctor_name, _ = choose(candidates, specialization)
+                length = schedules.slot_minutes_at(doctor_id, appointment_date, appointment_time)
+                booked.setdefault((appointment_date, doctor_id), []).append((appointment_time, length))
+                day_load[doctor_id, appointment_date] = day_load.get((doctor_id, appointment_date), 0) + 1
 
-    # Update the appointment with new date and time
-    cursor.execute("""
-        UPDATE Appointments SET date = ?, time = ? WHERE appointment_id = ?
-    """, (new_date, new_time, appointment_id))
+                patient_id, appointment_id = next(ids), next(ids)
+                patients.append((patient_id, booking["name"], booking["age"], booking["gender"],
+                                 booking["contact_number"], booking["email"], specialization))
+                appointments.append((appointment_id, patient_id, doctor_id, specialization, appointment_date, appointment_time,
+                                     length))
+                results[i] = {
+                    "message": f"Appointment scheduled with Dr. {doctor_name}",
+                    "patient_id": patient_id,
+                    "appointment_id": appointment_id,
+                    "doctor_id": doctor_id,
+                    "doctor_name": doctor_name
+                }
 
-    updated = cursor.rowcount  # Check if any row was updated
-    conn.commit()
-    conn.close()
-    
-    return updated > 0
+            failed = sum(1 for result in results if "error" in result)
+            if all_or_nothing and failed:
+                conn.rollback()
+                results = [result if "error" in result else {"error": "Not booked: another booking in the batch failed"}
+                           for result in results]
+                return {"booked": 0, "failed": len(results), "results": results}
 
-def cancel_appointment(patient_name, date, time):
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
+            if appointments:
+                version = _reserve_versions(cursor, len(appointments))
+                cursor.executemany("""
+                    INSERT INTO Patients (patient_id, name, age, gender, contact_number, email, medical_history)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                """, patients)
+                cursor.executemany("""
+                    INSERT INTO Appointments (appointment_id, patient_id, doctor_id, department, date, time, slot_minutes,
+                                              status, row_version)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, 'Scheduled', ?)
+                """, [appointment + (version + n,) for n, appointment in enumerate(appointments)])
+
+    except Exception as e:
+        # The transaction was rolled back: nothing in the batch is booked
+        return {"booked": 0, "failed": len(bookings), "results": [{"error": str(e)}] * len(bookings)}
+
+    _publish_changes("booked", [appointment[0] for appointment in appointments])
+    return {"booked": len(appointments), "failed": failed, "results": results}
 
+
+@traced("db.find_patient_appointment")
+def _find_patient_appointment(cursor, patient_name, date, time):
+    """appointment_id of the patient's appointment at date/time, or None."""
     # Get the patient_id from the patients table
     cursor.execute("SELECT patient_id FROM Patients WHERE name = ?", (patient_name,))
     patient = cursor.fetchone()
 
     if not patient:
-        conn.close()
-        return False
+        return None
 
     patient_id = patient[0]
 
-    # Find the appointment matching patient_id, date, and time
+    # Stored times are HH:MM, so "4 PM" finds the 16:00 appointment
+    minute = minute_of_day(time)
+    if minute is not None:
+        time = format_minutes(minute)
+
+    # Find the appointment based on patient_id, date, and time
     cursor.execute("""
         SELECT appointment_id FROM Appointments WHERE patient_id = ? AND date = ? AND time = ?
     """, (patient_id, date, time))
 
     appointment = cursor.fetchone()
+    return appointment[0] if appointment else None
 
-    if not appointment:
-        conn.close()
+@traced("db.reschedule_appointment")
+def reschedule_appointment(patient_name, old_date, old_time, new_date, new_time):
+    new_time, error = _slot_time(new_date, new_time)
+    if error:
         return False
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        # The overlap check and the update see the same appointments
+        cursor.execute("BEGIN IMMEDIATE")
 
-    appointment_id = appointment[0]
+        appointment_id = _find_patient_appointment(cursor, patient_name, old_date, old_time)
+        if not appointment_id:
+            return False
 
-    # Update appointment status to 'Cancelled' instead of deleting
-    cursor.execute("UPDATE Appointments SET status = 'Cancelled' WHERE appointment_id = ?", (appointment_id,))
-    
-    updated = cursor.rowcount  # Check if any row was updated
-    conn.commit()
-    conn.close()
-    
+        # The doctor has to have a slot starting at the new time that none of
+        # their other appointments that day overlaps
+        cursor.execute("SELECT rowid, doctor_id FROM Appointments WHERE appointment_id = ?", (appointment_id,))
+        doctor = cursor.fetchone()
+        booked = cursor.execute("""
+            SELECT time, slot_minutes FROM Appointments
+            WHERE doctor_id = ? AND date = ? AND status != 'Cancelled' AND appointment_id != ?
+        """, (doctor[1], new_date, appointment_id)).fetchall()
+        schedules = get_schedules(cursor, max_age=0)
+        if not _free_doctors(schedules, [doctor], new_date, new_time, {doctor[1]: booked}):
+            return False
+
+        # Update the appointment with new date, time and slot length
+        try:
+            cursor.execute("""
+                UPDATE Appointments SET date = ?, time = ?, slot_minutes = ? WHERE appointment_id = ?
+            """, (new_date, new_time, schedules.slot_minutes_at(doctor[1], new_date, new_time), appointment_id))
+        except sqlite3.IntegrityError:
+            return False  # The doctor already has an appointment in the new slot
+
+        updated = cursor.rowcount  # Check if any row was updated
+
+    if updated > 0:
+        _publish_change("rescheduled", appointment_id)
     return updated > 0
 
-def get_appointments():
-    conn = sqlite3.connect(DB_FILE)
-    conn.row_factory = sqlite3.Row  # This allows accessing columns by name
-    cursor = conn.cursor()
+@traced("db.cancel_appointment")
+def cancel_appointment(patient_name, date, time):
+    with get_connection() as conn:
+        cursor = conn.cursor()
 
-    cursor.execute("""
-        SELECT a.appointment_id, a.patient_id, p.name AS patient_name,
-                a.doctor_id, d.name AS doctor_name,
-                a.department, a.date, a.time, a.status,
-                p.age, p.gender, p.contact_number, p.email, p.medical_history
-        FROM Appointments a
-        JOIN Patients p ON a.patient_id = p.patient_id
-        JOIN Doctors d ON a.doctor_id = d.doctor_id
-    """)
-    
-    rows = cursor.fetchall()
-    
-    appointments = [{
+        appointment_id = _find_patient_appointment(cursor, patient_name, date, time)
+        if not appointment_id:
+            return False
+
+        # Update appointment status to 'Cancelled' instead of deleting
+        cursor.execute("UPDATE Appointments SET status = 'Cancelled' WHERE appointment_id = ?", (appointment_id,))
+
+        updated = cursor.rowcount  # Check if any row was updated
+
+    if updated > 0:
+        _publish_change("cancelled", appointment_id)
+    return updated > 0
+
+_APPOINTMENTS_COLUMNS = """
+    a.rowid, a.row_version, a.appointment_id, a.patient_id, p.name AS patient_name,
+            a.doctor_id, d.name AS doctor_name,
+            a.department, a.date, a.time, a.status,
+            p.age, p.gender, p.contact_number, p.email, p.medical_history, a.slot_minutes"""
+_APPOINTMENTS_FROM = """
+    FROM Appointments a
+    JOIN Patients p ON a.patient_id = p.patient_id
+    JOIN Doctors d ON a.doctor_id = d.doctor_id
+"""
+_APPOINTMENTS_SELECT = "SELECT" + _APPOINTMENTS_COLUMNS + _APPOINTMENTS_FROM
+
+APPOINTMENT_FIELDS = (
+    "id", "patientId", "patientName", "doctorId", "doctorName", "department", "date", "time",
+    "status", "patientAge", "patientGender", "patientContact", "patientEmail", "medicalHistory", "slotMinutes"
+)
+
+def _appointment_row_to_dict(row):
+    return {
         "id": row["appointment_id"],
         "patientId": row["patient_id"],
         "patientName": row["patient_name"],
@@ -231,8 +598,590 @@ def get_appointments():
         "patientGender": row["gender"],
         "patientContact": row["contact_number"],
         "patientEmail": row["email"],
-        "medicalHistory": row["medical_history"]
-    } for row in rows]
-    
-    conn.close()
-    return appointments
\ No newline at end of file
+        "medicalHistory": row["medical_history"],
+        "slotMinutes": row["slot_minutes"]
+    }
+
+@traced("db.get_change_token")
+def get_change_token():
+    """Current value of the appointment change sequence; it grows on every write."""
+    with get_connection() as conn:
+        return conn.execute("SELECT value FROM ChangeSequence WHERE id = 1").fetchone()[0]
+
+def _add_filters(conditions, params, date_from=None, date_to=None, doctor_id=None, department=None, status=None,
+                 patient_id=None, patient_name=None):
+    """Append the WHERE conditions and parameters for the appointment listing filters."""
+    for column, value in (("a.date >= ?", date_from), ("a.date <= ?", date_to), ("a.doctor_id = ?", doctor_id),
+                          ("a.department = ?", department), ("a.status = ?", status),
+                          ("a.patient_id = ?", patient_id), ("p.name = ?", patient_name)):
+        if value is not None:
+            conditions.append(column)
+            params.append(value)
+
+@traced("db.query_appointments")
+def query_appointments(limit=None, cursor=None, since=None, order="asc", date_from=None, date_to=None,
+                       doctor_id=None, department=None, status=None, patient_id=None, patient_name=None):
+    """
+    Filtered, keyset-paginated appointment listing.
+
+    Without `since`, rows come in booking order (`order` "asc" or "desc") and
+    `cursor` is the `next_cursor` of the previous page. With `since`, every row
+    changed after that change token is returned, oldest change first, whether or
+    not it matches the filters, with "matches" set to whether it does now: a row
+    that was edited out of the filter (e.g. cancelled, with status=Scheduled)
+    comes back with "matches" false so the client can drop it. Deleted rows come
+    back as {"id", "deleted": true, "matches": false}. Pass `next_cursor` as
+    `cursor` for the following page, and once it is None use the returned
+    `change_token` as the next `since`.
+
+    Returns {"appointments": [...], "next_cursor": str or None, "change_token": int}.
+    """
+    filters, filter_params = [], []
+    _add_filters(filters, filter_params, date_from=date_from, date_to=date_to, doctor_id=doctor_id,
+                 department=department, status=status, patient_id=patient_id, patient_name=patient_name)
+    fetch = int(limit) + 1 if limit is not None else -1  # one extra row tells whether there is another page
+
+    with get_connection() as conn:
+        db_cursor = conn.cursor()
+        db_cursor.row_factory = sqlite3.Row  # This allows accessing columns by name
+        # One read transaction so the token and the rows come from the same snapshot
+        db_cursor.execute("BEGIN")
+        change_token = db_cursor.execute("SELECT value FROM ChangeSequence WHERE id = 1").fetchone()[0]
+        if since is not None:
+            after = int(cursor if cursor is not None else since)
+            rows = db_cursor.execute(
+                f"SELECT {_APPOINTMENTS_COLUMNS}, ({' AND '.join(filters) or '1'}) AS matches {_APPOINTMENTS_FROM}"
+                " WHERE a.row_version > ? ORDER BY a.row_version LIMIT ?", filter_params + [after, fetch]).fetchall()
+            deleted = db_cursor.execute(
+                "SELECT appointment_id, row_version FROM AppointmentTombstones WHERE row_version > ?"
+                " ORDER BY row_version LIMIT ?", (after, fetch)).fetchall()
+        else:
+            conditions, params = list(filters), list(filter_params)
+            descending = order == "desc"
+            if cursor is not None:
+                conditions.append("a.rowid < ?" if descending else "a.rowid > ?")
+                params.append(int(cursor))
+            sql = _APPOINTMENTS_SELECT
+            if conditions:
+                sql += " WHERE " + " AND ".join(conditions)
+            sql += f" ORDER BY a.rowid {'DESC' if descending else 'ASC'} LIMIT ?"
+            rows = db_cursor.execute(sql, params + [fetch]).fetchall()
+
+    if since is not None:
+        changes = [(row["row_version"], dict(_appointment_row_to_dict(row), matches=bool(row["matches"])))
+                   for row in rows]
+        changes += [(row["row_version"], {"id": row["appointment_id"], "deleted": True, "matches": False})
+                    for row in deleted]
+        changes.sort(key=lambda change: change[0])
+        keys = [version for version, _ in changes]
+        appointments = [appointment for _, appointment in changes]
+    else:
+        keys = [row["rowid"] for row in rows]
+        appointments = [_appointment_row_to_dict(row) for row in rows]
+
+    next_cursor = None
+    if limit is not None and len(appointments) > limit:
+        appointments = appointments[:limit]
+        next_cursor = str(keys[limit - 1])
+
+    return {
+        "appointments": appointments,
+        "next_cursor": next_cursor,
+        "change_token": change_token,
+    }
+
+@traced("db.get_appointments")
+def get_appointments():
+    return query_appointments()["appointments"]
+
+@traced("db.get_specializations")
+def get_specializations():
+    """Distinct doctor specializations, i.e. the departments that can be booked."""
+    with get_connection() as conn:
+        rows = conn.execute("SELECT DISTINCT specialization FROM Doctors ORDER BY specialization").fetchall()
+    return [row[0] for row in rows]
+
+def _schedule_minute(value, what):
+    minute = minute_of_day(value)
+    if minute is None or minute % SCHEDULE_RESOLUTION_MINUTES:
+        raise ValueError(f"{what} {value!r} is not a time on a {SCHEDULE_RESOLUTION_MINUTES}-minute boundary")
+    return minute
+
+def _schedule_weekday(value, allow_every_day=False):
+    if value is None and allow_every_day:
+        return None
+    if not isinstance(value, int) or not 0 <= value <= 6:
+        raise ValueError(f"weekday {value!r} is not 0 (Monday) to 6 (Sunday)")
+    return value
+
+def _schedule_rows(doctor_id, hours, breaks, holidays):
+    """The doctor's schedule table rows, checked; raises ValueError."""
+    if not all(isinstance(entry, dict) for entries in (hours, breaks, holidays) for entry in entries):
+        raise ValueError("schedule entries must be objects")
+    hour_rows, break_rows, holiday_rows = [], [], []
+    for shift in hours:
+        start = _schedule_minute(shift.get("start_time"), "start_time")
+        end = _schedule_minute(shift.get("end_time"), "end_time")
+        slot_minutes = shift.get("slot_minutes", 30)
+        if not isinstance(slot_minutes, int) or slot_minutes <= 0 or slot_minutes % SCHEDULE_RESOLUTION_MINUTES:
+            raise ValueError(f"slot_minutes {slot_minutes!r} is not a positive multiple of {SCHEDULE_RESOLUTION_MINUTES}")
+        if end - start < slot_minutes:
+            raise ValueError(f"shift {format_minutes(start)}-{format_minutes(end)} is shorter than one slot")
+        row = (doctor_id, _schedule_weekday(shift.get("weekday")), format_minutes(start), format_minutes(end),
+               slot_minutes)
+        if any(other[1] == row[1] and start < minute_of_day(other[3]) and minute_of_day(other[2]) < end
+               for other in hour_rows):
+            raise ValueError(f"shift {row[2]}-{row[3]} overlaps another shift on weekday {row[1]}")
+        hour_rows.append(row)
+    for pause in breaks:
+        start = _schedule_minute(pause.get("start_time"), "start_time")
+        end = _schedule_minute(pause.get("end_time"), "end_time")
+        if end <= start:
+            raise ValueError(f"break {format_minutes(start)}-{format_minutes(end)} ends before it starts")
+        break_rows.append((doctor_id, _schedule_weekday(pause.get("weekday"), allow_every_day=True),
+                           format_minutes(start), format_minutes(end)))
+    for holiday in holidays:
+        try:
+            start = datetime.date.fromisoformat(holiday.get("start_date"))
+            end = datetime.date.fromisoformat(holiday.get("end_date") or holiday.get("start_date"))
+        except (TypeError, ValueError):
+            raise ValueError(f"holiday {holiday!r} needs a YYYY-MM-DD start_date (and end_date)") from None
+        if end < start:
+            raise ValueError(f"holiday {start}..{end} ends before it starts")
+        holiday_rows.append((doctor_id, start.isoformat(), end.isoformat(), holiday.get("reason")))
+    return hour_rows, break_rows, holiday_rows
+
+@traced("db.get_doctor_schedule")
+def get_doctor_schedule(doctor_id):
+    """
+    {"doctor_id", "hours", "breaks", "holidays"} as set_doctor_schedule() takes
+    them, or None for an unknown doctor. Empty "hours" means the doctor works
+    schedule.DEFAULT_HOURS.
+    """
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.row_factory = sqlite3.Row
+        doctor = cursor.execute("SELECT doctor_id FROM Doctors WHERE doctor_id = ?", (doctor_id,)).fetchone()
+        if doctor is None:
+            return None
+        doctor_id = doctor["doctor_id"]
+        hours = cursor.execute("""
+            SELECT weekday, start_time, end_time, slot_minutes FROM DoctorWorkingHours
+            WHERE doctor_id = ? ORDER BY weekday, start_time
+        """, (doctor_id,)).fetchall()
+        breaks = cursor.execute("""
+            SELECT weekday, start_time, end_time FROM DoctorBreaks
+            WHERE doctor_id = ? ORDER BY weekday, start_time
+        """, (doctor_id,)).fetchall()
+        holidays = cursor.execute("""
+            SELECT start_date, end_date, reason FROM DoctorHolidays
+            WHERE doctor_id = ? ORDER BY start_date
+        """, (doctor_id,)).fetchall()
+    return {"doctor_id": doctor_id, "hours": [dict(row) for row in hours], "breaks": [dict(row) for row in breaks],
+            "holidays": [dict(row) for row in holidays]}
+
+@traced("db.set_doctor_schedule")
+def set_doctor_schedule(doctor_id, hours, breaks=(), holidays=()):
+    """
+    Replace a doctor's working hours, breaks and holidays: lists of dicts with
+    the DoctorWorkingHours / DoctorBreaks / DoctorHolidays columns (weekday 0 is
+    Monday; a break without weekday applies every day). Existing appointments
+    are left alone. Returns False for an unknown doctor; raises ValueError for
+    an invalid entry.
+    """
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        doctor = cursor.execute("SELECT doctor_id FROM Doctors WHERE doctor_id = ?", (doctor_id,)).fetchone()
+        if doctor is None:
+            return False
+        hour_rows, break_rows, holiday_rows = _schedule_rows(doctor[0], hours, breaks, holidays)
+        for table in ("DoctorWorkingHours", "DoctorBreaks", "DoctorHolidays"):
+            cursor.execute(f"DELETE FROM {table} WHERE doctor_id = ?", (doctor[0],))
+        cursor.executemany("INSERT INTO DoctorWorkingHours VALUES (?, ?, ?, ?, ?)", hour_rows)
+        cursor.executemany("INSERT INTO DoctorBreaks VALUES (?, ?, ?, ?)", break_rows)
+        cursor.executemany("INSERT INTO DoctorHolidays VALUES (?, ?, ?, ?)", holiday_rows)
+    return True
+
+@traced("db.get_active_slots")
+def get_active_slots(date_from):
+    """
+    (appointment_id, row_version, doctor_id, date, time, slot_minutes) of every
+    appointment that isn't cancelled, on `date_from` ("YYYY-MM-DD") or later.
+    """
+    with get_connection() as conn:
+        return conn.execute("""
+            SELECT appointment_id, row_version, doctor_id, date, time, slot_minutes FROM Appointments
+            WHERE date >= ? AND status != 'Cancelled'
+        """, (date_from,)).fetchall()
+
+# Bulk import and export of appointments; bulk.py reads and writes the
+# CSV/JSONL files and serves the CLI and API on top of these
+BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", "20000"))  # rows per import transaction / export chunk
+BULK_MAX_REPORTED_ERRORS = 20
+
+# Appointment columns in APPOINTMENT_FIELDS order
+_EXPORT_SELECT = """
+    SELECT a.appointment_id, a.patient_id, p.name, a.doctor_id, d.name, a.department, a.date, a.time,
+           a.status, p.age, p.gender, p.contact_number, p.email, p.medical_history, a.slot_minutes
+    FROM Appointments a
+    JOIN Patients p ON a.patient_id = p.patient_id
+    JOIN Doctors d ON a.doctor_id = d.doctor_id
+"""
+
+def iter_appointment_rows(batch_size=BULK_BATCH_SIZE, **filters):
+    """
+    Every appointment matching `filters` (those of query_appointments()) as
+    tuples in APPOINTMENT_FIELDS order, in booking order, yielded in lists of
+    up to `batch_size`. Rows are read off the cursor as they are consumed, in
+    one read transaction so the export is a consistent snapshot, on a
+    connection of its own so a slow download doesn't hold a pooled one.
+    """
+    conditions, params = [], []
+    _add_filters(conditions, params, **filters)
+    sql = _EXPORT_SELECT
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    sql += " ORDER BY a.rowid"
+
+    conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
+    try:
+        conn.execute("BEGIN")
+        cursor = conn.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield rows
+    finally:
+        conn.close()
+
+_BULK_SLOTS_TABLE = """
+    CREATE TEMP TABLE IF NOT EXISTS bulk_slots (
+        row_no INTEGER PRIMARY KEY, appointment_id, doctor_id, department, date, time, active
+    )
+"""
+
+# Rows of the batch in bulk_slots whose appointment_id is already taken
+_BULK_EXISTING_IDS_SQL = """
+    SELECT b.row_no FROM bulk_slots b JOIN Appointments a ON a.appointment_id = b.appointment_id
+"""
+
+# Rows naming a doctor who already has an active appointment in that slot
+_BULK_TAKEN_SLOTS_SQL = """
+    SELECT b.row_no FROM bulk_slots b
+    WHERE b.doctor_id IS NOT NULL AND b.active AND EXISTS (
+        SELECT 1 FROM Appointments a
+        WHERE a.doctor_id = b.doctor_id AND a.date = b.date AND a.time = b.time AND a.status != 'Cancelled'
+    )
+"""
+
+# For rows without a doctor: the department's doctors free in that slot, in rowid order
+_BULK_FREE_DOCTORS_SQL = """
+    SELECT b.row_no, d.doctor_id FROM bulk_slots b
+    JOIN Doctors d ON d.specialization = b.department
+    WHERE b.doctor_id IS NULL AND (NOT b.active OR NOT EXISTS (
+        SELECT 1 FROM Appointments a
+        WHERE a.doctor_id = d.doctor_id AND a.date = b.date AND a.time = b.time AND a.status != 'Cancelled'
+    ))
+    ORDER BY b.row_no, d.rowid
+"""
+
+_ISO_DATE = re.compile(r"\d{4}-\d{2}-\d{2}")
+_HH_MM = re.compile(r"(?:[01]\d|2[0-3]):[0-5]\d")
+_YEAR = re.compile(r"\b\d{4}\b")
+
+def _text(value):
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+def _bulk_date(value):
+    if value is None:
+        raise ValueError("date is required")
+    if not _ISO_DATE.fullmatch(value):
+        # "03/04/2021" or "4 March 2021" are read; without a year ("March 4",
+        # "tomorrow") the date depends on when the file is imported, so no
+        parsed = parse_date(value) if _YEAR.search(value) else None
+        if parsed is None:
+            raise ValueError(f"date {value!r} is not a date with a year")
+        return parsed.isoformat()
+    try:
+        datetime.date.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"date {value!r} is not a date") from None
+    return value
+
+def _bulk_time(value):
+    if value is None:
+        raise ValueError("time is required")
+    if _HH_MM.fullmatch(value):
+        return value
+    parsed = parse_time(value)
+    if parsed is None:
+        raise ValueError(f"time {value!r} is not a time")
+    return f"{parsed[0]:02d}:{parsed[1]:02d}"
+
+def _bulk_row(record, doctors, departments):
+    """
+    One import record (APPOINTMENT_FIELDS keys) checked and normalized; raises
+    ValueError. `doctors` is {doctor id as text: (doctor_id, specialization)}.
+    """
+    if not isinstance(record, dict):
+        raise ValueError("expected an object with appointment fields")
+    name = _text(record.get("patientName"))
+    if name is None:
+        raise ValueError("patientName is required")
+    doctor_id = _text(record.get("doctorId"))
+    department = _text(record.get("department"))
+    if doctor_id is not None:
+        if doctor_id not in doctors:
+            raise ValueError(f"Unknown doctor '{doctor_id}'")
+        doctor_id, specialization = doctors[doctor_id]
+        department = department or specialization
+    elif department is None:
+        raise ValueError("department or doctorId is required")
+    elif department not in departments:
+        raise ValueError(f"No doctors found with specialization '{department}'")
+    age = _text(record.get("patientAge"))
+    if age is None:
+        raise ValueError("patientAge is required")
+    try:
+        age = int(float(age))
+    except ValueError:
+        raise ValueError(f"patientAge {age!r} is not a number") from None
+    slot_minutes = _text(record.get("slotMinutes"))
+    if slot_minutes is not None:
+        try:
+            slot_minutes = int(float(slot_minutes))
+        except ValueError:
+            slot_minutes = 0
+        if slot_minutes <= 0:
+            raise ValueError(f"slotMinutes {record.get('slotMinutes')!r} is not a positive number")
+    return {
+        "id": _text(record.get("id")),
+        "patient_id": _text(record.get("patientId")),
+        "name": name,
+        "age": age,
+        # Older databases declare these NOT NULL
+        "gender": _text(record.get("patientGender")) or "",
+        "contact_number": _text(record.get("patientContact")) or "",
+        "email": _text(record.get("patientEmail")) or "",
+        "medical_history": _text(record.get("medicalHistory")) or department,
+        "doctor_id": doctor_id,
+        "department": department,
+        "date": _bulk_date(_text(record.get("date"))),
+        "time": _bulk_time(_text(record.get("time"))),
+        "status": _text(record.get("status")) or "Scheduled",
+        "slot_minutes": slot_minutes,
+    }
+
+def _new_ids(count):
+    # 16 hex characters (the 8 of uuid4()[:8] collide within a few hundred
+    # thousand rows): a random prefix per batch and a counter, so a batch's
+    # rows land next to each other in the primary key indexes instead of all
+    # over them, which halves the time of a large import
+    prefix = os.urandom(4).hex()
+    return [f"{prefix}{i:08x}" for i in range(count)]
+
+def _import_batch(conn, batch, reject):
+    """Write one batch of (line, row) in one transaction; returns how many were imported."""
+    cursor = conn.cursor()
+    cursor.execute("BEGIN IMMEDIATE")
+    cursor.execute("DELETE FROM bulk_slots")
+    cursor.executemany("INSERT INTO bulk_slots VALUES (?, ?, ?, ?, ?, ?, ?)", [
+        (row_no, row["id"], row["doctor_id"], row["department"], row["date"], row["time"], row["status"] != "Cancelled")
+        for row_no, (_, row) in enumerate(batch)
+    ])
+    existing = {row_no for row_no, in cursor.execute(_BULK_EXISTING_IDS_SQL)}
+    taken = {row_no for row_no, in cursor.execute(_BULK_TAKEN_SLOTS_SQL)}
+    free_doctors = {}
+    for row_no, doctor_id in cursor.execute(_BULK_FREE_DOCTORS_SQL):
+        free_doctors.setdefault(row_no, []).append(doctor_id)
+
+    ids = iter(_new_ids(2 * len(batch)))
+    seen_ids, booked, patients, appointments = set(), set(), [], []
+    for row_no, (line, row) in enumerate(batch):
+        appointment_id = row["id"]
+        if row_no in existing or appointment_id in seen_ids:
+            reject("duplicates", line, f"Appointment '{appointment_id}' already exists")
+            continue
+        active = row["status"] != "Cancelled"
+        slot = (row["date"], row["time"])
+        doctor_id = row["doctor_id"]
+        if doctor_id is None:
+            doctor_id = next((d for d in free_doctors.get(row_no, ()) if not active or (d,) + slot not in booked), None)
+            if doctor_id is None:
+                reject("conflicts", line, f"No {row['department']} doctor available on {slot[0]} at {slot[1]}")
+                continue
+        elif row_no in taken or (active and (doctor_id,) + slot in booked):
+            reject("conflicts", line, f"Doctor '{doctor_id}' is already booked on {slot[0]} at {slot[1]}")
+            continue
+        if active:
+            booked.add((doctor_id,) + slot)
+        if appointment_id is None:
+            appointment_id = next(ids)
+        seen_ids.add(appointment_id)
+        patient_id = row["patient_id"] or next(ids)
+        patients.append((patient_id, row["name"], row["age"], row["gender"], row["contact_number"], row["email"],
+                         row["medical_history"]))
+        appointments.append((appointment_id, patient_id, doctor_id, row["department"], row["date"], row["time"],
+                             row["status"], row["slot_minutes"]))
+
+    # Reserve one row_version per appointment up front instead of having the
+    # insert trigger bump the sequence row by row
+    version = _reserve_versions(cursor, len(appointments))
+    # An existing patient_id keeps its record; the appointment is added to it
+    cursor.executemany("""
+        INSERT INTO Patients (patient_id, name, age, gender, contact_number, email, medical_history)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (patient_id) DO NOTHING
+    """, patients)
+    cursor.executemany("""
+        INSERT INTO Appointments (appointment_id, patient_id, doctor_id, department, date, time, status, slot_minutes,
+                                  row_version)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, [appointment + (version + i,) for i, appointment in enumerate(appointments)])
+    conn.commit()
+    return len(appointments)
+
+@traced("db.import_appointments")
+def import_appointments(records, batch_size=BULK_BATCH_SIZE, progress=None):
+    """
+    Import appointments from `records`, an iterable of (line number, record)
+    pairs where a record has APPOINTMENT_FIELDS keys (an export imports as is).
+
+    patientName, date, time and a doctorId or department are required. Without
+    a doctorId the first free doctor of the department is assigned; without an
+    id or patientId new ones are generated. Records are read lazily and written
+    `batch_size` at a time, one transaction per batch, so memory stays flat
+    however long the input is. Rows that are invalid, reuse an existing
+    appointment id, or take a doctor slot already booked (in the database or
+    earlier in the input) are skipped and reported; `progress(summary)` is
+    called after every batch. The import runs on a connection of its own, so
+    it doesn't hold a pooled one for its whole length.
+
+    Returns {"rows", "imported", "invalid", "duplicates", "conflicts",
+    "errors": [{"line", "error"}, ...] (the first few), "seconds"}.
+    """
+    started = time.perf_counter()
+    summary = {"rows": 0, "imported": 0, "invalid": 0, "duplicates": 0, "conflicts": 0, "errors": []}
+
+    def reject(kind, line, message):
+        summary[kind] += 1
+        if len(summary["errors"]) < BULK_MAX_REPORTED_ERRORS:
+            summary["errors"].append({"line": line, "error": message})
+
+    conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
+    try:
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(_BULK_SLOTS_TABLE)
+        doctors = {str(doctor_id): (doctor_id, specialization)
+                   for doctor_id, specialization in conn.execute("SELECT doctor_id, specialization FROM Doctors")}
+        departments = {specialization for _, specialization in doctors.values()}
+        batch = []
+        for line, record in records:
+            summary["rows"] += 1
+            try:
+                batch.append((line, _bulk_row(record, doctors, departments)))
+            except ValueError as e:
+                reject("invalid", line, str(e))
+            if len(batch) >= batch_size:
+                summary["imported"] += _import_batch(conn, batch, reject)
+                batch = []
+                if progress:
+                    progress(summary)
+        if batch:
+            summary["imported"] += _import_batch(conn, batch, reject)
+            if progress:
+                progress(summary)
+    finally:
+        conn.close()
+
+    summary["seconds"] = round(time.perf_counter() - started, 3)
+    return summary
+
+def _publish_change(kind, appointment_id):
+    """Send a committed appointment change to the change bus subscribers."""
+    _publish_changes(kind, [appointment_id])
+
+def _publish_changes(kind, appointment_ids):
+    """_publish_change() for several appointments, read back in one query."""
+    if not appointment_ids or not change_bus.has_subscribers():
+        return
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.row_factory = sqlite3.Row
+        rows = cursor.execute(
+            _APPOINTMENTS_SELECT + " WHERE a.appointment_id IN ({}) ORDER BY a.row_version".format(
+                ", ".join("?" * len(appointment_ids))), appointment_ids).fetchall()
+    for row in rows:
+        change_bus.publish({
+            "type": kind,
+            "change_token": row["row_version"],
+            "appointment": _appointment_row_to_dict(row),
+        }, version=row["row_version"])
+
+# Writes made by other processes (other gunicorn workers, bulk tools) don't go
+# through this process' change bus; a watcher thread picks them up from the
+# change sequence while anyone is subscribed.
+EXTERNAL_CHANGE_POLL_SECONDS = float(os.getenv("EXTERNAL_CHANGE_POLL_SECONDS", "2"))
+EXTERNAL_CHANGE_MAX_ROWS = 500
+_watcher_started = False
+_watcher_lock = threading.Lock()
+
+def start_change_watcher(interval=None):
+    global _watcher_started
+    with _watcher_lock:
+        if _watcher_started:
+            return
+        _watcher_started = True
+    thread = threading.Thread(
+        target=_watch_external_changes,
+        args=(interval or EXTERNAL_CHANGE_POLL_SECONDS,),
+        name="appointment-change-watcher",
+        daemon=True,
+    )
+    thread.start()
+
+def _watch_external_changes(interval):
+    last_token = get_change_token()
+    while True:
+        time.sleep(interval)
+        try:
+            token = get_change_token()
+            if token <= last_token or not change_bus.has_subscribers():
+                last_token = max(last_token, token)
+                continue
+            if token - last_token > EXTERNAL_CHANGE_MAX_ROWS:
+                # Too many changes to stream one by one (e.g. a bulk import)
+                change_bus.publish({"type": "resync", "change_token": token})
+            else:
+                for appointment in get_changes_since(last_token):
+                    if not change_bus.was_published(appointment["change_token"]):
+                        change_bus.publish(appointment, version=appointment["change_token"])
+            last_token = token
+        except Exception as e:
+            print("Change watcher error:", e)
+
+@traced("db.get_changes_since")
+def get_changes_since(token):
+    """
+    Change events for every appointment written or deleted after change token
+    `token`, in change order. A deleted appointment's event has type "deleted"
+    and only {"id", "deleted": True} as its appointment.
+    """
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.row_factory = sqlite3.Row
+        cursor.execute("BEGIN")  # rows and tombstones from one snapshot
+        rows = cursor.execute(_APPOINTMENTS_SELECT + " WHERE a.row_version > ? ORDER BY a.row_version", (token,)).fetchall()
+        deleted = cursor.execute(
+            "SELECT appointment_id, row_version FROM AppointmentTombstones WHERE row_version > ?", (token,)).fetchall()
+    changes = [{"type": "changed", "change_token": row["row_version"], "appointment": _appointment_row_to_dict(row)}
+               for row in rows]
+    changes += [{"type": "deleted", "change_token": row["row_version"],
+                 "appointment": {"id": row["appointment_id"], "deleted": True}} for row in deleted]
+    changes.sort(key=lambda change: change["change_token"])
+    return changes
@@ -0,0 +1,231 @@
+import datetime
+import os
+import re
+from functools import lru_cache
+
+from tracing import traced
+
+# Turns the dates and times users (and the LLM) write - "tomorrow", "next
+# Tuesday", "22nd March", "03/22", "5:30 PM" - into "YYYY-MM-DD" and "HH:MM".
+# Every pattern and lookup table is built once at import; a date is read in one
+# pass over its tokens and results are memoized per (text, today).
+
+# Order of day and month in numeric dates like 03/04: "MDY" (March 4) or "DMY" (3 April)
+DATE_ORDER = os.getenv("DATE_ORDER", "MDY").upper()
+
+DATE_FIELDS = ("appointment_date", "old_date", "new_date")
+TIME_FIELDS = ("appointment_time", "old_time", "new_time")
+
+_MONTHS = {
+    "january": 1, "february": 2, "march": 3, "april": 4, "may": 5, "june": 6, "july": 7,
+    "august": 8, "september": 9, "october": 10, "november": 11, "december": 12,
+    "jan": 1, "feb": 2, "mar": 3, "apr": 4, "jun": 6, "jul": 7, "aug": 8,
+    "sep": 9, "sept": 9, "oct": 10, "nov": 11, "dec": 12,
+}
+_WEEKDAYS = {
+    "monday": 0, "tuesday": 1, "wednesday": 2, "thursday": 3, "friday": 4, "saturday": 5, "sunday": 6,
+    "mon": 0, "tue": 1, "tues": 1, "wed": 2, "thu": 3, "thur": 3, "thurs": 3, "fri": 4, "sat": 5, "sun": 6,
+}
+_ORDINAL_WORDS = {
+    "first": 1, "second": 2, "third": 3, "fourth": 4, "fifth": 5, "sixth": 6, "seventh": 7,
+    "eighth": 8, "ninth": 9, "tenth": 10,
+}
+_RELATIVE_DAYS = {"today": 0, "tonight": 0, "tomorrow": 1, "tmrw": 1, "tmr": 1}
+_UNITS = {"day": 1, "days": 1, "week": 7, "weeks": 7}
+
+# Words that carry no date information
+_FILLER = {"on", "the", "of", "at", "for", "a", "an", "by", "appointment", "date", "day", "in", "after", "this",
+           "next", "coming", "week", "weeks", "days", "and", "from", "to", "please"}
+
+_DATE_TOKEN = re.compile(r"""
+      (?P<iso>\d{4}-\d{1,2}-\d{1,2})
+    | (?P<numeric>\d{1,2}[/.-]\d{1,2}(?:[/.-]\d{2}(?:\d{2})?)?)
+    | (?P<year>\d{4})
+    | (?P<number>\d{1,2})(?:st|nd|rd|th)?
+    | (?P<word>[a-z]+)
+""", re.VERBOSE)
+
+_TIME = re.compile(r"""
+    ^(?:at\s+|around\s+)?
+    (?P<hour>\d{1,2})
+    (?:\s*[:.h]\s*(?P<minute>\d{2}))?
+    \s*(?P<period>[ap])?\.?\s*(?(period)m?\.?)
+    (?:\s*o'?clock)?
+    (?=\s|$)
+""", re.VERBOSE | re.IGNORECASE)
+_TIME_WORDS = {"noon": (12, 0), "midday": (12, 0), "midnight": (0, 0)}
+
+
+def _safe_date(year, month, day):
+    try:
+        return datetime.date(year, month, day)
+    except ValueError:
+        return None
+
+
+def _upcoming(today, month, day):
+    """The next `month`/`day` on or after today, rolling over into next year."""
+    date = _safe_date(today.year, month, day)
+    if date is not None and date < today:
+        date = _safe_date(today.year + 1, month, day)
+    return date
+
+
+def _numeric_date(text, today):
+    parts = [int(part) for part in re.split(r"[/.-]", text)]
+    first, second = parts[0], parts[1]
+    month, day = (second, first) if DATE_ORDER == "DMY" else (first, second)
+    if len(parts) == 3:
+        year = parts[2] + 2000 if parts[2] < 100 else parts[2]
+        return _safe_date(year, month, day)
+    return _upcoming(today, month, day)
+
+
+@lru_cache(maxsize=4096)
+def _parse_date(text, today):
+    month = day = year = weekday = None
+    offset = None
+    modifier = None
+    amount = None
+    after = False
+
+    for token in _DATE_TOKEN.finditer(text):
+        kind = token.lastgroup
+        value = token.group(kind)
+        if kind == "iso":
+            year_, month_, day_ = map(int, value.split("-"))
+            return _safe_date(year_, month_, day_)
+        if kind == "numeric":
+            return _numeric_date(value, today)
+        if kind == "year":
+            year = int(value)
+        elif kind == "number":
+            # "in 3 days" vs "3 March"
+            amount = int(value)
+            if day is None:
+                day = amount
+        elif value in _MONTHS:
+            month = _MONTHS[value]
+        elif value in _WEEKDAYS:
+            weekday = _WEEKDAYS[value]
+        elif value in _RELATIVE_DAYS:
+            offset = _RELATIVE_DAYS[value]
+        elif value in _ORDINAL_WORDS:
+            day = _ORDINAL_WORDS[value]
+        elif value in ("next", "this", "coming"):
+            modifier = value
+        elif value == "after":
+            after = True
+        elif value in _UNITS and amount is not None:
+            return today + datetime.timedelta(days=amount * _UNITS[value])
+        elif value == "week" and modifier == "next":
+            return today + datetime.timedelta(days=7)
+        elif value not in _FILLER:
+            return None
+
+    if offset is not None:
+        # "day after tomorrow"
+        return today + datetime.timedelta(days=offset + (1 if after else 0))
+    if month is not None and day is not None:
+        if year is not None:
+            return _safe_date(year, month, day)
+        return _upcoming(today, month, day)
+    if weekday is not None:
+        days_ahead = (weekday - today.weekday()) % 7
+        # "this Friday" may be today; "Friday" and "next Friday" are the next one
+        if days_ahead == 0 and modifier != "this":
+            days_ahead = 7
+        return today + datetime.timedelta(days=days_ahead)
+    if day is not None and month is None and amount == day and 1 <= day <= 31:
+        # "the 15th": the next 15th of a month
+        date = _safe_date(today.year, today.month, day)
+        if date is None or date < today:
+            next_month = today.replace(day=1) + datetime.timedelta(days=32)
+            date = _safe_date(next_month.year, next_month.month, day)
+        return date
+    return None
+
+
+def parse_date(text, today=None):
+    """The date `text` refers to as a datetime.date, or None when it can't be read."""
+    if not text:
+        return None
+    today = today or datetime.date.today()
+    return _parse_date(" ".join(str(text).lower().split()), today)
+
+
+def normalize_date(text, today=None):
+    """
+    "YYYY-MM-DD" for anything parse_date() understands. Other text is returned
+    unchanged and empty values as None, like ai.convert_relative_date().
+    """
+    if not text:
+        return None
+    date = parse_date(text, today)
+    return date.isoformat() if date else text
+
+
+@lru_cache(maxsize=4096)
+def _parse_time(text):
+    if text in _TIME_WORDS:
+        return _TIME_WORDS[text]
+    match = _TIME.match(text)
+    if not match:
+        return None
+    hours = int(match.group("hour"))
+    minutes = int(match.group("minute") or 0)
+    period = (match.group("period") or "").lower()
+    if period:
+        if not 1 <= hours <= 12:
+            return None
+        if period == "p" and hours < 12:
+            hours += 12
+        elif period == "a" and hours == 12:
+            hours = 0
+    if hours > 23 or minutes > 59:
+        return None
+    return hours, minutes
+
+
+def parse_time(text):
+    """(hours, minutes) for times like "5 PM", "5:30pm", "17:30" or "noon", else None."""
+    if not text:
+        return None
+    return _parse_time(" ".join(str(text).lower().split()))
+
+
+def normalize_time(text):
+    """
+    "HH:MM" for anything parse_time() understands. Other text is returned
+    unchanged and empty values as None, like ai.convert_to_24hour_format().
+    """
+    if not text:
+        return None
+    parsed = parse_time(text)
+    return f"{parsed[0]:02d}:{parsed[1]:02d}" if parsed else text
+
+
+@traced()
+def normalize_record(record, today=None):
+    """Normalize the date and time fields of one extracted-details dict in place."""
+    today = today or datetime.date.today()
+    for field in DATE_FIELDS:
+        if record.get(field):
+            record[field] = normalize_date(record[field], today)
+    for field in TIME_FIELDS:
+        if record.get(field):
+            record[field] = normalize_time(record[field])
+    return record
+
+
+def normalize_records(records, today=None):
+    """
+    Batch version of normalize_record() returning new dicts; today's date is
+    read once for the whole batch and repeated values hit the memo tables.
+    """
+    today = today or datetime.date.today()
+    return [normalize_record(dict(record), today) for record in records]
+
+
+def cache_info():
+    return {"dates": _parse_date.cache_info(), "times": _parse_time.cache_info()}
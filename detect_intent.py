@@ -1,25 +1,27 @@
 import os
-from langchain_openai import AzureChatOpenAI
-from crewai import LLM
-from langchain_google_genai import ChatGoogleGenerativeAI
+from llm_client import LazyLLM
+from metrics import record_llm_call
+import singleflight
+from tracing import traced
+from intent_classifier import classify_intent, is_confident
+from prompts import PromptTemplate, register, render as render_prompt
 
-import os
-llm=ChatGoogleGenerativeAI(
-    api_key=os.getenv("GEMINI_API_KEY"),  # <-- Replace with your actual key
-    model="gemini-2.0-flash",
-    temperature=0,
-    max_tokens=None,
-    timeout=None,
-    max_retries=2,
-)
+# Client from llm_client.py (LLM_PROVIDER / INTENT_LLM_PROVIDER), created on first use
+llm = LazyLLM("intent")
 
+@traced()
 def detect_intent(user_input: str) -> str:
     """
     Classify the user's query as 'medical' or 'appointment'.
-    No session or conversation memory is used here.
+    The local classifier answers first; the LLM is only asked when its
+    confidence is below INTENT_CONFIDENCE_THRESHOLD.
     """
+    label, confidence = classify_intent(user_input)
+    if is_confident(confidence):
+        return label
+    return detect_intent_llm(user_input)
 
-    classification_prompt = f"""
+register(PromptTemplate("classify_intent", "", """
     You are a classification agent. The user said: "{user_input}"
 
     Classify this query into exactly one of two categories:
@@ -27,13 +29,25 @@ def detect_intent(user_input: str) -> str:
     2) "appointment" if the user is asking about booking, rescheduling, or canceling appointments, or viewing appointments.
 
     Return ONLY one word: either "medical" or "appointment".
-    """
+    """))
+
+def build_classification_prompt(user_input: str) -> str:
+    return render_prompt("classify_intent", user_input=user_input)
+
+def parse_classification(response: str) -> str:
+    if response.strip().lower().startswith("medical"):
+        return "medical"
+    return "appointment"
 
+def detect_intent_llm(user_input: str) -> str:
+    """
+    Classify the user's query as 'medical' or 'appointment' with the LLM.
+    No session or conversation memory is used here.
+    """
     try:
-        response = llm.invoke(classification_prompt).content.strip().lower()
-        if response.startswith("medical"):
-            return "medical"
-        return "appointment"
+        record_llm_call("detect_intent")
+        response = singleflight.invoke(llm, build_classification_prompt(user_input)).content
+        return parse_classification(response)
     except Exception as e:
         print("LLM Classification Error:", e)
         # Default to 'appointment' on error
@@ -0,0 +1,194 @@
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+
+from intent_classifier import classify_intent
+from prompts import count_tokens, guess_intent
+
+# Offline stand-in for the chat model (LLM_PROVIDER=fake, or behind
+# fake_llm_server.py). It recognises the app's prompts and answers them
+# deterministically - a label for intent classification, extraction JSON, the
+# reply for a follow-up field, a canned medical answer - after a configurable
+# delay, and can inject failures and malformed JSON, so load tests and
+# benchmarks run reproducibly without spending model quota.
+
+# Seconds per call, and the +/- fraction it randomly varies by
+FAKE_LLM_LATENCY = float(os.getenv("FAKE_LLM_LATENCY", "0.2"))
+FAKE_LLM_JITTER = float(os.getenv("FAKE_LLM_JITTER", "0"))
+# Share of calls that raise FakeLLMError, and of extraction answers sent as broken JSON
+FAKE_LLM_FAILURE_RATE = float(os.getenv("FAKE_LLM_FAILURE_RATE", "0"))
+FAKE_LLM_MALFORMED_RATE = float(os.getenv("FAKE_LLM_MALFORMED_RATE", "0"))
+# Streaming speed and length of medical answers
+FAKE_LLM_TOKENS_PER_SECOND = float(os.getenv("FAKE_LLM_TOKENS_PER_SECOND", "50"))
+FAKE_LLM_ANSWER_WORDS = int(os.getenv("FAKE_LLM_ANSWER_WORDS", "60"))
+FAKE_LLM_SEED = int(os.getenv("FAKE_LLM_SEED", "0"))
+
+
+class FakeLLMError(Exception):
+    """An injected model failure."""
+
+
+class FakeMessage:
+    def __init__(self, content, usage_metadata=None):
+        self.content = content
+        # Token counts in LangChain's format, as the real clients report them
+        self.usage_metadata = usage_metadata
+
+
+def _usage(prompt, text):
+    input_tokens, output_tokens = count_tokens(prompt), count_tokens(text)
+    return {"input_tokens": input_tokens, "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens}
+
+
+_QUOTED = {
+    "classify": re.compile(r'The user said: "(.*)"', re.DOTALL),
+    "extract": re.compile(r'\*\*User Input:\*\* "(.*)"', re.DOTALL),
+    "field": re.compile(r'Their reply was: "(.*)"', re.DOTALL),
+    "medical": re.compile(r"\*\*User's Question:\*\* (.*?)\s*\*\*Your Answer:\*\*", re.DOTALL),
+}
+_NAME = re.compile(r"\b(?i:for|name is|i am|i'm)\s+([A-Z][a-z]+(?:\s+[A-Z][a-z]+)?)")
+_TIME = re.compile(r"\b\d{1,2}(?::\d{2})?\s*(?:am|pm)\b|\b\d{1,2}:\d{2}\b", re.IGNORECASE)
+_DATE = re.compile(r"\b(?:today|tomorrow|day after tomorrow|next \w+|\d{4}-\d{2}-\d{2})\b", re.IGNORECASE)
+_DOCTOR = re.compile(r"\bDr\.?\s+[A-Z][a-z]+")
+_WORDS = ("rest drink fluids monitor your symptoms and see a doctor if they get worse or last more than a few "
+          "days common causes include infections allergies and stress treatment depends on the cause").split()
+
+
+def _quoted(kind, prompt):
+    match = _QUOTED[kind].search(prompt)
+    return match.group(1).strip() if match else ""
+
+
+def _first(pattern, text):
+    match = pattern.search(text)
+    return match.group(1) if match and pattern.groups else (match.group(0) if match else None)
+
+
+def extraction_answer(user_input, include_route):
+    """The extraction JSON a well-behaved model would give for `user_input`."""
+    intent = guess_intent(user_input) or "book"
+    answer = {
+        "intent": intent,
+        "name": _first(_NAME, user_input),
+        "appointment_date": _first(_DATE, user_input),
+        "appointment_time": _first(_TIME, user_input),
+        "doctor": _first(_DOCTOR, user_input),
+        "age": None, "gender": None, "contact_number": None, "email": None, "department": None,
+    }
+    if intent == "reschedule":
+        answer.update(old_date=None, old_time=None, new_date=answer["appointment_date"],
+                      new_time=answer["appointment_time"])
+    if include_route:
+        answer["route"] = classify_intent(user_input)[0]
+    return json.dumps(answer)
+
+
+def medical_answer(question):
+    """A canned answer of FAKE_LLM_ANSWER_WORDS words, the same for the same question."""
+    seed = int(hashlib.sha256(question.encode("utf-8")).hexdigest()[:8], 16)
+    words = [_WORDS[(seed + i) % len(_WORDS)] for i in range(FAKE_LLM_ANSWER_WORDS)]
+    return f"About {question.rstrip('?.!')}: " + " ".join(words).capitalize() + "."
+
+
+def answer(prompt):
+    """Deterministic answer to one of the app's prompts."""
+    if "Return ONLY one word" in prompt:
+        return classify_intent(_quoted("classify", prompt))[0]
+    if "Return only a valid JSON object" in prompt:
+        return extraction_answer(_quoted("extract", prompt), include_route='"route"' in prompt)
+    if "Their reply was:" in prompt:
+        return _quoted("field", prompt) or "NONE"
+    return medical_answer(_quoted("medical", prompt) or prompt.strip()[:80])
+
+
+class FakeChatModel:
+    """Duck-typed chat model: invoke, ainvoke, stream and astream, like the LangChain clients."""
+
+    _llm_type = "fake"
+
+    def __init__(self, model="fake", latency=None, jitter=None, failure_rate=None, malformed_rate=None,
+                 tokens_per_second=None, seed=None):
+        self.model = model
+        self.latency = FAKE_LLM_LATENCY if latency is None else latency
+        self.jitter = FAKE_LLM_JITTER if jitter is None else jitter
+        self.failure_rate = FAKE_LLM_FAILURE_RATE if failure_rate is None else failure_rate
+        self.malformed_rate = FAKE_LLM_MALFORMED_RATE if malformed_rate is None else malformed_rate
+        self.tokens_per_second = FAKE_LLM_TOKENS_PER_SECOND if tokens_per_second is None else tokens_per_second
+        self._random = random.Random(FAKE_LLM_SEED if seed is None else seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.failures = 0
+
+    def _plan(self, prompt):
+        """(delay, prompt text, text) for one call; text is None for an injected failure."""
+        prompt = _prompt_text(prompt)
+        with self._lock:
+            self.calls += 1
+            delay = self.latency * (1 + self.jitter * (2 * self._random.random() - 1))
+            fail = self._random.random() < self.failure_rate
+            malformed = self._random.random() < self.malformed_rate
+            if fail:
+                self.failures += 1
+        if fail:
+            return max(delay, 0.0), prompt, None
+        text = answer(prompt)
+        if malformed and text.startswith("{"):
+            # The slips structured_output.loads() has to repair
+            text = "Here is the JSON:\n```json\n" + text[:-1] + ",}\n```"
+        return max(delay, 0.0), prompt, text
+
+    def _pieces(self, text):
+        words = text.split(" ")
+        return [word + (" " if i < len(words) - 1 else "") for i, word in enumerate(words)]
+
+    def invoke(self, prompt, **kwargs):
+        delay, prompt, text = self._plan(prompt)
+        time.sleep(delay)
+        if text is None:
+            raise FakeLLMError("injected failure")
+        return FakeMessage(text, _usage(prompt, text))
+
+    async def ainvoke(self, prompt, **kwargs):
+        delay, prompt, text = self._plan(prompt)
+        await asyncio.sleep(delay)
+        if text is None:
+            raise FakeLLMError("injected failure")
+        return FakeMessage(text, _usage(prompt, text))
+
+    def stream(self, prompt, **kwargs):
+        # FAKE_LLM_LATENCY is the time to the first piece
+        delay, prompt, text = self._plan(prompt)
+        time.sleep(delay)
+        if text is None:
+            raise FakeLLMError("injected failure")
+        for piece in self._pieces(text):
+            yield FakeMessage(piece)
+            if self.tokens_per_second:
+                time.sleep(1 / self.tokens_per_second)
+        # Usage comes on a final empty chunk, like OpenAI's stream_options include_usage
+        yield FakeMessage("", _usage(prompt, text))
+
+    async def astream(self, prompt, **kwargs):
+        delay, prompt, text = self._plan(prompt)
+        await asyncio.sleep(delay)
+        if text is None:
+            raise FakeLLMError("injected failure")
+        for piece in self._pieces(text):
+            yield FakeMessage(piece)
+            if self.tokens_per_second:
+                await asyncio.sleep(1 / self.tokens_per_second)
+        yield FakeMessage("", _usage(prompt, text))
+
+
+def _prompt_text(prompt):
+    # A plain string from the app, or chat messages from fake_llm_server.py
+    if isinstance(prompt, str):
+        return prompt
+    return "\n".join(str(message["content"] if isinstance(message, dict) else getattr(message, "content", message))
+                     for message in prompt)
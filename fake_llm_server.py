@@ -0,0 +1,139 @@
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from fake_llm import FakeChatModel, FakeLLMError
+
+# OpenAI-compatible HTTP server in front of fake_llm.FakeChatModel, so a load
+# test exercises the real client and network path offline:
+#
+#     python fake_llm_server.py --port 8001 --latency 0.5
+#     LLM_PROVIDER=openai LLM_BASE_URL=http://127.0.0.1:8001/v1 gunicorn app:app
+#
+# Serves POST /v1/chat/completions, streaming or not. Latency, failure and
+# malformed-answer injection take the FAKE_LLM_* settings or the flags below.
+
+
+def make_handler(model):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _send_json(self, status, payload):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+                return
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            messages = request.get("messages", [])
+            completion = {"id": f"fake-{time.time_ns()}", "created": int(time.time()),
+                          "model": request.get("model") or model.model}
+            try:
+                if request.get("stream"):
+                    include_usage = (request.get("stream_options") or {}).get("include_usage", False)
+                    self._stream(model.stream(messages), completion, include_usage)
+                    return
+                message = model.invoke(messages)
+            except FakeLLMError as e:
+                self._send_json(500, {"error": {"message": str(e), "type": "server_error"}})
+                return
+            self._send_json(200, {
+                **completion, "object": "chat.completion",
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": message.content}}],
+                "usage": _openai_usage(message.usage_metadata),
+            })
+
+        def _stream(self, pieces, completion, include_usage=False):
+            # The first piece is awaited before the headers so an injected
+            # failure can still be answered with a 500
+            pieces = iter(pieces)
+            first = next(pieces, None)
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.close_connection = True
+
+            def send(delta, finish_reason=None):
+                chunk = {**completion, "object": "chat.completion.chunk",
+                         "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                self.wfile.flush()
+
+            send({"role": "assistant", "content": ""})
+            usage = None
+            for piece in _chain(first, pieces):
+                if piece.content:
+                    send({"content": piece.content})
+                usage = piece.usage_metadata or usage
+            send({}, "stop")
+            if include_usage and usage:
+                chunk = {**completion, "object": "chat.completion.chunk", "choices": [],
+                         "usage": _openai_usage(usage)}
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def _chain(first, rest):
+    if first is not None:
+        yield first
+    yield from rest
+
+
+def _openai_usage(usage):
+    usage = usage or {}
+    return {"prompt_tokens": usage.get("input_tokens", 0), "completion_tokens": usage.get("output_tokens", 0),
+            "total_tokens": usage.get("total_tokens", 0)}
+
+
+class FakeLLMServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+def start_server(model=None, host="127.0.0.1", port=0):
+    """Serve `model` (a FakeChatModel) in a background thread; port 0 picks a free one."""
+    server = FakeLLMServer((host, port), make_handler(model or FakeChatModel()))
+    threading.Thread(target=server.serve_forever, name="fake-llm-server", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenAI-compatible offline stand-in model server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", type=float, help="seconds per call (FAKE_LLM_LATENCY)")
+    parser.add_argument("--jitter", type=float, help="+/- fraction of the latency (FAKE_LLM_JITTER)")
+    parser.add_argument("--failure-rate", type=float, help="share of calls answered with a 500")
+    parser.add_argument("--malformed-rate", type=float, help="share of JSON answers sent malformed")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    model = FakeChatModel(latency=args.latency, jitter=args.jitter, failure_rate=args.failure_rate,
+                          malformed_rate=args.malformed_rate, seed=args.seed)
+    server = FakeLLMServer((args.host, args.port), make_handler(model))
+    print(f"Fake LLM serving on http://{args.host}:{server.server_address[1]}/v1 "
+          f"(latency {model.latency}s, failure rate {model.failure_rate})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
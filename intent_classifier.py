@@ -0,0 +1,67 @@
+import math
+import os
+import re
+
+# Rule-scored intent model. Each feature is a regex with a weight; positive weights
+# push towards "medical", negative weights towards "appointment". The summed score
+# goes through a sigmoid to give P(medical).
+#
+# Everything is compiled once at import so classify_intent() is just a handful of
+# regex searches per message.
+
+BIAS = 0.0
+
+FEATURES = [
+    # Appointment vocabulary
+    (r"\b(book|booking|schedule|reschedul\w*|cancel\w*|postpone|appointments?|appt)\b", -4.0),
+    (r"\b(slot|available|availability|visit|consultation|reserve)\b", -1.5),
+    (r"\b(show|view|list|see)\s+(me\s+)?(my|all)\b", -2.0),
+    (r"\b(today|tomorrow|tonight|next\s+week|day\s+after\s+tomorrow)\b", -1.5),
+    (r"\b(mon|tues|wednes|thurs|fri|satur|sun)day\b", -1.5),
+    (r"\b(jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\.?\s*\d{1,2}\b", -1.5),
+    (r"\b\d{1,2}(:\d{2})?\s*(am|pm)\b|\b\d{1,2}:\d{2}\b", -2.0),
+    (r"\bdr\.?\s+[a-z]+", -1.5),
+    (r"\b(cardiology|neurology|pediatrics|orthopedics|dermatology|gynecology|oncology|psychiatry|radiology|urology)\b", -1.0),
+    (r"[\w.+-]+@[\w-]+\.[\w.]+|\+?\d[\d\s-]{7,}\d", -2.0),
+    (r"\b(my name is|i am \d+|years old|patient)\b", -1.0),
+
+    # Medical vocabulary
+    (r"\b(symptoms?|diseases?|disorders?|conditions?|syndrome|diagnos\w*|treat\w*|cures?|therapy)\b", 3.0),
+    (r"\b(medicines?|medications?|drugs?|pills?|tablets?|dose|dosage|side\s+effects?|antibiotics?|vaccines?|paracetamol|ibuprofen)\b", 3.0),
+    (r"\b(fever|cough|cold|flu|pain|aches?|headache|migraine|rash|itch\w*|nausea|vomit\w*|diarrh\w*|dizz\w*|fatigue|sore|swelling|bleeding|infection|allerg\w*)\b", 2.5),
+    (r"\b(diabetes|cancer|asthma|hypertension|blood\s+pressure|cholesterol|covid|pregnan\w*|anxiety|depression|insomnia|arthritis)\b", 2.5),
+    (r"\b(hurts?|feel(ing)?\s+(sick|unwell|dizzy|tired)|is\s+it\s+(normal|serious|safe)|should\s+i)\b", 2.0),
+    (r"^(what|why|how|is|are|can|does|do|should)\b", 1.0),
+    (r"\b(causes?|prevent\w*|risk|healthy|diet|vitamins?|exercise)\b", 1.5),
+]
+
+_COMPILED_FEATURES = [(re.compile(pattern, re.IGNORECASE), weight) for pattern, weight in FEATURES]
+
+# Below this confidence detect_intent() escalates to the LLM. On the held-out set
+# (benchmarks/bench_intent_routing.py) 0.9 answers 24% of messages locally but
+# gets 3 of those 24 wrong, all messages that mix symptoms with a booking; 0.98
+# answers 11% with 1 wrong
+CONFIDENCE_THRESHOLD = float(os.getenv("INTENT_CONFIDENCE_THRESHOLD", "0.98"))
+
+
+def classify_intent(user_input):
+    """
+    Classify the query locally as 'medical' or 'appointment'.
+    Returns (label, confidence) where confidence is between 0.5 and 1.0.
+    """
+    text = (user_input or "").strip()
+    score = BIAS
+    for pattern, weight in _COMPILED_FEATURES:
+        if pattern.search(text):
+            score += weight
+
+    p_medical = 1.0 / (1.0 + math.exp(-score))
+    if p_medical >= 0.5:
+        return "medical", p_medical
+    return "appointment", 1.0 - p_medical
+
+
+def is_confident(confidence, threshold=None):
+    if threshold is None:
+        threshold = CONFIDENCE_THRESHOLD
+    return confidence >= threshold
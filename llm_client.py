@@ -0,0 +1,123 @@
+import os
+import threading
+from dotenv import load_dotenv
+
+# Chat model clients for the intent, extraction and medical agents, one per
+# provider and shared by every agent using it. Nothing is imported or
+# constructed until the first model call (or warm_up()), so importing app.py
+# stays fast; a provider's package is only imported when it is selected.
+#
+# Providers: "gemini" (default), "azure" (Azure OpenAI), "openai" (any
+# OpenAI-compatible endpoint at LLM_BASE_URL, e.g. a local model server or
+# fake_llm_server.py) and "fake" (fake_llm.FakeChatModel in-process, no
+# network). LLM_PROVIDER picks the provider for every agent; INTENT_LLM_PROVIDER,
+# EXTRACTION_LLM_PROVIDER and MEDICAL_LLM_PROVIDER override it per agent.
+
+load_dotenv()
+
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "gemini").lower()
+# Model name; each provider has its own default
+LLM_MODEL = os.getenv("LLM_MODEL")
+LLM_TEMPERATURE = float(os.getenv("LLM_TEMPERATURE", "0"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+# Build the client in a background thread when the app starts
+LLM_WARMUP = os.getenv("LLM_WARMUP", "true").lower() not in ("0", "false", "no")
+
+_clients = {}
+_lock = threading.Lock()
+
+
+def _create_gemini():
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    return ChatGoogleGenerativeAI(
+        api_key=os.getenv("GEMINI_API_KEY"),
+        model=LLM_MODEL or "gemini-2.0-flash",
+        temperature=LLM_TEMPERATURE,
+        max_tokens=None,
+        timeout=None,
+        max_retries=LLM_MAX_RETRIES,
+    )
+
+
+def _create_azure():
+    from langchain_openai import AzureChatOpenAI
+    return AzureChatOpenAI(
+        azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
+        azure_deployment=os.getenv("AZURE_OPENAI_DEPLOYMENT", LLM_MODEL or "gpt-4o"),
+        api_version=os.getenv("AZURE_OPENAI_API_VERSION", "2023-09-01-preview"),
+        api_key=os.getenv("AZURE_OPENAI_API_KEY"),
+        temperature=LLM_TEMPERATURE,
+        max_retries=LLM_MAX_RETRIES,
+    )
+
+
+def _create_openai():
+    from langchain_openai import ChatOpenAI
+    return ChatOpenAI(
+        base_url=os.getenv("LLM_BASE_URL") or None,
+        # Local servers usually accept any key
+        api_key=os.getenv("OPENAI_API_KEY") or "not-needed",
+        model=LLM_MODEL or "gpt-4o-mini",
+        temperature=LLM_TEMPERATURE,
+        max_retries=LLM_MAX_RETRIES,
+        # Token usage on streamed answers too, for the /metrics token counts
+        stream_usage=True,
+    )
+
+
+def _create_fake():
+    from fake_llm import FakeChatModel
+    return FakeChatModel(model=LLM_MODEL or "fake")
+
+
+PROVIDERS = {"gemini": _create_gemini, "azure": _create_azure, "openai": _create_openai, "fake": _create_fake}
+
+
+def provider_for(agent):
+    """The provider `agent` ("intent", "extraction" or "medical") uses."""
+    return (os.getenv(f"{agent.upper()}_LLM_PROVIDER") or LLM_PROVIDER).lower()
+
+
+def get_llm(provider=None):
+    """The shared client for `provider` (default LLM_PROVIDER), created on first use."""
+    provider = provider or LLM_PROVIDER
+    client = _clients.get(provider)
+    if client is None:
+        with _lock:
+            client = _clients.get(provider)
+            if client is None:
+                if provider not in PROVIDERS:
+                    raise ValueError(f"Unknown LLM_PROVIDER {provider!r}, expected one of {sorted(PROVIDERS)}")
+                client = _clients[provider] = PROVIDERS[provider]()
+    return client
+
+
+class LazyLLM:
+    """
+    Stands in for an agent's client at module level (ai.llm, detect_intent.llm,
+    medical_ai.medical_ai): attribute access is forwarded to get_llm(), which
+    builds the client the first time it is needed.
+    """
+
+    def __init__(self, agent=None):
+        self._provider = provider_for(agent) if agent else None
+
+    def __getattr__(self, name):
+        return getattr(get_llm(self._provider), name)
+
+    def __repr__(self):
+        return f"LazyLLM({self._provider or LLM_PROVIDER!r})"
+
+
+def warm_up():
+    """Build the clients of all agents in a daemon thread, off the request path."""
+    def build():
+        try:
+            for provider in {provider_for(agent) for agent in ("intent", "extraction", "medical")}:
+                get_llm(provider)
+        except Exception as e:
+            print(f"LLM client warm-up failed: {e}")
+
+    thread = threading.Thread(target=build, name="llm-warm-up", daemon=True)
+    thread.start()
+    return thread
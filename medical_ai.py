@@ -1,38 +1,152 @@
 import os
+import time
 from dotenv import load_dotenv
-from crewai import LLM
 # from langchain_community.chat_models import ChatTogether
-from langchain_google_genai import ChatGoogleGenerativeAI
+from llm_client import LazyLLM
+from metrics import record_llm_call, record_duration
+from response_cache import ResponseCache, template_version
+from semantic_cache import create_semantic_cache
+from prompts import PromptTemplate, register, render as render_prompt
+import singleflight
+from tracing import record_usage, traced
 import os
 from dotenv import load_dotenv
 # Load environment variables
 load_dotenv()
 
 
-medical_ai=ChatGoogleGenerativeAI(
-    api_key=os.getenv("GEMINI_API_KEY"),  # <-- Replace with your actual key
-    model="gemini-2.0-flash",
-    temperature=0,
-    max_tokens=None,
-    timeout=None,
-    max_retries=2,
-)
-def handle_medical_query(user_input):
-    """
-    Processes medical-related queries and provides an AI-generated response.
-    """
+# Client from llm_client.py (LLM_PROVIDER / MEDICAL_LLM_PROVIDER), created on first use
+medical_ai = LazyLLM("medical")
 
-    prompt = f"""
+MEDICAL_PROMPT_TEMPLATE = """
     You are Dr. AI, a licensed medical professional. Provide factual and helpful medical information in clear and concise language. If a question is outside your medical knowledge, politely state that you cannot answer. Use plain text only, without special characters or markdown formatting.
 
     **User's Question:** {user_input}
     
     **Your Answer:**
     """
+register(PromptTemplate("medical", "", MEDICAL_PROMPT_TEMPLATE))
 
-    try:
-        response = medical_ai.invoke(prompt).content.strip()
-        return response
+# The model runs at temperature 0, so answers to the same question can be reused.
+# Changing MEDICAL_PROMPT_TEMPLATE changes the cache version and drops old answers.
+MEDICAL_CACHE_ENABLED = os.getenv("MEDICAL_CACHE_ENABLED", "true").lower() not in ("0", "false", "no")
+MEDICAL_CACHE_TTL = int(os.getenv("MEDICAL_CACHE_TTL", str(7 * 24 * 3600)))
+medical_cache = None
+if MEDICAL_CACHE_ENABLED:
+    medical_cache = ResponseCache(
+        os.getenv("MEDICAL_CACHE_PATH", "medical_cache.sqlite3"),
+        version=template_version(MEDICAL_PROMPT_TEMPLATE),
+        max_entries=int(os.getenv("MEDICAL_CACHE_MAX_ENTRIES", "10000")),
+        ttl_seconds=MEDICAL_CACHE_TTL,
+    )
+
+# Paraphrases of already answered questions are served from the semantic cache,
+# which is warmed with the answers kept in the exact-match cache. Its entries
+# expire with theirs and are only served while the exact cache still holds
+# them. Off by default without a sentence embedding model: the hashing
+# fallback can't tell a paraphrase from a different question often enough
+SEMANTIC_CACHE_ENABLED = os.getenv(
+    "SEMANTIC_CACHE_ENABLED", "true" if os.getenv("SEMANTIC_CACHE_MODEL") else "false"
+).lower() not in ("0", "false", "no")
+semantic_cache = None
+if SEMANTIC_CACHE_ENABLED:
+    semantic_cache = create_semantic_cache(MEDICAL_CACHE_TTL,
+                                           medical_cache.touch if medical_cache is not None else None)
+    if medical_cache is not None:
+        for question, answer, created_at in medical_cache.entries()[-semantic_cache.max_entries:]:
+            semantic_cache.add(question, answer, created_at + MEDICAL_CACHE_TTL if MEDICAL_CACHE_TTL else None)
+
+def get_cached_answer(user_input):
+    """Answer from the exact or semantic cache, or None."""
+    if medical_cache is not None:
+        cached = medical_cache.get(user_input)
+        if cached is not None:
+            return cached
 
+    if semantic_cache is not None:
+        match = semantic_cache.lookup(user_input)
+        if match is not None:
+            return match[0]
+    return None
+
+def store_answer(user_input, response):
+    if response:
+        if medical_cache is not None:
+            medical_cache.set(user_input, response)
+        if semantic_cache is not None:
+            semantic_cache.add(user_input, response)
+
+@traced()
+def handle_medical_query(user_input):
+    """
+    Processes medical-related queries and provides an AI-generated response.
+    """
+    cached = get_cached_answer(user_input)
+    if cached is not None:
+        return cached
+
+    prompt = render_prompt("medical", user_input=user_input)
+
+    start = time.perf_counter()
+    try:
+        record_llm_call("handle_medical_query")
+        response = singleflight.invoke(medical_ai, prompt).content.strip()
     except Exception as e:
         return f"Error processing medical query: {str(e)}"
+    record_duration("medical_generation_seconds", time.perf_counter() - start)
+
+    store_answer(user_input, response)
+    return response
+
+def stream_medical_query(user_input):
+    """
+    Like handle_medical_query() but yields the answer piece by piece as the
+    model generates it. The complete answer is cached once the stream ends.
+    The same question asked while it is being answered waits for that answer
+    and gets it in one piece.
+    """
+    cached = get_cached_answer(user_input)
+    if cached is not None:
+        yield cached
+        return
+
+    prompt = render_prompt("medical", user_input=user_input)
+    key = singleflight.call_key(medical_ai, prompt)
+    call, leader = singleflight.flights.begin(key) if singleflight.SINGLE_FLIGHT else (None, True)
+    if not leader:
+        try:
+            yield singleflight.flights.wait(call)
+        except Exception as e:
+            yield f"Error processing medical query: {str(e)}"
+        return
+
+    chunks = []
+    answer = None
+    error = None
+    start = time.perf_counter()
+    try:
+        record_llm_call("stream_medical_query")
+        for chunk in medical_ai.stream(prompt):
+            # Providers report usage on the last chunk, or spread over all of them
+            record_usage(chunk, "stream_medical_query")
+            if not chunk.content:
+                continue
+            if not chunks:
+                record_duration("medical_first_token_seconds", time.perf_counter() - start)
+            chunks.append(chunk.content)
+            yield chunk.content
+        answer = "".join(chunks).strip()
+    except Exception as e:
+        error = e
+        yield f"Error processing medical query: {str(e)}"
+        return
+    except BaseException as e:
+        # Closed before the end (client went away)
+        error = e
+        raise
+    finally:
+        if call is not None:
+            singleflight.flights.finish(key, call, result=answer, error=error)
+    record_duration("medical_generation_seconds", time.perf_counter() - start)
+
+    store_answer(user_input, answer)
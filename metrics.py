@@ -0,0 +1,287 @@
+import math
+import re
+import threading
+from bisect import bisect_left
+from collections import Counter
+from contextvars import ContextVar
+
+# LLM calls made while serving the current request. A ContextVar works for both
+# the threaded Flask workers and asyncio tasks.
+_request_llm_calls = ContextVar("request_llm_calls", default=None)
+
+# SQL statements run while serving the current request, as a one-item list so
+# threads started with the request's context (asyncio.to_thread) add to it
+_request_db_queries = ContextVar("request_db_queries", default=None)
+
+# Process-wide totals per stage, e.g. {"detect_intent": 12, "route_and_extract": 40}
+_llm_call_totals = Counter()
+_lock = threading.Lock()
+
+# Chat turns served, and how many of them needed no model call at all
+_turns = Counter()
+
+# Outcomes of parsing the extraction model's JSON answers: "parsed" (valid as
+# returned), "repaired" (recovered by the tolerant parser) and "failed"
+_parses = Counter()
+
+# Process-wide timing totals, e.g. {"medical_ttfb_seconds": {"count", "sum", "max"}}
+_durations = {}
+
+# Upper bounds of the latency histogram buckets, in seconds
+HISTOGRAM_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# {(metric, labels): [bucket counts..., +Inf count, sum]}; labels is a tuple of (name, value) pairs
+_histograms = {}
+
+# Model tokens per (stage, "input" or "output"), as reported by the provider
+_llm_tokens = Counter()
+
+# HTTP responses per (path, method, status)
+_http_requests = Counter()
+
+
+def reset_llm_calls():
+    """Start counting LLM calls for a new request."""
+    _request_llm_calls.set([])
+
+
+def record_llm_call(stage):
+    """Record one model round-trip made by `stage` (usually the calling function)."""
+    calls = _request_llm_calls.get()
+    if calls is None:
+        calls = []
+        _request_llm_calls.set(calls)
+    calls.append(stage)
+    with _lock:
+        _llm_call_totals[stage] += 1
+
+
+def request_llm_calls():
+    """Stages of the LLM calls made so far for the current request, in order."""
+    return list(_request_llm_calls.get() or [])
+
+
+def llm_call_totals():
+    with _lock:
+        return dict(_llm_call_totals)
+
+
+def reset_db_queries():
+    """Start counting SQL statements for a new request."""
+    _request_db_queries.set([0])
+
+
+def record_db_query():
+    """Count one SQL statement; called by database.py for every statement it runs."""
+    count = _request_db_queries.get()
+    if count is not None:
+        count[0] += 1
+
+
+def request_db_queries():
+    """SQL statements run so far for the current request."""
+    count = _request_db_queries.get()
+    return count[0] if count is not None else 0
+
+
+def record_duration(name, seconds):
+    """Add one timing sample, in seconds, to the `name` totals."""
+    with _lock:
+        totals = _durations.setdefault(name, {"count": 0, "sum": 0.0, "max": 0.0})
+        totals["count"] += 1
+        totals["sum"] += seconds
+        totals["max"] = max(totals["max"], seconds)
+
+
+def duration_totals():
+    with _lock:
+        return {name: dict(totals) for name, totals in _durations.items()}
+
+
+def record_turn(llm_calls):
+    """Count one chat turn that made `llm_calls` model calls."""
+    with _lock:
+        _turns["turns"] += 1
+        if not llm_calls:
+            _turns["local_turns"] += 1
+
+
+def turn_stats():
+    """{"turns", "local_turns", "local_fraction"}; local turns made no LLM call."""
+    with _lock:
+        turns, local_turns = _turns["turns"], _turns["local_turns"]
+    return {"turns": turns, "local_turns": local_turns,
+            "local_fraction": local_turns / turns if turns else 0.0}
+
+
+def record_parse(outcome):
+    """Count one extraction answer parsed with `outcome`: "parsed", "repaired" or "failed"."""
+    with _lock:
+        _parses[outcome] += 1
+
+
+def parse_stats():
+    """
+    {"responses", "parsed", "repaired", "failed", "failure_rate", "retries_saved"};
+    every repaired answer is a round-trip the user would otherwise have retried.
+    """
+    with _lock:
+        parsed, repaired, failed = _parses["parsed"], _parses["repaired"], _parses["failed"]
+    responses = parsed + repaired + failed
+    return {"responses": responses, "parsed": parsed, "repaired": repaired, "failed": failed,
+            "failure_rate": failed / responses if responses else 0.0,
+            "retries_saved": repaired}
+
+
+def histogram(metric, labels=()):
+    """
+    The `metric` histogram series for `labels` (a tuple of (name, value) pairs),
+    created if needed. Hot paths keep it and pass it to observe_histogram().
+    """
+    key = (metric, labels)
+    with _lock:
+        series = _histograms.get(key)
+        if series is None:
+            series = _histograms[key] = [0] * (len(HISTOGRAM_BUCKETS) + 1) + [0.0]
+    return series
+
+
+def observe_histogram(series, seconds):
+    index = bisect_left(HISTOGRAM_BUCKETS, seconds)
+    with _lock:
+        series[index] += 1
+        series[-1] += seconds
+
+
+def observe(metric, seconds, labels=()):
+    """Add one sample to the `metric` histogram; `labels` is a tuple of (name, value) pairs."""
+    observe_histogram(histogram(metric, labels), seconds)
+
+
+def histograms():
+    """{(metric, labels): {"buckets": {upper bound: cumulative count}, "count", "sum"}}"""
+    with _lock:
+        snapshot = {key: list(histogram) for key, histogram in _histograms.items()}
+    result = {}
+    for key, histogram in snapshot.items():
+        cumulative, buckets = 0, {}
+        for bound, count in zip(HISTOGRAM_BUCKETS + (math.inf,), histogram[:-1]):
+            cumulative += count
+            buckets[bound] = cumulative
+        result[key] = {"buckets": buckets, "count": cumulative, "sum": histogram[-1]}
+    return result
+
+
+def record_llm_tokens(stage, input_tokens, output_tokens):
+    """Count the prompt and completion tokens of one model call made by `stage`."""
+    with _lock:
+        _llm_tokens[(stage, "input")] += input_tokens or 0
+        _llm_tokens[(stage, "output")] += output_tokens or 0
+
+
+def llm_token_totals():
+    """{stage: {"input", "output"}}"""
+    with _lock:
+        counts = dict(_llm_tokens)
+    totals = {}
+    for (stage, kind), count in counts.items():
+        totals.setdefault(stage, {"input": 0, "output": 0})[kind] = count
+    return totals
+
+
+def record_http_request(path, method, status, seconds):
+    """Count one response and add its duration to the per-path latency histogram."""
+    with _lock:
+        _http_requests[(path, method, status)] += 1
+    observe("http_request_duration_seconds", seconds, (("path", path), ("method", method)))
+
+
+_HISTOGRAM_HELP = {
+    "span_duration_seconds": "Time spent in traced functions (see tracing.py).",
+    "http_request_duration_seconds": "Time to produce an HTTP response, to the end of the body for streams.",
+}
+
+_METRIC_NAME_INVALID = re.compile(r"[^a-zA-Z0-9_]")
+
+
+def _metric_name(*parts):
+    return _METRIC_NAME_INVALID.sub("_", "_".join(("medchat",) + parts))
+
+
+def _label_value(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_label_value(value)}"' for name, value in pairs) + "}"
+
+
+def _number(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def prometheus_text(sections=()):
+    """
+    Every metric in the Prometheus text exposition format. `sections` adds
+    other modules' stats as (name, stats, label) triples: stats is
+    {key: number}, or {label value: {key: number}} when `label` is given.
+    """
+    lines = []
+
+    def family(name, kind, help_text, samples):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for suffix, labels, value in samples:
+            lines.append(f"{name}{suffix}{_labels(labels)} {_number(value)}")
+
+    with _lock:
+        llm_calls = sorted(_llm_call_totals.items())
+        tokens = sorted(_llm_tokens.items())
+        http_requests = sorted(_http_requests.items())
+        turns = dict(_turns)
+        parses = dict(_parses)
+    family(_metric_name("llm_calls_total"), "counter", "Model round-trips by stage.",
+           [("", (("stage", stage),), count) for stage, count in llm_calls])
+    family(_metric_name("llm_tokens_total"), "counter", "Model tokens by stage and direction.",
+           [("", (("stage", stage), ("kind", kind)), count) for (stage, kind), count in tokens])
+    family(_metric_name("http_requests_total"), "counter", "HTTP responses by path, method and status.",
+           [("", (("path", path), ("method", method), ("status", status)), count)
+            for (path, method, status), count in http_requests])
+    family(_metric_name("chat_turns_total"), "counter", "Chat turns served.", [("", (), turns.get("turns", 0))])
+    family(_metric_name("chat_local_turns_total"), "counter", "Chat turns served without a model call.",
+           [("", (), turns.get("local_turns", 0))])
+    family(_metric_name("extraction_parses_total"), "counter", "Extraction answers by parse outcome.",
+           [("", (("outcome", outcome),), parses.get(outcome, 0)) for outcome in ("parsed", "repaired", "failed")])
+
+    for name, totals in sorted(duration_totals().items()):
+        family(_metric_name(name), "summary", f"{name} samples.",
+               [("_count", (), totals["count"]), ("_sum", (), totals["sum"])])
+        family(_metric_name(name, "max"), "gauge", f"Largest {name} sample.", [("", (), totals["max"])])
+
+    by_metric = {}
+    for (metric, labels), values in sorted(histograms().items()):
+        by_metric.setdefault(metric, []).append((labels, values))
+    for metric, series in by_metric.items():
+        samples = []
+        for labels, values in series:
+            samples += [("_bucket", labels + (("le", _number(bound)),), count)
+                        for bound, count in values["buckets"].items()]
+            samples += [("_count", labels, values["count"]), ("_sum", labels, values["sum"])]
+        family(_metric_name(metric), "histogram", _HISTOGRAM_HELP.get(metric, metric), samples)
+
+    for section, stats, label in sections:
+        rows = stats.items() if label else [(None, stats)]
+        series = {}
+        for label_value, values in rows:
+            for key, value in values.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    labels = ((label, label_value),) if label else ()
+                    series.setdefault(key, []).append(("", labels, value))
+        for key, samples in series.items():
+            family(_metric_name(section, key), "untyped", f"{section} {key.replace('_', ' ')}.", samples)
+
+    return "\n".join(lines) + "\n"
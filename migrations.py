@@ -0,0 +1,370 @@
+import datetime
+
+from schedule import format_minutes, minute_of_day
+
+# Ordered schema migrations. Each entry is (version, description, steps) where a
+# step is either an SQL statement or a function taking the connection. Applied
+# versions are recorded in the schema_version table; apply_migrations() runs the
+# missing ones in order, each in its own transaction. Never edit a migration that
+# has shipped - add a new one instead.
+
+
+def _insert_sample_doctors(conn):
+    # Insert sample doctors if table is empty
+    if conn.execute("SELECT COUNT(*) FROM Doctors").fetchone()[0] == 0:
+        sample_doctors = [
+            ("DOC001", "Dr. Smith", "Cardiology"),
+            ("DOC002", "Dr. Johnson", "Neurology"),
+            ("DOC003", "Dr. Williams", "Pediatrics"),
+            ("DOC004", "Dr. Brown", "Orthopedics"),
+            ("DOC005", "Dr. Jones", "Dermatology")
+        ]
+        conn.executemany("INSERT INTO Doctors (doctor_id, name, specialization) VALUES (?, ?, ?)", sample_doctors)
+
+
+def _cancel_double_bookings(conn):
+    # The unique slot index can't be built while a slot is booked twice. Rather
+    # than refuse to start, keep the earliest booking of each slot (lowest rowid)
+    # and cancel the others, listing them so they can be followed up
+    duplicates = conn.execute('''
+        SELECT a.appointment_id, a.doctor_id, a.date, a.time FROM Appointments a
+        WHERE a.status != 'Cancelled' AND EXISTS (
+            SELECT 1 FROM Appointments b
+            WHERE b.doctor_id = a.doctor_id AND b.date = a.date AND b.time = a.time
+              AND b.status != 'Cancelled' AND b.rowid < a.rowid)
+        ORDER BY a.rowid
+    ''').fetchall()
+    if duplicates:
+        conn.executemany("UPDATE Appointments SET status = 'Cancelled' WHERE appointment_id = ?",
+                         [(appointment_id,) for appointment_id, _, _, _ in duplicates])
+        print(f"Cancelled {len(duplicates)} double-booked appointments, keeping the earliest booking of each slot: "
+              + ", ".join(f"{appointment_id} (doctor {doctor} {date} {time})"
+                          for appointment_id, doctor, date, time in duplicates))
+
+
+def _normalize_appointment_times(conn):
+    # Older rows were stored as typed ("4 PM", "1:00"), so they matched neither
+    # the HH:MM lookups nor the unique slot index. Times that can't be read are
+    # left as they are and listed
+    rewrites, unreadable = [], []
+    for appointment_id, time_text in conn.execute("SELECT appointment_id, time FROM Appointments"):
+        minute = minute_of_day(time_text)
+        if minute is None:
+            unreadable.append(f"{appointment_id} ({time_text!r})")
+        elif format_minutes(minute) != time_text:
+            rewrites.append((format_minutes(minute), appointment_id))
+    if unreadable:
+        print("Appointments with unreadable times, left unchanged: " + ", ".join(unreadable))
+    if not rewrites:
+        return
+    # A rewritten time can land on a slot that is already booked, so the index
+    # is rebuilt once the duplicates are cancelled
+    conn.execute("DROP INDEX IF EXISTS uq_appointments_doctor_slot")
+    conn.executemany("UPDATE Appointments SET time = ? WHERE appointment_id = ?", rewrites)
+    print(f"Rewrote {len(rewrites)} appointment times as HH:MM")
+    _cancel_double_bookings(conn)
+
+
+def _rebuild_with_text_doctor_id(table, columns):
+    # SQLite can't change a column's type in place: copy into a new table and
+    # swap it in. CAST keeps ids stored as integers matching the TEXT Doctors key
+    selected = ", ".join("CAST(doctor_id AS TEXT)" if column == "doctor_id" else column for column in columns)
+    return [
+        f"INSERT INTO {table}_new ({', '.join(columns)}) SELECT {selected} FROM {table}",
+        f"DROP TABLE {table}",
+        f"ALTER TABLE {table}_new RENAME TO {table}",
+    ]
+
+
+def _schedule_version_triggers():
+    # Bump ScheduleVersion on any change to the doctors or their schedules, so every worker
+    # can tell with one lookup whether its cached schedules are current
+    return [
+        f'''
+        CREATE TRIGGER IF NOT EXISTS trg_{table.lower()}_{event.lower()} AFTER {event} ON {table}
+        BEGIN
+            UPDATE ScheduleVersion SET value = value + 1 WHERE id = 1;
+        END
+        '''
+        for table in ("Doctors", "DoctorWorkingHours", "DoctorBreaks", "DoctorHolidays")
+        for event in ("INSERT", "UPDATE", "DELETE")
+    ]
+
+
+def _restamp_appointments_trigger(table, key, columns):
+    # Patient and doctor details are part of every appointment row in the
+    # listing, so an edit restamps that person's appointments, one new version
+    # each so keyset pages over row_version never split a group
+    changed = " OR ".join(f"OLD.{column} IS NOT NEW.{column}" for column in columns)
+    return f'''
+        CREATE TRIGGER IF NOT EXISTS trg_{table.lower()}_appointments_version
+        AFTER UPDATE OF {", ".join(columns)} ON {table}
+        WHEN {changed}
+        BEGIN
+            UPDATE Appointments SET row_version = (SELECT value FROM ChangeSequence WHERE id = 1) + ranked.n
+            FROM (SELECT rowid AS id, ROW_NUMBER() OVER (ORDER BY rowid) AS n
+                  FROM Appointments WHERE {key} = NEW.{key}) AS ranked
+            WHERE Appointments.rowid = ranked.id;
+            UPDATE ChangeSequence SET value = value + (SELECT COUNT(*) FROM Appointments WHERE {key} = NEW.{key})
+            WHERE id = 1;
+        END
+        '''
+
+
+MIGRATIONS = [
+    (1, "Base schema", [
+        '''
+        CREATE TABLE IF NOT EXISTS Patients (
+            patient_id TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            age INTEGER,
+            gender TEXT,
+            contact_number TEXT,
+            email TEXT,
+            medical_history TEXT
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS Doctors (
+            doctor_id TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            specialization TEXT NOT NULL
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS Appointments (
+            appointment_id TEXT PRIMARY KEY,
+            patient_id TEXT NOT NULL,
+            doctor_id TEXT NOT NULL,
+            department TEXT NOT NULL,
+            date TEXT NOT NULL,
+            time TEXT NOT NULL,
+            status TEXT NOT NULL,
+            FOREIGN KEY (patient_id) REFERENCES Patients (patient_id),
+            FOREIGN KEY (doctor_id) REFERENCES Doctors (doctor_id)
+        )
+        ''',
+        _insert_sample_doctors,
+    ]),
+    (2, "Lookup indexes and one active appointment per doctor slot", [
+        "CREATE INDEX IF NOT EXISTS idx_patients_name ON Patients (name)",
+        "CREATE INDEX IF NOT EXISTS idx_doctors_specialization ON Doctors (specialization)",
+        "CREATE INDEX IF NOT EXISTS idx_appointments_patient_slot ON Appointments (patient_id, date, time)",
+        _cancel_double_bookings,
+        '''
+        CREATE UNIQUE INDEX IF NOT EXISTS uq_appointments_doctor_slot
+        ON Appointments (doctor_id, date, time) WHERE status != 'Cancelled'
+        ''',
+    ]),
+    (3, "Change tracking for incremental appointment sync", [
+        # Every insert or update stamps the row with the next value of a global
+        # sequence, so clients can ask for the rows changed after a token they hold
+        "ALTER TABLE Appointments ADD COLUMN row_version INTEGER NOT NULL DEFAULT 0",
+        "UPDATE Appointments SET row_version = rowid",
+        '''
+        CREATE TABLE IF NOT EXISTS ChangeSequence (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            value INTEGER NOT NULL
+        )
+        ''',
+        "INSERT INTO ChangeSequence (id, value) SELECT 1, COALESCE(MAX(row_version), 0) FROM Appointments",
+        "CREATE INDEX IF NOT EXISTS idx_appointments_row_version ON Appointments (row_version)",
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_appointments_version_insert AFTER INSERT ON Appointments
+        BEGIN
+            UPDATE ChangeSequence SET value = value + 1 WHERE id = 1;
+            UPDATE Appointments SET row_version = (SELECT value FROM ChangeSequence WHERE id = 1)
+            WHERE rowid = NEW.rowid;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_appointments_version_update
+        AFTER UPDATE OF patient_id, doctor_id, department, date, time, status ON Appointments
+        BEGIN
+            UPDATE ChangeSequence SET value = value + 1 WHERE id = 1;
+            UPDATE Appointments SET row_version = (SELECT value FROM ChangeSequence WHERE id = 1)
+            WHERE rowid = NEW.rowid;
+        END
+        ''',
+    ]),
+    (4, "Let bulk inserts stamp their own row versions", [
+        # The insert trigger costs two extra writes per row; a bulk import
+        # reserves a block of the sequence and inserts with row_version set
+        "DROP TRIGGER IF EXISTS trg_appointments_version_insert",
+        '''
+        CREATE TRIGGER trg_appointments_version_insert AFTER INSERT ON Appointments
+        WHEN NEW.row_version = 0
+        BEGIN
+            UPDATE ChangeSequence SET value = value + 1 WHERE id = 1;
+            UPDATE Appointments SET row_version = (SELECT value FROM ChangeSequence WHERE id = 1)
+            WHERE rowid = NEW.rowid;
+        END
+        ''',
+    ]),
+    (5, "Doctor working hours, breaks and holidays", [
+        # A doctor's weekly hours, one row per shift (weekday 0 is Monday); slots
+        # of slot_minutes start at start_time and must end by end_time. Doctors
+        # without rows work schedule.DEFAULT_HOURS.
+        '''
+        CREATE TABLE IF NOT EXISTS DoctorWorkingHours (
+            doctor_id INTEGER NOT NULL,
+            weekday INTEGER NOT NULL CHECK (weekday BETWEEN 0 AND 6),
+            start_time TEXT NOT NULL,
+            end_time TEXT NOT NULL,
+            slot_minutes INTEGER NOT NULL DEFAULT 30 CHECK (slot_minutes > 0),
+            PRIMARY KEY (doctor_id, weekday, start_time),
+            FOREIGN KEY (doctor_id) REFERENCES Doctors (doctor_id)
+        )
+        ''',
+        # No slot may overlap a break; a NULL weekday is every day
+        '''
+        CREATE TABLE IF NOT EXISTS DoctorBreaks (
+            doctor_id INTEGER NOT NULL,
+            weekday INTEGER CHECK (weekday BETWEEN 0 AND 6),
+            start_time TEXT NOT NULL,
+            end_time TEXT NOT NULL,
+            FOREIGN KEY (doctor_id) REFERENCES Doctors (doctor_id)
+        )
+        ''',
+        # Whole days off, start_date to end_date inclusive; a NULL doctor_id is
+        # every doctor (a hospital holiday)
+        '''
+        CREATE TABLE IF NOT EXISTS DoctorHolidays (
+            doctor_id INTEGER,
+            start_date TEXT NOT NULL,
+            end_date TEXT NOT NULL,
+            reason TEXT,
+            FOREIGN KEY (doctor_id) REFERENCES Doctors (doctor_id)
+        )
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_doctor_breaks_doctor ON DoctorBreaks (doctor_id)",
+        "CREATE INDEX IF NOT EXISTS idx_doctor_holidays_doctor ON DoctorHolidays (doctor_id, end_date)",
+        '''
+        CREATE TABLE IF NOT EXISTS ScheduleVersion (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            value INTEGER NOT NULL
+        )
+        ''',
+        "INSERT OR IGNORE INTO ScheduleVersion (id, value) VALUES (1, 0)",
+    ] + _schedule_version_triggers()),
+    (6, "Change tracking for deletes and patient and doctor edits", [
+        # A deleted appointment leaves its id and the version of the delete, so
+        # incremental sync can tell clients to drop it
+        '''
+        CREATE TABLE IF NOT EXISTS AppointmentTombstones (
+            appointment_id TEXT PRIMARY KEY,
+            row_version INTEGER NOT NULL
+        )
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_appointment_tombstones_row_version ON AppointmentTombstones (row_version)",
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_appointments_version_delete AFTER DELETE ON Appointments
+        BEGIN
+            UPDATE ChangeSequence SET value = value + 1 WHERE id = 1;
+            INSERT OR REPLACE INTO AppointmentTombstones (appointment_id, row_version)
+            SELECT OLD.appointment_id, value FROM ChangeSequence WHERE id = 1;
+        END
+        ''',
+        _restamp_appointments_trigger("Patients", "patient_id",
+                                      ("name", "age", "gender", "contact_number", "email", "medical_history")),
+        _restamp_appointments_trigger("Doctors", "doctor_id", ("name",)),
+    ]),
+    (7, "Record the slot length of each appointment", [
+        # The length of the slot when it was booked, so a later schedule change
+        # doesn't shorten existing appointments; NULL for older and imported rows
+        "ALTER TABLE Appointments ADD COLUMN slot_minutes INTEGER",
+    ]),
+    (8, "Store every appointment time as HH:MM", [
+        _normalize_appointment_times,
+        '''
+        CREATE UNIQUE INDEX IF NOT EXISTS uq_appointments_doctor_slot
+        ON Appointments (doctor_id, date, time) WHERE status != 'Cancelled'
+        ''',
+    ]),
+    (9, "Schedule tables key doctors by TEXT like Doctors", [
+        # Migration 5 declared doctor_id INTEGER, which stores a doctor '101' as
+        # 101 so its schedule never matched the doctor
+        '''
+        CREATE TABLE DoctorWorkingHours_new (
+            doctor_id TEXT NOT NULL,
+            weekday INTEGER NOT NULL CHECK (weekday BETWEEN 0 AND 6),
+            start_time TEXT NOT NULL,
+            end_time TEXT NOT NULL,
+            slot_minutes INTEGER NOT NULL DEFAULT 30 CHECK (slot_minutes > 0),
+            PRIMARY KEY (doctor_id, weekday, start_time),
+            FOREIGN KEY (doctor_id) REFERENCES Doctors (doctor_id)
+        )
+        ''',
+        '''
+        CREATE TABLE DoctorBreaks_new (
+            doctor_id TEXT NOT NULL,
+            weekday INTEGER CHECK (weekday BETWEEN 0 AND 6),
+            start_time TEXT NOT NULL,
+            end_time TEXT NOT NULL,
+            FOREIGN KEY (doctor_id) REFERENCES Doctors (doctor_id)
+        )
+        ''',
+        '''
+        CREATE TABLE DoctorHolidays_new (
+            doctor_id TEXT,
+            start_date TEXT NOT NULL,
+            end_date TEXT NOT NULL,
+            reason TEXT,
+            FOREIGN KEY (doctor_id) REFERENCES Doctors (doctor_id)
+        )
+        ''',
+    ] + _rebuild_with_text_doctor_id("DoctorWorkingHours", ("doctor_id", "weekday", "start_time", "end_time", "slot_minutes"))
+      + _rebuild_with_text_doctor_id("DoctorBreaks", ("doctor_id", "weekday", "start_time", "end_time"))
+      + _rebuild_with_text_doctor_id("DoctorHolidays", ("doctor_id", "start_date", "end_date", "reason")) + [
+        "CREATE INDEX IF NOT EXISTS idx_doctor_breaks_doctor ON DoctorBreaks (doctor_id)",
+        "CREATE INDEX IF NOT EXISTS idx_doctor_holidays_doctor ON DoctorHolidays (doctor_id, end_date)",
+        # Every worker reloads its schedules
+        "UPDATE ScheduleVersion SET value = value + 1 WHERE id = 1",
+    ] + _schedule_version_triggers()),
+]
+
+
+def current_version(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TEXT NOT NULL
+        )
+    ''')
+    return conn.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version").fetchone()[0]
+
+
+def apply_migrations(conn, target_version=None):
+    """
+    Bring the schema up to `target_version` (default: latest).
+    Returns the list of versions that were applied.
+    """
+    applied = []
+    for version, description, steps in MIGRATIONS:
+        if target_version is not None and version > target_version:
+            break
+        if conn.in_transaction:
+            conn.commit()
+        # BEGIN IMMEDIATE takes the write lock, so when several workers start at
+        # once only one of them applies the migration and the others see it done
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if version <= current_version(conn):
+                conn.commit()
+                continue
+            for step in steps:
+                if callable(step):
+                    step(conn)
+                else:
+                    conn.execute(step)
+            conn.execute(
+                "INSERT INTO schema_version (version, description, applied_at) VALUES (?, ?, ?)",
+                (version, description, datetime.datetime.now().isoformat(timespec="seconds"))
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied.append(version)
+    return applied
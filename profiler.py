@@ -0,0 +1,99 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+# Sampling profiler for a running worker. A daemon thread looks at the stack of
+# every other thread each PROFILER_INTERVAL_MS and counts the stacks it sees,
+# so the cost is a few microseconds per thread per sample whatever the code is
+# doing, unlike cProfile which slows every call. The counts come out in the
+# "collapsed" format flamegraph.pl and speedscope read:
+#
+#     PROFILER=true gunicorn app:app
+#     curl -s localhost:5000/debug/profile > profile.txt
+#     flamegraph.pl profile.txt > profile.svg
+
+# Set PROFILER=true to start sampling when the app starts
+PROFILER = os.getenv("PROFILER", "false").lower() in ("1", "true", "yes")
+PROFILER_INTERVAL_MS = float(os.getenv("PROFILER_INTERVAL_MS", "10"))
+# Frames kept per stack, innermost first
+PROFILER_MAX_DEPTH = int(os.getenv("PROFILER_MAX_DEPTH", "64"))
+
+
+class SamplingProfiler:
+    def __init__(self, interval_ms=PROFILER_INTERVAL_MS, max_depth=PROFILER_MAX_DEPTH):
+        self.interval = interval_ms / 1000
+        self.max_depth = max_depth
+        # {(thread name, (code objects, innermost first)): samples}; turned into
+        # text only when collapsed() is read, to keep each sample cheap
+        self._stacks = Counter()
+        self._thread_names = {}
+        self._samples = 0
+        # Time spent taking samples, i.e. the profiler's own cost
+        self._sampling_seconds = 0.0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def _run(self):
+        own = threading.get_ident()
+        max_depth = self.max_depth
+        while not self._stop.wait(self.interval):
+            start = time.perf_counter()
+            stacks = []
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                if ident not in self._thread_names:
+                    self._thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+                stack = []
+                while frame is not None and len(stack) < max_depth:
+                    stack.append(frame.f_code)
+                    frame = frame.f_back
+                stacks.append((self._thread_names.get(ident, "thread"), tuple(stack)))
+            with self._lock:
+                self._stacks.update(stacks)
+                self._samples += 1
+                self._sampling_seconds += time.perf_counter() - start
+
+    def stats(self):
+        with self._lock:
+            samples, sampling_seconds = self._samples, self._sampling_seconds
+            stacks = len(self._stacks)
+        return {"running": self.running(), "samples": samples, "stacks": stacks, "interval_ms": self.interval * 1000,
+                "sample_cost_us": sampling_seconds / samples * 1e6 if samples else 0.0,
+                # Share of one core spent sampling
+                "overhead": sampling_seconds / (samples * self.interval) if samples else 0.0}
+
+    def collapsed(self, reset=False):
+        """'thread;outer;...;inner count' lines, most frequent first."""
+        with self._lock:
+            stacks = self._stacks.most_common()
+            if reset:
+                self._stacks.clear()
+                self._samples = 0
+                self._sampling_seconds = 0.0
+        lines = []
+        for (thread_name, codes), count in stacks:
+            frames = [f"{os.path.basename(code.co_filename)}:{code.co_name}" for code in reversed(codes)]
+            lines.append(f"{';'.join([thread_name] + frames)} {count}\n")
+        return "".join(lines)
+
+
+profiler = SamplingProfiler()
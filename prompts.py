@@ -0,0 +1,292 @@
+import datetime
+import os
+import re
+import threading
+
+# Prompt registry. Each template's static text is assembled once at import;
+# only the user's message, today's date and the chosen few-shot examples change
+# per call. Every render is measured and kept under a token budget by dropping
+# the least relevant examples first, then shortening the user's message.
+# Per-template token statistics: prompt_stats().
+#
+# Tokens are estimated from word lengths, which needs nothing installed. Exact
+# counts are opt-in: set PROMPT_TOKENIZER to a tiktoken encoding (e.g.
+# cl100k_base) with the tiktoken package installed. tiktoken downloads the
+# encoding's vocabulary on first use, so on hosts without network access fetch
+# it once into TIKTOKEN_CACHE_DIR beforehand:
+#
+#     TIKTOKEN_CACHE_DIR=/srv/tiktoken python -c "import tiktoken; tiktoken.get_encoding('cl100k_base')"
+
+# Upper bound on prompt tokens for templates that don't set their own
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "1200"))
+# Few-shot examples sent with an extraction prompt
+PROMPT_MAX_EXAMPLES = int(os.getenv("PROMPT_MAX_EXAMPLES", "2"))
+# tiktoken encoding for exact token counts; empty for the estimate
+PROMPT_TOKENIZER = os.getenv("PROMPT_TOKENIZER", "")
+
+_encoding = None
+_encoding_loaded = False
+_encoding_lock = threading.Lock()
+_WORD_PIECES = re.compile(r"\w+|[^\w\s]")
+
+
+def _get_encoding():
+    # Loaded on first use, and only when PROMPT_TOKENIZER asks for it
+    global _encoding, _encoding_loaded
+    with _encoding_lock:
+        if not _encoding_loaded:
+            _encoding_loaded = True
+            if PROMPT_TOKENIZER:
+                try:
+                    import tiktoken
+                    _encoding = tiktoken.get_encoding(PROMPT_TOKENIZER)
+                except Exception as e:
+                    print(f"Prompt token counts are estimated, tokenizer {PROMPT_TOKENIZER!r} unavailable "
+                          f"({e.__class__.__name__})")
+        return _encoding
+
+
+def count_tokens(text):
+    """Tokens in `text`: about one per 4 characters of each word, exact with PROMPT_TOKENIZER."""
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return sum((len(piece) + 3) // 4 for piece in _WORD_PIECES.findall(text))
+
+
+class Example:
+    """
+    A few-shot example; `intents` are the requests it is most useful for. A
+    `pinned` example goes into every render of its template and is the last
+    one dropped for the token budget.
+    """
+
+    def __init__(self, intents, text, pinned=False):
+        self.intents = set(intents)
+        self.text = text
+        self.pinned = pinned
+
+
+class PromptTemplate:
+    """
+    prefix + selected examples + suffix. `prefix` is fixed text; `suffix` is a
+    str.format template filled in per call (with `today` and `tomorrow` always
+    available). Examples may use {today} and {tomorrow} as well.
+    """
+
+    def __init__(self, name, prefix, suffix, examples=(), max_examples=0, budget=None):
+        self.name = name
+        self.prefix = prefix
+        self.suffix = suffix
+        self.examples = list(examples)
+        self.max_examples = max_examples
+        self.budget = budget or PROMPT_TOKEN_BUDGET
+        self._prefix_tokens = None
+        self._rendered_day = None
+        self._rendered_examples = []
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "tokens": 0, "max_tokens": 0, "examples": 0,
+                      "examples_dropped": 0, "input_truncated": 0}
+
+    @property
+    def prefix_tokens(self):
+        # Counted on first use so importing a module that registers a template
+        # doesn't load the tokenizer
+        if self._prefix_tokens is None:
+            self._prefix_tokens = count_tokens(self.prefix) if self.prefix else 0
+        return self._prefix_tokens
+
+    def _examples_for(self, today):
+        # Examples mention relative dates, so they are rendered once per day
+        with self._lock:
+            if self._rendered_day != today:
+                dates = {"today": today.isoformat(), "tomorrow": (today + datetime.timedelta(days=1)).isoformat()}
+                self._rendered_examples = [
+                    (example, text, count_tokens(text))
+                    for example in self.examples
+                    for text in [example.text.format(**dates)]
+                ]
+                self._rendered_day = today
+            return self._rendered_examples
+
+    def select_examples(self, intent_hint, today):
+        """Pinned examples, then those for `intent_hint`, then the rest in their listed order."""
+        examples = self._examples_for(today)
+        pinned = [example for example in examples if example[0].pinned]
+        relevant = [example for example in examples if not example[0].pinned and intent_hint in example[0].intents]
+        others = [example for example in examples if not example[0].pinned and intent_hint not in example[0].intents]
+        return pinned + (relevant + others)[:max(0, self.max_examples - len(pinned))]
+
+    def render(self, intent_hint=None, **values):
+        today = datetime.date.today()
+        values.setdefault("today", today.isoformat())
+        values.setdefault("tomorrow", (today + datetime.timedelta(days=1)).isoformat())
+        examples = self.select_examples(intent_hint, today) if self.max_examples else []
+        suffix = self.suffix.format(**values)
+        suffix_tokens = count_tokens(suffix)
+
+        dropped = 0
+        total = self.prefix_tokens + sum(tokens for _, _, tokens in examples) + suffix_tokens
+        while total > self.budget and examples:
+            # The last unpinned example goes first
+            index = next((i for i in range(len(examples) - 1, -1, -1) if not examples[i][0].pinned), -1)
+            total -= examples.pop(index)[2]
+            dropped += 1
+
+        truncated = False
+        if total > self.budget and "user_input" in values:
+            # Keep the start of a long message; the request is usually stated there
+            over = total - self.budget
+            words = str(values["user_input"]).split()
+            keep = max(1, len(words) - over)
+            values["user_input"] = " ".join(words[:keep])
+            suffix = self.suffix.format(**values)
+            total = self.prefix_tokens + sum(tokens for _, _, tokens in examples) + count_tokens(suffix)
+            truncated = True
+
+        prompt = self.prefix + "".join(text for _, text, _ in examples) + suffix
+        with self._lock:
+            self.stats["calls"] += 1
+            self.stats["tokens"] += total
+            self.stats["max_tokens"] = max(self.stats["max_tokens"], total)
+            self.stats["examples"] += len(examples)
+            self.stats["examples_dropped"] += dropped
+            self.stats["input_truncated"] += int(truncated)
+        return prompt
+
+
+PROMPTS = {}
+
+
+def register(template):
+    PROMPTS[template.name] = template
+    return template
+
+
+def render(name, intent_hint=None, **values):
+    return PROMPTS[name].render(intent_hint, **values)
+
+
+def prompt_stats():
+    """{template: {"calls", "mean_tokens", "max_tokens", "prefix_tokens", ...}}"""
+    stats = {}
+    for name, template in PROMPTS.items():
+        with template._lock:
+            entry = dict(template.stats)
+        entry["mean_tokens"] = entry["tokens"] / entry["calls"] if entry["calls"] else 0.0
+        entry["prefix_tokens"] = template.prefix_tokens
+        entry["budget"] = template.budget
+        stats[name] = entry
+    return stats
+
+
+_INTENT_HINTS = [
+    ("reschedule", re.compile(r"\b(reschedul\w*|move|postpone|shift|change)\b", re.IGNORECASE)),
+    ("cancel", re.compile(r"\b(cancel\w*|call off|drop)\b", re.IGNORECASE)),
+    ("view", re.compile(r"\b(show|view|list|see|check)\b", re.IGNORECASE)),
+    # Not "need" or "want": "I need something for a migraine" is a medical question
+    ("book", re.compile(r"\b(book\w*|schedule|appointment)\b", re.IGNORECASE)),
+]
+
+
+def guess_intent(user_input):
+    """Cheap keyword guess used to pick few-shot examples; None when nothing matches."""
+    for intent, pattern in _INTENT_HINTS:
+        if pattern.search(user_input or ""):
+            return intent
+    return None
+
+
+# Extraction prompt (ai.extract_intent_and_details / ai.route_and_extract)
+
+_EXTRACTION_KEYS = """    - `"intent"`: "book", "reschedule", "cancel", or "view"
+    - `"name"`: Name of the patient (Necessary)
+    - `"appointment_date"`: Date of the appointment (Necessary): Convert relative terms like "today", "tomorrow", or "next week" into actual dates in format "YYYY-MM-DD"
+    - `"appointment_time"`: Time of the appointment (if mentioned, else null)
+    - `"doctor"`: Doctor's name or specialization (if mentioned, else null)
+    - `"age"`: Patient's age (if mentioned, else null)
+    - `"gender"`: Patient's gender (if mentioned, else null)
+    - `"contact_number"`: Contact number (if mentioned, else null)
+    - `"email"`: Email address (if mentioned, else null)
+    - `"department"`: Department if no doctors mentioned already(if mentioned, else null)  Capitalise the first letter of the department Name
+
+    For reschedule intent, also include:
+    - `"old_date"`: Original appointment date (if mentioned, else null)
+    - `"old_time"`: Original appointment time (if mentioned, else null)
+    - `"new_date"`: New appointment date (if mentioned, else null)
+    - `"new_time"`: New appointment time (if mentioned, else null)
+
+"""
+
+_ROUTE_KEY = """    - `"route"`: "medical" if the user is asking about symptoms, diseases, treatments, medications, or general health; "appointment" if the user is asking about booking, rescheduling, canceling or viewing appointments. Always include this key.
+"""
+
+_EXTRACTION_INTRO = """
+    You are an AI assistant that extracts structured details from user requests about doctor appointments.
+    **Return only a valid JSON object** with the following keys:
+"""
+
+_EXTRACTION_EXAMPLES = [
+    Example({"book"}, """
+    **User:** "Book an appointment for Alice at 4:30 PM with Dr. Smith tomorrow."
+    **Output:**
+    ```json
+    {{"intent": "book", "name": "Alice", "appointment_date": "{tomorrow}", "appointment_time": "4:30 PM", "doctor": "Dr. Smith", "age": null, "gender": null, "contact_number": null, "email": null, "department": null}}
+    ```
+"""),
+    Example({"cancel"}, """
+    **User:** "Cancel my appointment with Dr. Brown on March 10."
+    **Output:**
+    ```json
+    {{"intent": "cancel", "name": null, "appointment_date": "2025-03-10", "appointment_time": null, "doctor": "Dr. Brown", "age": null, "gender": null, "contact_number": null, "email": null, "department": null}}
+    ```
+"""),
+    Example({"reschedule"}, """
+    **User:** "Reschedule my March 15th appointment from 2:00 PM to 4:00 PM on March 20th."
+    **Output:**
+    ```json
+    {{"intent": "reschedule", "name": null, "old_date": "2025-03-15", "old_time": "2:00 PM", "new_date": "2025-03-20", "new_time": "4:00 PM", "doctor": null, "age": null, "gender": null, "contact_number": null, "email": null, "department": null}}
+    ```
+"""),
+    Example({"view"}, """
+    **User:** "Show me my appointments"
+    **Output:**
+    ```json
+    {{"intent": "view", "name": null, "appointment_date": null, "appointment_time": null, "doctor": null, "age": null, "gender": null, "contact_number": null, "email": null, "department": null}}
+    ```
+"""),
+]
+
+_MEDICAL_EXAMPLE = Example({"medical"}, """
+    **User:** "What are the symptoms of flu?"
+    **Output:**
+    ```json
+    {{"route": "medical", "intent": null, "name": null, "appointment_date": null, "appointment_time": null, "doctor": null, "age": null, "gender": null, "contact_number": null, "email": null, "department": null}}
+    ```
+""", pinned=True)
+
+_EXTRACTION_SUFFIX = """
+    IMPORTANT: For any relative dates like "today", "tomorrow", or "next Tuesday", convert them to the actual date in YYYY-MM-DD format. Today's date is {today}.
+
+    **User Input:** "{user_input}"
+    **Output:** (JSON format only)
+    """
+
+register(PromptTemplate(
+    "extract",
+    _EXTRACTION_INTRO + _EXTRACTION_KEYS + "    Example Inputs and Outputs:",
+    _EXTRACTION_SUFFIX,
+    _EXTRACTION_EXAMPLES,
+    max_examples=PROMPT_MAX_EXAMPLES,
+))
+
+# The single-pass router asks the same call to classify the message as well,
+# so /ai-response doesn't need a separate detect_intent() round-trip. The medical
+# example is pinned so every variant still shows what a medical question looks like
+register(PromptTemplate(
+    "route_and_extract",
+    _EXTRACTION_INTRO + _ROUTE_KEY + _EXTRACTION_KEYS + "    Example Inputs and Outputs:",
+    _EXTRACTION_SUFFIX,
+    _EXTRACTION_EXAMPLES + [_MEDICAL_EXAMPLE],
+    max_examples=PROMPT_MAX_EXAMPLES + 1,
+))
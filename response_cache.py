@@ -0,0 +1,162 @@
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+
+# Words that don't change the meaning of a question for caching purposes.
+# Only articles and "please": conjunctions, prepositions, pronouns, modal verbs
+# and negations all decide what is asked ("ibuprofen with paracetamol" is not
+# "ibuprofen or paracetamol", "a dose for a child" is not "a dose for me").
+STOPWORDS = {"a", "an", "the", "please"}
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_query(text):
+    """
+    Normalize a question so trivially different phrasings share a cache key:
+    case, punctuation, repeated whitespace, articles and "please" are ignored.
+    """
+    text = _PUNCTUATION.sub(" ", str(text or "").lower())
+    words = [word for word in _WHITESPACE.split(text) if word and word not in STOPWORDS]
+    return " ".join(words)
+
+
+def template_version(template):
+    """Short hash of a prompt template, used to invalidate answers when the prompt changes."""
+    return hashlib.sha1(template.encode("utf-8")).hexdigest()[:12]
+
+
+class ResponseCache:
+    """
+    SQLite-backed cache of LLM answers keyed on the normalized question.
+
+    Entries expire after `ttl_seconds` and the least recently used ones are
+    evicted once the cache holds more than `max_entries`. Every entry records the
+    prompt `version` it was generated with; entries from other versions are
+    never served and are purged on startup.
+    """
+
+    def __init__(self, path, version, max_entries=10000, ttl_seconds=7 * 24 * 3600):
+        self.path = path
+        self.version = version
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS ResponseCache (
+                cache_key TEXT PRIMARY KEY,
+                version TEXT NOT NULL,
+                question TEXT NOT NULL,
+                answer TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        ''')
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_response_cache_last_access ON ResponseCache (last_access)")
+        self._conn.commit()
+        self.invalidate_stale_versions()
+
+    def _key(self, question):
+        normalized = normalize_query(question)
+        return hashlib.sha1(f"{self.version}:{normalized}".encode("utf-8")).hexdigest()
+
+    def get(self, question):
+        """Return the cached answer for `question`, or None on a miss."""
+        key = self._key(question)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT answer, created_at FROM ResponseCache WHERE cache_key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            answer, created_at = row
+            if self.ttl_seconds and now - created_at > self.ttl_seconds:
+                self._conn.execute("DELETE FROM ResponseCache WHERE cache_key = ?", (key,))
+                self._conn.commit()
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE ResponseCache SET last_access = ? WHERE cache_key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return answer
+
+    def touch(self, question):
+        """
+        Mark the entry for `question` as just used, without counting a hit.
+        False when it has expired or been evicted.
+        """
+        key = self._key(question)
+        now = time.time()
+        oldest = now - self.ttl_seconds if self.ttl_seconds else 0
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE ResponseCache SET last_access = ? WHERE cache_key = ? AND created_at >= ?", (now, key, oldest)
+            )
+            self._conn.commit()
+            return cursor.rowcount > 0
+
+    def set(self, question, answer):
+        key = self._key(question)
+        now = time.time()
+        with self._lock:
+            self._conn.execute('''
+                INSERT OR REPLACE INTO ResponseCache (cache_key, version, question, answer, created_at, last_access)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (key, self.version, question, answer, now, now))
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        count = self._conn.execute("SELECT COUNT(*) FROM ResponseCache").fetchone()[0]
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute('''
+                DELETE FROM ResponseCache WHERE cache_key IN (
+                    SELECT cache_key FROM ResponseCache ORDER BY last_access LIMIT ?
+                )
+            ''', (overflow,))
+            self.evictions += overflow
+
+    def entries(self):
+        """(question, answer, created_at) of the entries stored for the current prompt version, oldest first."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT question, answer, created_at FROM ResponseCache WHERE version = ? ORDER BY created_at",
+                (self.version,)
+            ).fetchall()
+
+    def invalidate_stale_versions(self):
+        """Drop entries generated with a different prompt version."""
+        with self._lock:
+            self._conn.execute("DELETE FROM ResponseCache WHERE version != ?", (self.version,))
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM ResponseCache")
+            self._conn.commit()
+
+    def stats(self):
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM ResponseCache").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "size": size,
+            "max_entries": self.max_entries,
+            "version": self.version,
+        }
@@ -0,0 +1,223 @@
+import datetime
+import os
+
+import numpy as np
+
+from datetime_normalizer import parse_time
+
+# Doctor schedules (the DoctorWorkingHours, DoctorBreaks and DoctorHolidays
+# tables) as arrays, for computing the free slots of many doctors over many
+# days at once. The day is cut into SCHEDULE_RESOLUTION_MINUTES cells and each
+# doctor has, per weekday, the length in cells of the slot starting at each
+# cell (0 where none starts: outside working hours, in a break, or off the
+# doctor's slot grid). Free slots over a date range are then a handful of
+# array operations on a (doctors, days, cells) block instead of a query per
+# slot:
+#
+#     schedules = database.get_schedules()
+#     free = schedules.free_starts(schedules.positions_of(department="Cardiology"),
+#                                  datetime.date(2031, 5, 5), 7, bookings)
+#
+# database.get_schedules() keeps one copy per process, reloaded when the
+# ScheduleVersion row shows the tables changed.
+
+SCHEDULE_RESOLUTION_MINUTES = 5
+CELLS_PER_DAY = 24 * 60 // SCHEDULE_RESOLUTION_MINUTES
+# Hours of doctors without DoctorWorkingHours rows, every day of the week:
+# comma-separated "HH:MM-HH:MM" shifts
+DEFAULT_HOURS = os.getenv("SCHEDULE_DEFAULT_HOURS", "08:00-20:00")
+DEFAULT_SLOT_MINUTES = int(os.getenv("SCHEDULE_DEFAULT_SLOT_MINUTES", "30"))
+
+
+def minute_of_day(time_text):
+    """Minutes after midnight of a time like "09:30" or "4:30 PM", or None when it can't be read."""
+    parsed = parse_time(time_text)
+    return parsed[0] * 60 + parsed[1] if parsed else None
+
+
+def format_minutes(minutes):
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def _cells(minutes):
+    """Cells covered by `minutes`, rounded up."""
+    return -(-minutes // SCHEDULE_RESOLUTION_MINUTES)
+
+
+def _default_shifts():
+    shifts = []
+    for shift in DEFAULT_HOURS.split(","):
+        start, end = shift.split("-")
+        shifts.append((start.strip(), end.strip(), DEFAULT_SLOT_MINUTES))
+    return shifts
+
+
+class Schedules:
+    """
+    The weekly schedules of every doctor, built from rows of the schedule
+    tables: `doctors` (doctor_id, name, specialization) in rowid order,
+    `hours` (doctor_id, weekday, start_time, end_time, slot_minutes),
+    `breaks` (doctor_id, weekday or None, start_time, end_time) and
+    `holidays` (doctor_id or None, start_date, end_date).
+    """
+
+    def __init__(self, doctors, hours=(), breaks=(), holidays=(), version=None):
+        self.version = version
+        self.doctor_ids = [doctor_id for doctor_id, _, _ in doctors]
+        self.names = [name for _, name, _ in doctors]
+        self.specializations = [specialization for _, _, specialization in doctors]
+        self._positions = {doctor_id: i for i, doctor_id in enumerate(self.doctor_ids)}
+        self._positions_by_text = {str(doctor_id): i for i, doctor_id in enumerate(self.doctor_ids)}
+        by_specialization = {}
+        for i, specialization in enumerate(self.specializations):
+            by_specialization.setdefault(specialization, []).append(i)
+        self._by_specialization = {k: np.array(v, dtype=np.intp) for k, v in by_specialization.items()}
+
+        count = len(self.doctor_ids)
+        # slot_cells[doctor, weekday, cell]: length in cells of the slot starting there, 0 for none
+        self.slot_cells = np.zeros((count, 7, CELLS_PER_DAY), dtype=np.int16)
+        scheduled = set()
+        # Rows are matched through position(): a doctor_id may come back from
+        # SQLite as 101 in one table and '101' in another
+        for doctor_id, weekday, start_time, end_time, slot_minutes in hours:
+            position = self.position(doctor_id)
+            if position is not None:
+                scheduled.add(position)
+                self._add_shift(position, [weekday], start_time, end_time, slot_minutes)
+        for position in range(count):
+            if position not in scheduled:
+                for start_time, end_time, slot_minutes in _default_shifts():
+                    self._add_shift(position, range(7), start_time, end_time, slot_minutes)
+
+        # Drop every slot that overlaps a break
+        on_break = np.zeros((count, 7, CELLS_PER_DAY + 1), dtype=np.int16)
+        for doctor_id, weekday, start_time, end_time in breaks:
+            position = self.position(doctor_id)
+            if position is not None:
+                weekdays = range(7) if weekday is None else [weekday]
+                first = minute_of_day(start_time) // SCHEDULE_RESOLUTION_MINUTES
+                last = min(_cells(minute_of_day(end_time)), CELLS_PER_DAY)
+                on_break[position, weekdays, first:last] = 1
+        if breaks:
+            self.slot_cells[self._overlap(on_break[..., :CELLS_PER_DAY] > 0, self.slot_cells) > 0] = 0
+
+        # (position, or -1 for every doctor; first and last day as ordinals)
+        rows = []
+        for doctor_id, start_date, end_date in holidays:
+            position = -1 if doctor_id is None else self.position(doctor_id)
+            if position is not None:
+                rows.append((position, datetime.date.fromisoformat(start_date).toordinal(),
+                             datetime.date.fromisoformat(end_date).toordinal()))
+        self._holidays = np.array(rows, dtype=np.int64).reshape(-1, 3)
+
+    def _add_shift(self, position, weekdays, start_time, end_time, slot_minutes):
+        start, end = minute_of_day(start_time), minute_of_day(end_time)
+        if start is None or end is None or slot_minutes <= 0:
+            return
+        starts = np.arange(start, end - slot_minutes + 1, slot_minutes) // SCHEDULE_RESOLUTION_MINUTES
+        for weekday in weekdays:
+            self.slot_cells[position, weekday, starts] = _cells(slot_minutes)
+
+    @staticmethod
+    def _overlap(busy, lengths):
+        """For each cell, how many `busy` cells the slot of `lengths` starting there covers."""
+        covered = np.zeros(busy.shape[:-1] + (CELLS_PER_DAY + 1,), dtype=np.int16)
+        np.cumsum(busy, axis=-1, out=covered[..., 1:])
+        # Only the few cells where a slot starts, as takes on the flat arrays
+        starts = np.flatnonzero(lengths)
+        rows, cells = np.divmod(starts, CELLS_PER_DAY)
+        ends = np.minimum(cells + lengths.ravel().take(starts), CELLS_PER_DAY)
+        firsts = rows * (CELLS_PER_DAY + 1)
+        counts = np.zeros(lengths.shape, dtype=np.int16)
+        counts.ravel()[starts] = covered.ravel().take(firsts + ends) - covered.ravel().take(firsts + cells)
+        return counts
+
+    def position(self, doctor_id):
+        """Row of a doctor in the arrays (doctor_id as stored or as text), or None."""
+        position = self._positions.get(doctor_id)
+        return position if position is not None else self._positions_by_text.get(str(doctor_id))
+
+    def positions_of(self, department=None, doctor_id=None):
+        """Rows of one doctor, or of a department's doctors in rowid order."""
+        if doctor_id is not None:
+            position = self.position(doctor_id)
+            if position is None or department is not None and self.specializations[position] != department:
+                return np.zeros(0, dtype=np.intp)
+            return np.array([position], dtype=np.intp)
+        return self._by_specialization.get(department, np.zeros(0, dtype=np.intp))
+
+    def _holiday_mask(self, positions, ordinals):
+        """(doctors, days) True where the doctor is on holiday."""
+        holidays = self._holidays
+        if len(holidays):
+            holidays = holidays[(holidays[:, 1] <= ordinals[-1]) & (holidays[:, 2] >= ordinals[0])]
+        if not len(holidays):
+            return np.zeros((len(positions), len(ordinals)), dtype=bool)
+        who, first, last = holidays.T
+        on_day = (first <= ordinals[:, None]) & (ordinals[:, None] <= last)  # (days, holidays)
+        applies = (who == -1) | (who == np.asarray(positions)[:, None])  # (doctors, holidays)
+        return (applies[:, None, :] & on_day[None, :, :]).any(axis=-1)
+
+    def slot_lengths(self, positions, first_day, days):
+        """(doctors, days, cells) slot lengths in cells for the doctors at `positions`, 0 on holidays."""
+        ordinals = first_day.toordinal() + np.arange(days)
+        weekdays = (ordinals - 1) % 7  # ordinal 1, 0001-01-01, is a Monday
+        lengths = self.slot_cells[np.asarray(positions)[:, None], weekdays[None, :]]
+        return lengths * ~self._holiday_mask(positions, ordinals)[..., None]
+
+    def free_starts(self, positions, first_day, days, bookings=()):
+        """
+        (doctors, days, cells) array, True where a free slot starts, for the
+        doctors at `positions` over `days` days from `first_day`. `bookings`
+        are (index into positions, day index, minute of day, length in minutes)
+        of the active appointments. A length of 0 (not recorded, e.g. imported
+        history) means the slot the booking starts under today's schedule, or
+        a default-length slot when it is off the doctor's grid.
+        """
+        lengths = self.slot_lengths(positions, first_day, days)
+        if not len(bookings):
+            return lengths > 0
+        rows, day_numbers, minutes, booked_minutes = np.asarray(bookings, dtype=np.intp).reshape(-1, 4).T
+        starts = np.minimum(minutes // SCHEDULE_RESOLUTION_MINUTES, CELLS_PER_DAY - 1)
+        spans = lengths[rows, day_numbers, starts]
+        spans = np.where(spans > 0, spans, _cells(DEFAULT_SLOT_MINUTES))
+        spans = np.where(booked_minutes > 0, _cells(booked_minutes), spans)
+        # +1 where a booking starts and -1 where it ends, summed along the day
+        shape = lengths.shape[:-1] + (CELLS_PER_DAY + 1,)
+        days_in = (rows * shape[1] + day_numbers) * shape[2]
+        size = shape[0] * shape[1] * shape[2]
+        changes = (np.bincount(days_in + starts, minlength=size)
+                   - np.bincount(days_in + np.minimum(starts + spans, CELLS_PER_DAY), minlength=size))
+        booked = np.cumsum(changes.reshape(shape), axis=-1)[..., :CELLS_PER_DAY] > 0
+        return (lengths > 0) & (self._overlap(booked, lengths) == 0)
+
+    def free_at(self, positions, day, minute, bookings=()):
+        """
+        For each doctor at `positions`, whether a free slot starts at `minute` on
+        `day` (a datetime.date): free_starts() for that one cell. `bookings` are
+        (index into positions, minute of day, length in minutes or 0) of the
+        doctors' active appointments that day.
+        """
+        if minute % SCHEDULE_RESOLUTION_MINUTES or not 0 <= minute < 24 * 60:
+            return np.zeros(len(positions), dtype=bool)
+        free = self.free_starts(positions, day, 1, [(row, 0, start, length) for row, start, length in bookings])
+        return free[:, 0, minute // SCHEDULE_RESOLUTION_MINUTES]
+
+    def slot_minutes_at(self, doctor_id, date, time_text):
+        """
+        Length in minutes of the doctor's slot starting at `time_text` on `date`
+        ("YYYY-MM-DD"), or None when no slot starts then: outside working hours,
+        in a break, on a holiday, or between two slot starts.
+        """
+        position = self.position(doctor_id)
+        minute = minute_of_day(time_text)
+        if position is None or minute is None or minute % SCHEDULE_RESOLUTION_MINUTES:
+            return None
+        try:
+            day = datetime.date.fromisoformat(date)
+        except (TypeError, ValueError):
+            return None
+        length = self.slot_cells[position, day.weekday(), minute // SCHEDULE_RESOLUTION_MINUTES]
+        if not length or self._holiday_mask([position], np.array([day.toordinal()]))[0, 0]:
+            return None
+        return int(length) * SCHEDULE_RESOLUTION_MINUTES
@@ -0,0 +1,358 @@
+import os
+import re
+import threading
+import time
+import zlib
+
+import numpy as np
+
+from response_cache import normalize_query
+
+# Near-duplicate cache for medical questions. Questions are embedded, stored in a
+# NumPy-backed vector index, and a new question is answered from the cache when its
+# cosine similarity to a previously answered one is above the threshold.
+#
+# Hashed n-grams score "hypothyroidism" and "hyperthyroidism", or "child" and
+# "adult", as nearly the same question, so the words that decide what a question
+# is about have to match exactly as well, and medical_ai.py only turns the cache
+# on by default with a sentence embedding model (SEMANTIC_CACHE_MODEL).
+
+_WORD = re.compile(r"\w+")
+_POSSESSIVE = re.compile(r"'s\b")
+
+# Tokens that flip the meaning of an otherwise near-identical question
+# ("type 1" vs "type 2", "safe" vs "not safe"). A cached answer is only served
+# when these match exactly.
+_NEGATIONS = {"not", "no", "never", "without", "cannot", "dont", "isnt", "shouldnt"}
+
+# Who or which direction a question is about, with the spellings that mean the same
+_QUALIFIERS = {
+    "high": "high", "higher": "high", "raised": "high", "elevated": "high", "increased": "high",
+    "low": "low", "lower": "low", "decreased": "low", "reduced": "low",
+    "child": "child", "children": "child", "kid": "child", "kids": "child", "toddler": "child",
+    "baby": "baby", "babies": "baby", "infant": "baby", "infants": "baby", "newborn": "baby",
+    "teen": "teen", "teens": "teen", "teenager": "teen", "teenagers": "teen",
+    "adult": "adult", "adults": "adult", "elderly": "elderly",
+    "pregnant": "pregnant", "pregnancy": "pregnant", "breastfeeding": "breastfeeding",
+    "man": "male", "men": "male", "male": "male", "woman": "female", "women": "female", "female": "female",
+    "acute": "acute", "chronic": "chronic", "before": "before", "after": "after", "overdose": "overdose",
+}
+
+# Drug names: common ones by name, most others by their class suffix
+_DRUGS = {
+    "paracetamol", "acetaminophen", "ibuprofen", "aspirin", "naproxen", "diclofenac", "codeine", "tramadol",
+    "morphine", "insulin", "warfarin", "heparin", "prednisone", "prednisolone", "levothyroxine",
+    "cetirizine", "loratadine", "antihistamine", "antihistamines", "penicillin", "melatonin",
+}
+_DRUG_SUFFIXES = (
+    "cillin", "mycin", "cycline", "floxacin", "prazole", "statin", "sartan", "pril", "olol", "dipine",
+    "azepam", "azolam", "oxetine", "triptan", "formin", "gliptin", "mab", "vir", "azole", "profen",
+)
+
+
+def _guard_tokens(text):
+    """The numbers, negations, qualifiers, hypo-/hyper- terms and drug names in `text`."""
+    words = _WORD.findall(_POSSESSIVE.sub("", str(text or "").lower()).replace("'", ""))
+    tokens = set()
+    for word in words:
+        if (word.isdigit() or word in _NEGATIONS or word in _DRUGS or word.startswith(("hypo", "hyper"))
+                or len(word) > 5 and word.endswith(_DRUG_SUFFIXES)):
+            tokens.add(word)
+        elif word in _QUALIFIERS:
+            tokens.add(_QUALIFIERS[word])
+    return frozenset(tokens)
+
+
+class HashingEmbedder:
+    """
+    Embeds text with the hashing trick over word unigrams/bigrams and character
+    n-grams. Needs no model download and is stable across processes.
+    """
+
+    def __init__(self, dim=512, char_ngrams=(3, 4)):
+        self.dim = dim
+        self.char_ngrams = char_ngrams
+
+    def _features(self, text):
+        words = _WORD.findall(normalize_query(text))
+        features = list(words)
+        features.extend(f"{a} {b}" for a, b in zip(words, words[1:]))
+        for word in words:
+            padded = f"<{word}>"
+            for n in self.char_ngrams:
+                features.extend(padded[i:i + n] for i in range(len(padded) - n + 1))
+        return features
+
+    def embed(self, text):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature in self._features(text):
+            h = zlib.crc32(feature.encode("utf-8"))
+            # Low bits pick the bucket, one high bit picks the sign
+            vector[h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+class SentenceTransformerEmbedder:
+    """Local CPU sentence embedding model (needs the sentence-transformers package)."""
+
+    def __init__(self, model_name):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.dim = self.model.get_sentence_embedding_dimension()
+
+    def embed(self, text):
+        return self.model.encode(text, normalize_embeddings=True).astype(np.float32)
+
+
+def get_embedder():
+    """
+    Use the sentence embedding model named in SEMANTIC_CACHE_MODEL when it can be
+    loaded, otherwise fall back to the hashed n-gram vectorizer.
+    """
+    model_name = os.getenv("SEMANTIC_CACHE_MODEL")
+    if model_name:
+        try:
+            return SentenceTransformerEmbedder(model_name)
+        except Exception as e:
+            print(f"Semantic cache: could not load embedding model {model_name!r} ({e}), using hashing embedder")
+    return HashingEmbedder()
+
+
+class BruteForceIndex:
+    """Exact search: one matrix-vector product over all stored (unit) vectors."""
+
+    def __init__(self, dim, initial_capacity=1024):
+        self.dim = dim
+        self._vectors = np.zeros((initial_capacity, dim), dtype=np.float32)
+        self.size = 0
+
+    def _reserve(self, count):
+        capacity = len(self._vectors)
+        if self.size + count <= capacity:
+            return
+        while capacity < self.size + count:
+            capacity *= 2
+        grown = np.zeros((capacity, self.dim), dtype=np.float32)
+        grown[:self.size] = self._vectors[:self.size]
+        self._vectors = grown
+
+    def add(self, vector):
+        return self.add_many(np.asarray(vector, dtype=np.float32)[None, :])[0]
+
+    def remove(self, row):
+        """Zero the vector at `row` so it never matches; its row id stays taken."""
+        self._vectors[row] = 0
+
+    def keep(self, rows):
+        """Keep only the vectors at `rows` (ascending), renumbered 0..len(rows)-1."""
+        rows = np.asarray(rows, dtype=np.int64)
+        self._vectors[:len(rows)] = self._vectors[rows]
+        self._vectors[len(rows):self.size] = 0
+        self.size = len(rows)
+
+    def add_many(self, vectors):
+        """Append a (n, dim) block of vectors and return their row ids."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        self._reserve(len(vectors))
+        start = self.size
+        self._vectors[start:start + len(vectors)] = vectors
+        self.size += len(vectors)
+        return range(start, self.size)
+
+    def search(self, vector):
+        """Return (row_id, similarity) of the nearest stored vector, or (None, 0.0)."""
+        if self.size == 0:
+            return None, 0.0
+        scores = self._vectors[:self.size] @ vector
+        best = int(np.argmax(scores))
+        return best, float(scores[best])
+
+
+class IVFIndex(BruteForceIndex):
+    """
+    Approximate search with an inverted file: vectors are bucketed under the
+    nearest of `nlist` k-means centroids and a query only scans the `nprobe`
+    closest buckets. Below `train_size` vectors it behaves like BruteForceIndex;
+    the centroids are retrained whenever the index has doubled since the last
+    training.
+    """
+
+    def __init__(self, dim, nprobe=8, train_size=4096, initial_capacity=1024):
+        super().__init__(dim, initial_capacity)
+        self.nprobe = nprobe
+        self.train_size = train_size
+        self._centroids = None
+        self._lists = []
+        self._list_arrays = []
+        self._trained_at = 0
+
+    def add_many(self, vectors):
+        rows = super().add_many(vectors)
+        if self.size >= max(self.train_size, 2 * self._trained_at):
+            self.train()
+        elif self._centroids is not None:
+            buckets = self._assign(self._vectors[rows.start:rows.stop])
+            for row, bucket in zip(rows, buckets.tolist()):
+                self._lists[bucket].append(row)
+                self._list_arrays[bucket] = None
+        return rows
+
+    def _assign(self, vectors):
+        assignment = np.empty(len(vectors), dtype=np.int64)
+        # Assign in chunks so the (n x nlist) score matrix stays small
+        for start in range(0, len(vectors), 65536):
+            assignment[start:start + 65536] = np.argmax(vectors[start:start + 65536] @ self._centroids.T, axis=1)
+        return assignment
+
+    def train(self, iterations=10, sample_size=20000, seed=0):
+        vectors = self._vectors[:self.size]
+        nlist = max(1, min(int(4 * np.sqrt(self.size)), self.size // 16))
+        rng = np.random.default_rng(seed)
+        sample = vectors[rng.choice(self.size, min(sample_size, self.size), replace=False)]
+        centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            # Spherical k-means: the normalized member sum is the new centroid
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, sample)
+            norms = np.linalg.norm(sums, axis=1)
+            nonempty = norms > 0
+            centroids[nonempty] = sums[nonempty] / norms[nonempty, None]
+
+        self._centroids = centroids
+        assignment = self._assign(vectors)
+        order = np.argsort(assignment, kind="stable")
+        bounds = np.searchsorted(assignment[order], np.arange(nlist + 1))
+        self._lists = [order[bounds[k]:bounds[k + 1]].tolist() for k in range(nlist)]
+        self._list_arrays = [None] * nlist
+        self._trained_at = self.size
+
+    def keep(self, rows):
+        super().keep(rows)
+        self._centroids = None
+        self._lists, self._list_arrays = [], []
+        self._trained_at = 0
+        if self.size >= self.train_size:
+            self.train()
+
+    def _bucket_ids(self, bucket):
+        ids = self._list_arrays[bucket]
+        if ids is None:
+            ids = self._list_arrays[bucket] = np.asarray(self._lists[bucket], dtype=np.int64)
+        return ids
+
+    def search(self, vector):
+        if self._centroids is None:
+            return super().search(vector)
+        nprobe = min(self.nprobe, len(self._centroids))
+        probes = np.argpartition(-(self._centroids @ vector), nprobe - 1)[:nprobe]
+        ids = np.concatenate([self._bucket_ids(bucket) for bucket in probes])
+        if len(ids) == 0:
+            return None, 0.0
+        scores = self._vectors[ids] @ vector
+        best = int(np.argmax(scores))
+        return int(ids[best]), float(scores[best])
+
+
+class SemanticCache:
+    """
+    Serves the stored answer of the most similar previously answered question
+    when the similarity is at least `threshold` and both questions carry the
+    same guard words (_guard_tokens()).
+
+    Entries expire after `ttl_seconds` and the oldest are dropped beyond
+    `max_entries`. With `still_cached`, a function of the stored question, an
+    entry is only served while that returns True, so entries live no longer
+    than the exact-match cache entry they were copied from.
+    """
+
+    def __init__(self, embedder=None, index=None, threshold=0.95, max_entries=10000, ttl_seconds=None,
+                 still_cached=None):
+        self.embedder = embedder or get_embedder()
+        self.index = index or BruteForceIndex(self.embedder.dim)
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.still_cached = still_cached
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # Per index row: (guard tokens, question, answer, expires_at or None), None once dropped
+        self._entries = []
+        self._live = 0
+        self._oldest = 0  # rows before this one are all dropped
+        self._lock = threading.Lock()
+
+    def lookup(self, question):
+        """Return (answer, similarity) for a near-duplicate question, or None."""
+        vector = self.embedder.embed(question)
+        with self._lock:
+            row, similarity = self.index.search(vector)
+            entry = self._entries[row] if row is not None else None
+            if entry is not None and similarity >= self.threshold and (
+                    entry[3] is not None and entry[3] <= time.time()
+                    or self.still_cached is not None and not self.still_cached(entry[1])):
+                self._drop(row)
+                self.evictions += 1
+                entry = None
+            if entry is None or similarity < self.threshold or entry[0] != _guard_tokens(question):
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[2], similarity
+
+    def add(self, question, answer, expires_at=None):
+        """Store an answer; `expires_at` (a time.time() value) defaults to now + ttl_seconds."""
+        if expires_at is None and self.ttl_seconds:
+            expires_at = time.time() + self.ttl_seconds
+        vector = self.embedder.embed(question)
+        with self._lock:
+            self.index.add(vector)
+            self._entries.append((_guard_tokens(question), question, answer, expires_at))
+            self._live += 1
+            while self._live > self.max_entries:
+                while self._entries[self._oldest] is None:
+                    self._oldest += 1
+                self._drop(self._oldest)
+                self.evictions += 1
+            # Rebuild once dropped rows outnumber the live ones
+            if self.index.size > max(2 * self._live, 1024):
+                self._compact()
+
+    def _drop(self, row):
+        self.index.remove(row)
+        self._entries[row] = None
+        self._live -= 1
+
+    def _compact(self):
+        rows = [row for row, entry in enumerate(self._entries) if entry is not None]
+        self.index.keep(rows)
+        self._entries = [self._entries[row] for row in rows]
+        self._oldest = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "size": self._live,
+            "max_entries": self.max_entries,
+            "threshold": self.threshold,
+            "index": type(self.index).__name__,
+        }
+
+
+def create_semantic_cache(ttl_seconds=None, still_cached=None):
+    """Build the cache from the SEMANTIC_CACHE_* environment settings."""
+    embedder = get_embedder()
+    default_threshold = "0.95" if isinstance(embedder, HashingEmbedder) else "0.92"
+    threshold = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", default_threshold))
+    if os.getenv("SEMANTIC_CACHE_INDEX", "bruteforce").lower() == "ivf":
+        index = IVFIndex(embedder.dim, nprobe=int(os.getenv("SEMANTIC_CACHE_NPROBE", "8")))
+    else:
+        index = BruteForceIndex(embedder.dim)
+    max_entries = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "10000"))
+    return SemanticCache(embedder, index, threshold, max_entries, ttl_seconds, still_cached)
@@ -1 +1,202 @@
-conversation_states = {}
\ No newline at end of file
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# Conversation state for multi-turn slot filling, keyed by the session_id the
+# browser sends. Three interchangeable stores:
+#
+#     memory  per-process LRU with TTL (default)
+#     sqlite  a file shared by every worker on the host
+#     redis   shared by every host; any client with get/set(ex=)/delete works
+#
+# All of them hold the state as compact JSON, so a store never hands out a
+# reference to a dict another request might be mutating.
+
+
+def dump_state(state):
+    """Serialize a state dict, leaving out empty values."""
+    return json.dumps(_compact(state), separators=(",", ":"))
+
+
+def load_state(data):
+    if data is None:
+        return None
+    if isinstance(data, bytes):
+        data = data.decode("utf-8")
+    return json.loads(data)
+
+
+def _compact(value):
+    if isinstance(value, dict):
+        return {key: _compact(item) for key, item in value.items() if item is not None and item != ""}
+    if isinstance(value, list):
+        return [_compact(item) for item in value]
+    return value
+
+
+class MemorySessionStore:
+    """In-process store: at most `max_sessions` entries, least recently used evicted first."""
+
+    def __init__(self, max_sessions=10000, ttl_seconds=1800):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # session_id -> (expires_at, data)
+        self._lock = threading.Lock()
+
+    def get(self, session_id):
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None:
+                return None
+            if entry[0] <= time.time():
+                del self._entries[session_id]
+                return None
+            self._entries.move_to_end(session_id)
+            return load_state(entry[1])
+
+    def set(self, session_id, state):
+        data = dump_state(state)
+        with self._lock:
+            self._entries[session_id] = (time.time() + self.ttl_seconds, data)
+            self._entries.move_to_end(session_id)
+            while len(self._entries) > self.max_sessions:
+                self._entries.popitem(last=False)
+
+    def delete(self, session_id):
+        with self._lock:
+            self._entries.pop(session_id, None)
+
+    def expire(self):
+        """Drop expired sessions; returns how many were removed."""
+        now = time.time()
+        with self._lock:
+            expired = [session_id for session_id, (expires_at, _) in self._entries.items() if expires_at <= now]
+            for session_id in expired:
+                del self._entries[session_id]
+        return len(expired)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteSessionStore:
+    """Sessions in an SQLite file, so every worker process on the host sees them."""
+
+    def __init__(self, path, ttl_seconds=1800):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=5.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS Sessions (
+                session_id TEXT PRIMARY KEY,
+                state TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        ''')
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_expires_at ON Sessions (expires_at)")
+        self._conn.commit()
+
+    def get(self, session_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT state FROM Sessions WHERE session_id = ? AND expires_at > ?", (session_id, time.time())
+            ).fetchone()
+        return load_state(row[0]) if row else None
+
+    def set(self, session_id, state):
+        data = dump_state(state)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO Sessions (session_id, state, expires_at) VALUES (?, ?, ?)",
+                (session_id, data, time.time() + self.ttl_seconds)
+            )
+            self._conn.commit()
+
+    def delete(self, session_id):
+        with self._lock:
+            self._conn.execute("DELETE FROM Sessions WHERE session_id = ?", (session_id,))
+            self._conn.commit()
+
+    def expire(self):
+        with self._lock:
+            removed = self._conn.execute("DELETE FROM Sessions WHERE expires_at <= ?", (time.time(),)).rowcount
+            self._conn.commit()
+        return removed
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM Sessions").fetchone()[0]
+
+
+class RedisSessionStore:
+    """
+    Sessions in Redis (or anything speaking its get/set/delete commands). Keys
+    carry a TTL, so the server expires abandoned conversations by itself.
+    """
+
+    def __init__(self, client, ttl_seconds=1800, prefix="session:"):
+        self.client = client
+        self.ttl_seconds = ttl_seconds
+        self.prefix = prefix
+
+    def get(self, session_id):
+        return load_state(self.client.get(self.prefix + session_id))
+
+    def set(self, session_id, state):
+        self.client.set(self.prefix + session_id, dump_state(state), ex=self.ttl_seconds)
+
+    def delete(self, session_id):
+        self.client.delete(self.prefix + session_id)
+
+    def expire(self):
+        return 0
+
+
+def start_expiry_thread(store, interval):
+    """Purge expired sessions every `interval` seconds on a daemon thread."""
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                store.expire()
+            except Exception as e:
+                print("Session expiry error:", e)
+
+    thread = threading.Thread(target=run, name="session-expiry", daemon=True)
+    thread.start()
+    return thread
+
+
+def create_session_store():
+    """
+    Build the store named by SESSION_STORE (memory, sqlite or redis). Sessions
+    expire SESSION_TTL_SECONDS after the last turn.
+    """
+    backend = os.getenv("SESSION_STORE", "memory").lower()
+    ttl_seconds = int(os.getenv("SESSION_TTL_SECONDS", "1800"))
+
+    if backend == "redis":
+        try:
+            import redis
+            client = redis.Redis.from_url(os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+            client.ping()
+            return RedisSessionStore(client, ttl_seconds)
+        except Exception as e:
+            print(f"Session store: could not connect to Redis ({e}), using memory store")
+    elif backend == "sqlite":
+        store = SQLiteSessionStore(os.getenv("SESSION_DB_FILE", "sessions.sqlite3"), ttl_seconds)
+        start_expiry_thread(store, int(os.getenv("SESSION_EXPIRY_INTERVAL", "60")))
+        return store
+
+    store = MemorySessionStore(int(os.getenv("SESSION_MAX_ENTRIES", "10000")), ttl_seconds)
+    start_expiry_thread(store, int(os.getenv("SESSION_EXPIRY_INTERVAL", "60")))
+    return store
+
+
+session_store = create_session_store()
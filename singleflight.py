@@ -0,0 +1,193 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import weakref
+
+from tracing import record_usage
+
+# Request coalescing for model calls. Identical prompts sent to the same model
+# while a call for them is still in flight - a double-clicked send button, or
+# several users asking the same thing at once - wait for that call and share
+# its result instead of making their own. Works for threaded (Flask) and
+# asyncio (asgi.py) callers; counts are in coalesce_stats().
+
+# Set SINGLE_FLIGHT=false to give every caller its own model call
+SINGLE_FLIGHT = os.getenv("SINGLE_FLIGHT", "true").lower() not in ("0", "false", "no")
+
+_stats = {"calls": 0, "upstream": 0, "coalesced": 0}
+_stats_lock = threading.Lock()
+
+
+def _count(coalesced):
+    with _stats_lock:
+        _stats["calls"] += 1
+        _stats["upstream" if not coalesced else "coalesced"] += 1
+
+
+def coalesce_stats():
+    """{"calls", "upstream", "coalesced"}: model calls requested, made, and shared."""
+    with _stats_lock:
+        return dict(_stats)
+
+
+def model_name(llm):
+    return getattr(llm, "model", None) or getattr(llm, "model_name", None) or type(llm).__name__
+
+
+def call_key(llm, prompt):
+    """(model, hash of the prompt and any bound call options such as a JSON schema)."""
+    options = json.dumps(getattr(llm, "kwargs", None), sort_keys=True, default=str)
+    digest = hashlib.sha256(f"{options}\0{prompt}".encode("utf-8")).hexdigest()
+    return model_name(llm), digest
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """In-flight calls shared between threads, keyed by call_key()."""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def begin(self, key):
+        """(call, leader): the leader makes the call and must finish() it; others wait()."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        _count(not leader)
+        return call, leader
+
+    def finish(self, key, call, result=None, error=None):
+        if error is not None and not isinstance(error, Exception):
+            # The leader's generator was closed; that isn't the followers' error
+            error = RuntimeError(f"shared call abandoned ({type(error).__name__})")
+        with self._lock:
+            if self._calls.get(key) is call:
+                del self._calls[key]
+        call.result, call.error = result, error
+        call.done.set()
+
+    @staticmethod
+    def wait(call):
+        call.done.wait()
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def do(self, key, fn):
+        """fn() for the first caller with `key`; concurrent callers get its result."""
+        call, leader = self.begin(key)
+        if not leader:
+            return self.wait(call)
+        try:
+            result = fn()
+        except BaseException as e:
+            self.finish(key, call, error=e)
+            raise
+        self.finish(key, call, result=result)
+        return result
+
+
+class AsyncSingleFlight:
+    """In-flight calls shared between asyncio tasks of the same event loop."""
+
+    def __init__(self):
+        # {event loop: {key: future or task}}; both belong to one loop
+        self._calls = weakref.WeakKeyDictionary()
+
+    def _loop_calls(self):
+        return self._calls.setdefault(asyncio.get_running_loop(), {})
+
+    def begin(self, key):
+        """(future, leader): the leader produces the result and must finish() it; others wait()."""
+        calls = self._loop_calls()
+        future = calls.get(key)
+        leader = future is None
+        if leader:
+            future = calls[key] = asyncio.get_running_loop().create_future()
+        _count(not leader)
+        return future, leader
+
+    def finish(self, key, future, result=None, error=None):
+        calls = self._loop_calls()
+        if calls.get(key) is future:
+            del calls[key]
+        if future.done():
+            return
+        if error is not None:
+            if not isinstance(error, Exception):
+                # The leader was cancelled or closed; that isn't the followers' error
+                error = RuntimeError(f"shared call abandoned ({type(error).__name__})")
+            future.set_exception(error)
+            future.exception()  # followers re-raise it; don't warn when there are none
+        else:
+            future.set_result(result)
+
+    @staticmethod
+    async def wait(future):
+        # shield: a caller giving up must not cancel the shared call
+        return await asyncio.shield(future)
+
+    async def do(self, key, coro_fn):
+        """
+        await coro_fn() for the first caller with `key`; concurrent callers await
+        the same task. The call runs as its own task, so it finishes for the
+        others even if the caller that started it is cancelled.
+        """
+        calls = self._loop_calls()
+        task = calls.get(key)
+        leader = task is None
+        if leader:
+            task = calls[key] = asyncio.ensure_future(coro_fn())
+            task.add_done_callback(lambda done: self._done(calls, key, done))
+        _count(not leader)
+        return await self.wait(task)
+
+    @staticmethod
+    def _done(calls, key, task):
+        if calls.get(key) is task:
+            del calls[key]
+        if not task.cancelled():
+            task.exception()
+
+
+flights = SingleFlight()
+async_flights = AsyncSingleFlight()
+
+
+def _invoke_counted(llm, prompt):
+    # Token usage is counted once per upstream call, by the caller that made it
+    response = llm.invoke(prompt)
+    record_usage(response)
+    return response
+
+
+def invoke(llm, prompt):
+    """llm.invoke(prompt), shared with identical calls already in flight."""
+    if not SINGLE_FLIGHT:
+        return _invoke_counted(llm, prompt)
+    return flights.do(call_key(llm, prompt), lambda: _invoke_counted(llm, prompt))
+
+
+async def ainvoke(llm, prompt, coro_fn=None):
+    """await llm.ainvoke(prompt) (or coro_fn()), shared with identical calls already in flight."""
+    coro_fn = coro_fn or (lambda: llm.ainvoke(prompt))
+
+    async def call():
+        response = await coro_fn()
+        record_usage(response)
+        return response
+
+    if not SINGLE_FLIGHT:
+        return await call()
+    return await async_flights.do(call_key(llm, prompt), call)
@@ -0,0 +1,146 @@
+import datetime
+import difflib
+import os
+import re
+import threading
+import time
+
+import datetime_normalizer
+from database import get_specializations
+
+# Local parsers for the answers to "Please provide your <field>". A follow-up is
+# usually just "34", "female" or "5 PM", which doesn't need the LLM: each parser
+# validates and normalizes one field and returns None when it can't, in which
+# case handle_web_request() falls back to ai.extract_field().
+
+_NUMBER = re.compile(r"\d+")
+_EMAIL = re.compile(r"[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}")
+_PHONE_CHARACTERS = re.compile(r"^\+?[\d\s().-]+$")
+_NAME = re.compile(r"^[A-Za-z][A-Za-z .'-]*$")
+# Ages are stored in whole years; an age given in another unit is converted,
+# and one under a year can't be stored
+_AGE_UNITS = [
+    (re.compile(r"\d+\s*(months?|mos?)\b", re.IGNORECASE), 12),
+    (re.compile(r"\d+\s*(weeks?|wks?)\b", re.IGNORECASE), 52),
+    (re.compile(r"\d+\s*days?\b", re.IGNORECASE), 365),
+]
+
+GENDERS = {
+    "m": "Male", "male": "Male", "man": "Male", "boy": "Male",
+    "f": "Female", "female": "Female", "woman": "Female", "girl": "Female",
+    "other": "Other", "non-binary": "Other", "nonbinary": "Other",
+}
+
+# How many days ahead an appointment can be booked
+BOOKING_HORIZON_DAYS = int(os.getenv("BOOKING_HORIZON_DAYS", "365"))
+
+# Seconds the list of departments read from the Doctors table is reused
+DEPARTMENTS_REFRESH_SECONDS = 300
+_departments = {"values": [], "loaded_at": 0.0}
+_departments_lock = threading.Lock()
+
+
+def departments():
+    with _departments_lock:
+        if time.monotonic() - _departments["loaded_at"] > DEPARTMENTS_REFRESH_SECONDS:
+            _departments["values"] = get_specializations()
+            _departments["loaded_at"] = time.monotonic()
+        return _departments["values"]
+
+
+def parse_age(text):
+    numbers = _NUMBER.findall(text)
+    if len(numbers) != 1:
+        return None
+    age = int(numbers[0])
+    for unit, per_year in _AGE_UNITS:
+        if unit.search(text):
+            age //= per_year
+            break
+    return age if 0 < age <= 120 else None
+
+
+def parse_gender(text):
+    return GENDERS.get(text.strip().lower().rstrip("."))
+
+
+def parse_contact_number(text):
+    text = text.strip()
+    if not _PHONE_CHARACTERS.match(text):
+        return None
+    digits = re.sub(r"\D", "", text)
+    if not 7 <= len(digits) <= 15:
+        return None
+    return ("+" if text.startswith("+") else "") + digits
+
+
+def parse_email(text):
+    match = _EMAIL.search(text)
+    return match.group(0).lower() if match else None
+
+
+def parse_department(text):
+    """Match against the specializations of the doctors on file."""
+    by_name = {department.lower(): department for department in departments()}
+    answer = text.strip().lower().rstrip(".").removesuffix(" department")
+    if answer in by_name:
+        return by_name[answer]
+    # "cardio", "neuro"
+    prefixed = [name for name in by_name if len(answer) >= 4 and name.startswith(answer)]
+    if len(prefixed) == 1:
+        return by_name[prefixed[0]]
+    # Typos such as "cardiolgy"
+    close = difflib.get_close_matches(answer, list(by_name), n=1, cutoff=0.8)
+    return by_name[close[0]] if close else None
+
+
+def parse_time(text):
+    parsed = datetime_normalizer.parse_time(text)
+    return f"{parsed[0]:02d}:{parsed[1]:02d}" if parsed else None
+
+
+def parse_date(text):
+    date = datetime_normalizer.parse_date(text)
+    return date.isoformat() if date else None
+
+
+def parse_appointment_date(text):
+    """A date from today to BOOKING_HORIZON_DAYS ahead; past and far-off dates are asked for again."""
+    date = datetime_normalizer.parse_date(text)
+    today = datetime.date.today()
+    if date is None or not today <= date <= today + datetime.timedelta(days=BOOKING_HORIZON_DAYS):
+        return None
+    return date.isoformat()
+
+
+def parse_name(text):
+    text = " ".join(text.split())
+    if not _NAME.match(text) or len(text.split()) > 4 or len(text) > 60:
+        return None
+    return text
+
+
+FIELD_PARSERS = {
+    "age": parse_age,
+    "gender": parse_gender,
+    "contact_number": parse_contact_number,
+    "email": parse_email,
+    "department": parse_department,
+    "name": parse_name,
+    "appointment_time": parse_time,
+    "old_time": parse_time,
+    "new_time": parse_time,
+    "appointment_date": parse_appointment_date,
+    # The existing appointment's date, which may be in the past
+    "old_date": parse_date,
+    "new_date": parse_appointment_date,
+}
+
+
+def parse_field(field, text):
+    """Normalized value of `field` in `text`, or None when it can't be parsed locally."""
+    if not isinstance(text, str) or not text.strip():
+        return None
+    parser = FIELD_PARSERS.get(field)
+    # Free-text fields are taken as given
+    return parser(text) if parser else text.strip()
@@ -9,14 +9,77 @@ class ChatSystem {
         this.chatState = {};
         this.isCollecting = false;
         this.isTyping = false;
+        // Details collected so far are kept on the server under this id
+        this.sessionId = sessionStorage.getItem('chatSessionId') || this.newSessionId();
+        sessionStorage.setItem('chatSessionId', this.sessionId);
         this.initializeChat();
     }
 
+    newSessionId() {
+        if (window.crypto?.randomUUID) return crypto.randomUUID();
+        return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+    }
+
     initializeChat() {
         this.restoreChatHistory();
         this.setupEventListeners();
         this.updateAppointments();
-        setInterval(() => this.updateAppointments(), 3000);
+        this.connectAppointmentStream();
+    }
+
+    // Appointment changes are pushed over Server-Sent Events; polling is only
+    // used when the browser or a proxy can't keep the stream open
+    connectAppointmentStream() {
+        if (!window.EventSource) {
+            this.startAppointmentPolling();
+            return;
+        }
+        const source = new EventSource('/api/appointments/stream');
+        source.addEventListener('appointment', (event) => {
+            this.applyAppointmentChange(JSON.parse(event.data));
+        });
+        source.addEventListener('resync', () => this.updateAppointments());
+        source.addEventListener('ready', () => this.stopAppointmentPolling());
+        source.onerror = () => {
+            // EventSource reconnects by itself; poll until it is back
+            this.startAppointmentPolling();
+            if (source.readyState === EventSource.CLOSED) {
+                setTimeout(() => this.connectAppointmentStream(), 10000);
+            }
+        };
+    }
+
+    startAppointmentPolling() {
+        if (!this.pollTimer) {
+            this.pollTimer = setInterval(() => this.updateAppointments(), 3000);
+        }
+    }
+
+    stopAppointmentPolling() {
+        clearInterval(this.pollTimer);
+        this.pollTimer = null;
+        this.updateAppointments();
+    }
+
+    applyAppointmentChange(change) {
+        const appointment = change.appointment;
+        const appointments = [...(this.appointments || [])];
+        const existing = appointments.findIndex(app => app.id === appointment.id);
+        if (change.type === 'deleted') {
+            if (existing < 0) {
+                return;
+            }
+            appointments.splice(existing, 1);
+        } else if (existing >= 0) {
+            appointments[existing] = appointment;
+        } else if (change.type === 'booked') {
+            appointments.unshift(appointment);
+        } else {
+            // A change made elsewhere; let the server say where it belongs
+            this.updateAppointments();
+            return;
+        }
+        this.renderAppointments(appointments);
     }
 
     setupEventListeners() {
@@ -38,8 +101,12 @@ class ChatSystem {
             return;
         }
 
-        if (response.missing_fields?.length > 0) {
-            this.missingFields = response.missing_fields;
+        // The server tracks what is still missing; an empty list means done
+        this.missingFields = response.missing_fields || [];
+        if (response.invalid_field) {
+            this.appendMessage(`Sorry, that doesn't look like a valid ${response.invalid_field.replace(/_/g, ' ')}.`, false);
+        }
+        if (this.missingFields.length > 0) {
             this.currentState = response.current_state;
             this.currentIntent = response.intent;
             this.askNextField();
@@ -158,12 +225,10 @@ class ChatSystem {
         input.value = '';
         this.appendMessage(message, true);
 
-        if (this.missingFields.length > 0) {
-            this.handleUserInput(message);
-        } else {
-            const response = await this.fetchAIResponse(message);
-            this.processAIResponse(response);
-        }
+        // Replies to "Please provide your ..." go to the server like any other
+        // message; the session remembers which field was asked for
+        const response = await this.fetchAIResponse(message);
+        this.processAIResponse(response);
     
             }
 
@@ -189,12 +254,17 @@ class ChatSystem {
                 const response = await fetch('/ai-response', { 
                     method: 'POST',
                     headers: { 'Content-Type': 'application/json' },
-                    body: JSON.stringify({ message })
+                    body: JSON.stringify({ message, session_id: this.sessionId, stream: true })
                 });
 
                 console.log("🔹 API Response Status:", response.status);
 
                 if (!response.ok) throw new Error('Failed to get AI response');
+                // Medical answers come back as an event stream and are shown as they arrive
+                if ((response.headers.get('Content-Type') || '').includes('text/event-stream')) {
+                    await this.readAnswerStream(response);
+                    return {};
+                }
                 return await response.json(); // Directly return the JSON response
 
             } catch (error) {
@@ -203,6 +273,40 @@ class ChatSystem {
             }
         }
 
+    // Reads the "token" events of a streamed answer into one bot message
+    async readAnswerStream(response) {
+        const messageDiv = this.appendMessage('', false);
+        const text = document.createElement('span');
+        messageDiv.querySelector('.message-content').appendChild(text);
+        const messagesDiv = document.getElementById('chatMessages');
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let answer = '';
+        while (true) {
+            const { done, value } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            const events = buffer.split('\n\n');
+            buffer = events.pop();
+            for (const event of events) {
+                const type = (event.match(/^event: (.*)$/m) || [])[1];
+                const data = (event.match(/^data: (.*)$/m) || [])[1];
+                if (!data) continue;
+                const payload = JSON.parse(data);
+                if (type === 'token') {
+                    answer += payload.text;
+                } else if (type === 'done') {
+                    answer = payload.message;
+                }
+                text.innerHTML = this.formatMessageContent(answer);
+                messagesDiv.scrollTop = messagesDiv.scrollHeight;
+            }
+        }
+        return answer;
+    }
+
     appendMessage(content, isUser) {
         const messagesDiv = document.getElementById('chatMessages');
         const messageDiv = document.createElement('div');
@@ -220,6 +324,7 @@ class ChatSystem {
 
         messagesDiv.appendChild(messageDiv);
         messagesDiv.scrollTop = messagesDiv.scrollHeight;
+        return messageDiv;
     }
 
     formatMessageContent(content) {
@@ -244,8 +349,16 @@ class ChatSystem {
     // Appointment System
     async updateAppointments() {
         try {
-            const response = await fetch('/api/appointments'); // Add 'const'
+            // Only the four most recent appointments are shown; the ETag lets the
+            // server answer 304 when nothing changed since the last poll
+            const headers = this.appointmentsEtag ? { 'If-None-Match': this.appointmentsEtag } : {};
+            const response = await fetch(
+                '/api/appointments?limit=4&order=desc&fields=id,patientName,date,time,doctorName,status',
+                { headers, cache: 'no-store' }
+            );
+            if (response.status === 304) return;
             const data = await response.json();
+            this.appointmentsEtag = response.headers.get('ETag');
             this.renderAppointments(data.appointments);
         } catch (error) {
             console.error('Error updating appointments:', error);
@@ -253,8 +366,10 @@ class ChatSystem {
     }
 
     renderAppointments(appointments) {
+        // appointments are newest first
         const container = document.getElementById('appointments-container');
-        const lastFour = appointments.slice(-4).reverse();
+        const lastFour = appointments.slice(0, 4);
+        this.appointments = lastFour;
         
         container.innerHTML = lastFour.map(app => `
             <div class="appointment-card">
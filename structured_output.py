@@ -0,0 +1,210 @@
+import ast
+import json
+import os
+import re
+
+# Parsing of the extraction model's JSON answer. Where the model supports it the
+# call asks for JSON output constrained to EXTRACTION_SCHEMA; otherwise (and as
+# a safety net) loads() repairs the usual formatting slips - code fences, prose
+# around the object, trailing commas, single quotes, Python literals - so a
+# slightly malformed answer doesn't cost the user another round-trip. The
+# result is checked against the typed fields of its intent by validate().
+
+# Ask the model for schema-constrained JSON output where supported
+STRUCTURED_OUTPUT = os.getenv("STRUCTURED_OUTPUT", "true").lower() not in ("0", "false", "no")
+
+INTENTS = ("book", "reschedule", "cancel", "view")
+
+FIELD_TYPES = {
+    "intent": str,
+    "name": str,
+    "appointment_date": str,
+    "appointment_time": str,
+    "doctor": str,
+    "age": int,
+    "gender": str,
+    "contact_number": str,
+    "email": str,
+    "department": str,
+}
+RESCHEDULE_FIELD_TYPES = {"old_date": str, "old_time": str, "new_date": str, "new_time": str}
+
+# Typed fields kept for each intent; None is used when the intent is unknown
+INTENT_SCHEMAS = {
+    "book": FIELD_TYPES,
+    "reschedule": {**FIELD_TYPES, **RESCHEDULE_FIELD_TYPES},
+    "cancel": FIELD_TYPES,
+    "view": FIELD_TYPES,
+    None: {**FIELD_TYPES, **RESCHEDULE_FIELD_TYPES},
+}
+
+_JSON_TYPES = {str: "string", int: "integer"}
+
+
+def json_schema(include_route=False):
+    """JSON schema of the extraction answer, for providers with structured output."""
+    properties = {
+        field: {"type": [_JSON_TYPES[kind], "null"]}
+        for field, kind in INTENT_SCHEMAS[None].items()
+    }
+    properties["intent"] = {"type": ["string", "null"], "enum": list(INTENTS) + [None]}
+    required = ["intent"]
+    if include_route:
+        properties["route"] = {"type": "string", "enum": ["medical", "appointment"]}
+        required.append("route")
+    return {"type": "object", "properties": properties, "required": required}
+
+
+EXTRACTION_SCHEMA = json_schema()
+ROUTE_AND_EXTRACT_SCHEMA = json_schema(include_route=True)
+
+# {id(llm): (llm, {include_route: bound llm})}
+_bound = {}
+
+
+def json_llm(llm, include_route=False):
+    """
+    `llm` set up to answer with JSON matching the extraction schema: a response
+    schema for Gemini, JSON mode for OpenAI and Azure. Other models are
+    returned unchanged and rely on loads().
+    """
+    if not STRUCTURED_OUTPUT or not hasattr(llm, "bind"):
+        return llm
+    entry = _bound.get(id(llm))
+    if entry is None or entry[0] is not llm:
+        entry = _bound[id(llm)] = (llm, {})
+    bound = entry[1].get(include_route)
+    if bound is None:
+        kind = getattr(llm, "_llm_type", None)
+        schema = ROUTE_AND_EXTRACT_SCHEMA if include_route else EXTRACTION_SCHEMA
+        if kind == "chat-google-generative-ai":
+            bound = llm.bind(response_mime_type="application/json", response_json_schema=schema)
+        elif kind in ("openai-chat", "azure-openai-chat"):
+            bound = llm.bind(response_format={"type": "json_object"})
+        else:
+            bound = llm
+        entry[1][include_route] = bound
+    return bound
+
+
+_FENCE = re.compile(r"```(?:json|JSON)?\s*(.*?)\s*```", re.DOTALL)
+_STRING = re.compile(r'"(?:[^"\\]|\\.)*"|\'(?:[^\'\\]|\\.)*\'', re.DOTALL)
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+_PY_LITERALS = {"None": "null", "True": "true", "False": "false"}
+_PY_LITERAL = re.compile(r"\b(None|True|False)\b")
+
+
+def _first_object(text):
+    """The first balanced {...} in `text`, skipping braces inside strings."""
+    start = text.find("{")
+    if start < 0:
+        return None
+    depth = 0
+    quote = None
+    escaped = False
+    for i in range(start, len(text)):
+        char = text[i]
+        if quote:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == quote:
+                quote = None
+        elif char in "\"'":
+            quote = char
+        elif char == "{":
+            depth += 1
+        elif char == "}":
+            depth -= 1
+            if depth == 0:
+                return text[start:i + 1]
+    return text[start:]
+
+
+def _repair(text):
+    # Rewrite 'single quoted' strings, and Python literals outside of strings
+    parts = []
+    last = 0
+    for match in _STRING.finditer(text):
+        parts.append(_PY_LITERAL.sub(lambda m: _PY_LITERALS[m.group(1)], text[last:match.start()]))
+        token = match.group(0)
+        if token.startswith("'"):
+            token = json.dumps(token[1:-1].replace("\\'", "'"))
+        parts.append(token)
+        last = match.end()
+    parts.append(_PY_LITERAL.sub(lambda m: _PY_LITERALS[m.group(1)], text[last:]))
+    return _TRAILING_COMMA.sub(r"\1", "".join(parts))
+
+
+def loads(text):
+    """
+    (value, repaired) for the JSON object in a model answer; `repaired` is True
+    when plain json.loads() of the answer would have failed. Raises ValueError
+    when no object can be recovered.
+    """
+    text = (text or "").strip()
+    try:
+        return json.loads(text), False
+    except json.JSONDecodeError:
+        pass
+
+    fenced = _FENCE.search(text)
+    candidate = _first_object(fenced.group(1) if fenced else text)
+    if candidate is None:
+        raise ValueError("no JSON object in response")
+    for attempt in (candidate, _repair(candidate)):
+        try:
+            return json.loads(attempt), True
+        except json.JSONDecodeError:
+            pass
+    try:
+        # Last resort for dict reprs the repairs above don't cover
+        value = ast.literal_eval(candidate)
+    except (ValueError, SyntaxError, MemoryError, RecursionError):
+        raise ValueError("unparseable JSON object in response")
+    return value, True
+
+
+def _coerce(value, kind):
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = value.strip()
+        if value.lower() in ("", "null", "none", "n/a", "unknown"):
+            return None
+    if kind is int:
+        if isinstance(value, bool):
+            return None
+        if isinstance(value, (int, float)):
+            return int(value)
+        match = re.search(r"\d+", str(value))
+        return int(match.group()) if match else None
+    if isinstance(value, (dict, list)):
+        return None
+    return str(value)
+
+
+def _intent(value):
+    value = str(value or "").strip().lower()
+    for intent in INTENTS:
+        if value.startswith(intent[:4]):
+            return intent
+    return None
+
+
+def validate(data):
+    """
+    The extraction answer reduced to the typed fields of its intent: unknown
+    keys dropped, missing ones set to None and values coerced to the field's
+    type (a value that can't be coerced becomes None and is asked for again).
+    Raises ValueError when the answer isn't a JSON object.
+    """
+    if not isinstance(data, dict):
+        raise ValueError(f"expected a JSON object, got {type(data).__name__}")
+    intent = _intent(data.get("intent"))
+    record = {field: _coerce(data.get(field), kind) for field, kind in INTENT_SCHEMAS[intent].items()}
+    record["intent"] = intent
+    if "route" in data:
+        record["route"] = data["route"]
+    return record
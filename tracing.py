@@ -0,0 +1,193 @@
+import functools
+import inspect
+import os
+import time
+from contextvars import ContextVar
+
+from metrics import histogram, observe_histogram, record_llm_tokens
+
+# Timing spans for the request hot path: the routing, extraction and medical
+# model calls, date normalization, and every database.py function, connection
+# checkout included. Each span adds its duration to the span_duration_seconds
+# histogram exposed at /metrics; while a request is being traced (start_trace())
+# the spans are also kept on the trace, for the Server-Timing header and the
+# slow-request log line.
+#
+#     @traced()                        # span named after the function
+#     def extract_intent_and_details(user_input): ...
+#
+#     with span("db.free_doctors"):
+#         ...
+
+# Set TRACING=false to turn spans into no-ops
+TRACING = os.getenv("TRACING", "true").lower() not in ("0", "false", "no")
+# Echo a trace id on every response as X-Trace-Id (taken from an incoming
+# X-Trace-Id or X-Request-ID header, generated otherwise)
+TRACE_ID_HEADER = os.getenv("TRACE_ID_HEADER", "true").lower() not in ("0", "false", "no")
+# Print the span breakdown of requests slower than this many seconds; 0 turns it off
+TRACE_SLOW_REQUEST_SECONDS = float(os.getenv("TRACE_SLOW_REQUEST_SECONDS", "5"))
+
+INCOMING_TRACE_HEADERS = ("X-Trace-Id", "X-Request-ID")
+
+_trace = ContextVar("trace", default=None)
+# Name of the innermost open span, which model token counts are attributed to
+_current_span = ContextVar("current_span", default=None)
+
+
+class Trace:
+    """The spans recorded while serving one request."""
+
+    __slots__ = ("trace_id", "started", "spans")
+
+    def __init__(self, trace_id):
+        self.trace_id = trace_id
+        self.started = time.perf_counter()
+        # (name, seconds after the request started, duration in seconds)
+        self.spans = []
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def totals(self):
+        """{span name: total seconds}, in the order the spans first finished."""
+        totals = {}
+        for name, _, seconds in self.spans:
+            totals[name] = totals.get(name, 0.0) + seconds
+        return totals
+
+    def server_timing(self):
+        """Server-Timing header value: one entry per span name, durations in ms."""
+        return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.totals().items())
+
+    def summary(self):
+        return ", ".join(f"{name} {seconds * 1000:.0f}ms" for name, seconds in self.totals().items())
+
+
+def start_trace(trace_id=None):
+    """Trace the current request (or task); returns the Trace."""
+    trace = Trace(trace_id or os.urandom(8).hex())
+    _trace.set(trace)
+    return trace
+
+
+def current_trace():
+    return _trace.get()
+
+
+def end_trace(path):
+    """Stop tracing the current request; logs it when slower than TRACE_SLOW_REQUEST_SECONDS."""
+    trace = _trace.get()
+    if trace is None:
+        return None
+    _trace.set(None)
+    elapsed = trace.elapsed()
+    if TRACE_SLOW_REQUEST_SECONDS and elapsed >= TRACE_SLOW_REQUEST_SECONDS:
+        print(f"Slow request {path} [{trace.trace_id}] {elapsed:.2f}s: {trace.summary() or 'no spans'}")
+    return trace
+
+
+def incoming_trace_id(headers):
+    """The caller's trace id from `headers` (a mapping), if it sent a usable one."""
+    for header in INCOMING_TRACE_HEADERS:
+        value = headers.get(header) or headers.get(header.lower())
+        if value and len(value) <= 128 and value.isprintable():
+            return value
+    return None
+
+
+# {span name: its span_duration_seconds histogram series}
+_series = {}
+
+
+def _series_for(name):
+    series = _series.get(name)
+    if series is None:
+        series = _series[name] = histogram("span_duration_seconds", (("span", name),))
+    return series
+
+
+def _finish(name, series, start, token):
+    end = time.perf_counter()
+    _current_span.reset(token)
+    observe_histogram(series, end - start)
+    trace = _trace.get()
+    if trace is not None:
+        trace.spans.append((name, start - trace.started, end - start))
+
+
+class _Span:
+    __slots__ = ("name", "series", "start", "token")
+
+    def __init__(self, name):
+        self.name = name
+        self.series = _series_for(name)
+
+    def __enter__(self):
+        self.token = _current_span.set(self.name)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        _finish(self.name, self.series, self.start, self.token)
+        return False
+
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(name):
+    """Context manager timing the block as span `name`."""
+    return _Span(name) if TRACING else _NO_SPAN
+
+
+def traced(name=None):
+    """Decorator timing every call of a function (sync or async) as span `name`, default its name."""
+    def decorate(fn):
+        if not TRACING:
+            return fn
+        span_name = name or fn.__name__
+        series = _series_for(span_name)
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                token = _current_span.set(span_name)
+                start = time.perf_counter()
+                try:
+                    return await fn(*args, **kwargs)
+                finally:
+                    _finish(span_name, series, start, token)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            token = _current_span.set(span_name)
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                _finish(span_name, series, start, token)
+        return wrapper
+    return decorate
+
+
+def record_usage(message, stage=None):
+    """
+    Count the tokens of a model response (or stream chunk) carrying LangChain's
+    usage_metadata, against `stage` or the innermost open span.
+    """
+    usage = getattr(message, "usage_metadata", None)
+    if not usage:
+        return
+    record_llm_tokens(stage or _current_span.get() or "unknown",
+                      usage.get("input_tokens"), usage.get("output_tokens"))